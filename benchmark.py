@@ -0,0 +1,201 @@
+"""Generate synthetic stock data and benchmark the data path
+
+    python benchmark.py generate --symbols 100 --years 25 --out ./SyntheticData
+    python benchmark.py run --sizes small,medium --compare benchmarks/baseline.json
+    python benchmark.py run --sizes small,medium --save benchmarks/baseline.json
+
+"run" times CSV parsing and resampling over synthetic datasets of each size,
+and with --import --scratch-db NAME the whole import_csv_files path against
+that database, which must not be the app's. It exits with status 1 when a
+case is slower, or peaks higher, than the baseline by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+from decouple import config
+
+from stocks.benchmarks import (
+    SIZES,
+    cases,
+    compare,
+    dataset,
+    environment,
+    format_results,
+    load_series,
+    measure,
+)
+from stocks.synthetic import BAR_FREQUENCIES, generate_dataset, synthetic_symbols
+
+DATA_DIR = os.path.join("var", "benchmark-data")
+
+# Every table a load can write synthetic rows to, with the column naming
+# the symbol or, for watermarks, the file
+SYNTHETIC_TABLES = (
+    ("ohlc_data", "company_symbol"),
+    ("ohlc_weekly", "company_symbol"),
+    ("ohlc_monthly", "company_symbol"),
+    ("stocks_company", "symbol"),
+    ("ingest_watermark", "file_source"),
+)
+
+
+def import_case(paths, database, scratch_dir):
+    """Time import_csv_files on a dataset in a scratch database
+
+    The dataset's rows are deleted before each run; run the returned reset
+    once more afterwards.
+    """
+    # load_postgres reads its settings on import: point it at the scratch
+    # database and keep its snapshot and data version away from the app's
+    os.environ["DB_NAME"] = database
+    os.environ["STOCK_SNAPSHOT_DIR"] = os.path.join(scratch_dir, "snapshot")
+    os.environ["STOCK_DATA_VERSION_FILE"] = os.path.join(scratch_dir, "data_version")
+    # Parse in this process by default so the peak covers the whole load
+    os.environ.setdefault("STOCK_INGEST_WORKERS", "1")
+    import load_postgres
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_postgres.create_table_if_not_exists()
+
+    symbols = [os.path.basename(path)[:-4] for path in paths]
+    files = [os.path.basename(path) for path in paths]
+
+    def reset():
+        with load_postgres.POOL.connection() as conn, conn.cursor() as cur:
+            for table, column in SYNTHETIC_TABLES:
+                cur.execute("SELECT to_regclass(%s)", [table])
+                if cur.fetchone()[0] is None:
+                    continue
+                values = files if column == "file_source" else symbols
+                cur.execute(f"DELETE FROM {table} WHERE {column} = ANY(%s)", [values])
+        # Caches built over the removed rows are dropped
+        load_postgres.bump_version()
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_postgres.import_csv_files(os.path.dirname(paths[0]))
+
+    return run, reset
+
+
+def run_benchmarks(args):
+    results = {}
+    for size in args.sizes:
+        paths = dataset(args.data_dir, size)
+        measured = {}
+        for name, func in cases(paths, load_series(paths)).items():
+            measured[name] = measure(func, args.repeat)
+        if args.import_data:
+            run, reset = import_case(paths, args.scratch_db, args.data_dir)
+            try:
+                measured["import_csv_files"] = measure(run, args.repeat, setup=reset)
+            finally:
+                reset()
+        results[size] = measured
+    return results
+
+
+def run(args):
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = run_benchmarks(args)
+    print(format_results(results, baseline))
+
+    document = {"environment": environment(), "results": results}
+    for path in filter(None, (args.output, args.save)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+def generate(args):
+    symbols = synthetic_symbols(args.symbols, args.prefix)
+    paths = generate_dataset(
+        args.out, symbols, args.years, args.frequency, seed=args.seed, end=args.end
+    )
+    print(f"Wrote {len(paths)} files to {args.out}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split("\n\n", 1)[1],
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="write random-walk CSV files")
+    gen.add_argument("--out", default="SyntheticData")
+    gen.add_argument("--symbols", type=int, default=12)
+    gen.add_argument("--years", type=int, default=10)
+    gen.add_argument(
+        "--frequency",
+        default="daily",
+        help=f"{', '.join(BAR_FREQUENCIES)} or a pandas offset alias",
+    )
+    gen.add_argument("--prefix", default="SYN", help="symbol prefix")
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--end", help="last date, YYYY-MM-DD (default: today)")
+    gen.set_defaults(handler=generate)
+
+    bench = commands.add_parser("run", help="run the microbenchmarks")
+    bench.add_argument(
+        "--sizes",
+        type=lambda value: value.split(","),
+        default=["small", "medium"],
+        help=f"comma-separated, from {', '.join(SIZES)}",
+    )
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.add_argument("--data-dir", default=DATA_DIR)
+    bench.add_argument(
+        "--import",
+        dest="import_data",
+        action="store_true",
+        help="also time import_csv_files against --scratch-db",
+    )
+    bench.add_argument(
+        "--scratch-db",
+        help="database for --import, not the one the app serves from",
+    )
+    bench.add_argument("--output", help="save the results as JSON")
+    bench.add_argument("--save", help="save the results as a new baseline")
+    bench.add_argument("--compare", help="baseline JSON to check against")
+    bench.add_argument("--tolerance", type=float, default=0.25)
+    bench.set_defaults(handler=run)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        unknown = set(args.sizes) - set(SIZES)
+        if unknown:
+            parser.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+        if args.import_data and not args.scratch_db:
+            parser.error("--import needs --scratch-db")
+        if args.import_data and args.scratch_db == config("DB_NAME", default=None):
+            parser.error("--scratch-db must not be the app's DB_NAME")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
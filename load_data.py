@@ -3,18 +3,23 @@ import sys
 import django
 import pandas as pd
 import glob
-from decimal import Decimal
+from itertools import islice
 
 # Setup Django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_viewer.settings")
 django.setup()
 
+from django.db import connection, transaction
+from stocks.catalog import rebuild_catalog
+from stocks.ingest import read_csv_chunks
+from stocks.partitions import ensure_partitions
 from stocks.models import Company, StockData
+from stocks.rollups import rebuild_rollups
+from stocks.snapshot import publish_snapshot
 
 
-def load_stock_data():
-    # Path to CSV files
-    csv_path = "./StocksData"
+def load_stock_data(csv_path="./StocksData"):
+    """Reload every company found in csv_path through the Django ORM"""
 
     if not os.path.exists(csv_path):
         print(f"Directory {csv_path} does not exist")
@@ -45,54 +50,67 @@ def load_stock_data():
             if created:
                 print(f"Created company: {company_name}")
             else:
-                # Clear existing data for this company
-                deleted_count = StockData.objects.filter(company=company).delete()[0]
+                # Clear existing data for this company; a plain DELETE, since
+                # the ORM would fetch every row to send post_delete signals
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM ohlc_data WHERE company_symbol = %s",
+                        [company.symbol],
+                    )
+                    deleted_count = cursor.rowcount
                 print(f"Cleared {deleted_count} existing records for: {company_name}")
 
-            # Read CSV file
-            df = pd.read_csv(file_path)
-
-            print(f"CSV columns: {list(df.columns)}")
-            print(f"CSV shape: {df.shape}")
-            print(f"First few rows:")
-            print(df.head())
-
-            # Clean and process data
-            df["Date"] = pd.to_datetime(df["Date"])
-
-            # Clean price columns (remove $ sign)
-            price_columns = ["Close/Last", "Open", "High", "Low"]
-            for col in price_columns:
-                if col in df.columns:
-                    df[col] = df[col].astype(str).str.replace("$", "").astype(float)
-
-            # Sort by date
-            df = df.sort_values("Date")
-
-            # Create StockData objects
-            stock_data_objects = []
-            for _, row in df.iterrows():
-                stock_data = StockData(
-                    company=company,
-                    date=row["Date"].date(),
-                    open_price=Decimal(str(row["Open"])),
-                    high_price=Decimal(str(row["High"])),
-                    low_price=Decimal(str(row["Low"])),
-                    close_price=Decimal(str(row["Close/Last"])),
-                    volume=(
-                        int(row["Volume"])
-                        if "Volume" in df.columns and pd.notna(row["Volume"])
-                        else 0
-                    ),
-                )
-                stock_data_objects.append(stock_data)
-
-            # Bulk create for better performance
-            StockData.objects.bulk_create(stock_data_objects, batch_size=1000)
-
-            print(
-                f"✅ Successfully loaded {len(stock_data_objects)} records for {company_name}"
-            )
+            # Read in fixed-size chunks; "$" is stripped and dates parsed
+            # while reading, so memory stays bounded for any file size
+            file_source = os.path.basename(file_path)
+            record_count = 0
+            for chunk_number, df in enumerate(read_csv_chunks(file_path)):
+                if chunk_number == 0:
+                    print(f"CSV columns: {list(df.columns)}")
+                    print(f"First few rows:")
+                    print(df.head())
+
+                # Sort by date, dropping rows without a date or close
+                df = df.dropna(subset=["Date", "Close/Last"]).sort_values("Date")
+                if "Volume" in df.columns:
+                    volumes = df["Volume"].fillna(0).astype("int64")
+                else:
+                    volumes = pd.Series(0, index=df.index)
+
+                # Create StockData objects straight from the typed columns
+                stock_data_objects = [
+                    StockData(
+                        company_symbol=company.symbol,
+                        date=day,
+                        open=open_price,
+                        high=high,
+                        low=low,
+                        close=close,
+                        volume=volume,
+                        file_source=file_source,
+                    )
+                    for day, open_price, high, low, close, volume in zip(
+                        df["Date"].dt.date,
+                        df["Open"],
+                        df["High"],
+                        df["Low"],
+                        df["Close/Last"],
+                        volumes.tolist(),
+                    )
+                ]
+
+                # Bulk create for better performance, into partitions that
+                # cover the chunk's years
+                with transaction.atomic():
+                    if connection.vendor == "postgresql" and len(df):
+                        with connection.cursor() as cursor:
+                            ensure_partitions(
+                                cursor, df["Date"].min(), df["Date"].max()
+                            )
+                    StockData.objects.bulk_create(stock_data_objects, batch_size=1000)
+                record_count += len(stock_data_objects)
+
+            print(f"✅ Successfully loaded {record_count} records for {company_name}")
 
         except Exception as e:
             print(f"❌ Error processing {file_path}: {str(e)}")
@@ -100,6 +118,20 @@ def load_stock_data():
 
             traceback.print_exc()
 
+    # Companies are cleared and reloaded wholesale, so rebuild every rollup
+    # and catalog entry
+    with transaction.atomic(), connection.cursor() as cursor:
+        rebuild_rollups(cursor)
+        rebuild_catalog(cursor)
+
+    # Publish a snapshot and data version so web workers reload
+    rows = (
+        StockData.objects.order_by("company_symbol", "date")
+        .values_list("company_symbol", "date", "open", "high", "low", "close", "volume")
+        .iterator(chunk_size=50000)
+    )
+    publish_snapshot(iter(lambda: list(islice(rows, 50000)), []))
+
     total_companies = Company.objects.count()
     total_records = StockData.objects.count()
 
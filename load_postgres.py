@@ -1,9 +1,26 @@
 import pandas as pd
 import psycopg2
 from sqlalchemy import create_engine
+import functools
 import os
 import glob
+import time
 from decouple import config
+from stocks.catalog import catalog_missing, rebuild_catalog, refresh_catalog
+from stocks.dataversion import bump_version
+from stocks.ingest import (
+    CSV_CHUNK_ROWS,
+    csv_date_range,
+    fetch_watermarks,
+    load_delta,
+    parallel_ingest,
+    plan_delta,
+    read_csv_chunks,
+)
+from stocks.partitions import CREATE_PARTITIONED_SQL, ensure_partitions
+from stocks.pool import ConnectionPool, pool_options
+from stocks.rollups import rebuild_rollups, refresh_rollups, rollups_missing
+from stocks.snapshot import publish_snapshot
 
 # Database connection parameters - using environment variables
 DB_CONFIG = {
@@ -14,6 +31,31 @@ DB_CONFIG = {
     "port": config("DB_PORT", default="5432"),
 }
 
+# "copy" stages each file with COPY and merges it with one INSERT ... ON
+# CONFLICT; "to_sql" keeps the original pandas inserts
+INGEST_MODE = config("STOCK_INGEST_MODE", default="copy")
+
+# What the COPY mode does with rows already loaded: "update" or "nothing"
+INGEST_ON_CONFLICT = config("STOCK_INGEST_ON_CONFLICT", default="update")
+
+# Processes parsing CSV files (0 = one per core) and connections writing them
+# in COPY mode; one worker keeps the serial loop
+INGEST_WORKERS = config("STOCK_INGEST_WORKERS", default=0, cast=int)
+INGEST_WRITERS = config("STOCK_INGEST_WRITERS", default=2, cast=int)
+
+# COPY mode skips unchanged files and loads only rows past each file's
+# watermark; set to False to reload every file in full
+INGEST_INCREMENTAL = config("STOCK_INGEST_INCREMENTAL", default=True, cast=bool)
+
+# Rows parsed and written at a time; bounds memory use for any file size
+INGEST_CHUNK_ROWS = config("STOCK_INGEST_CHUNK_ROWS", default=CSV_CHUNK_ROWS, cast=int)
+
+# Every step borrows its connection from one pool, sized so that each
+# parallel COPY writer can hold one
+POOL_OPTIONS = pool_options(config) or {"max_size": 1}
+POOL_OPTIONS["max_size"] = max(POOL_OPTIONS["max_size"], INGEST_WRITERS + 1)
+POOL = ConnectionPool(lambda: psycopg2.connect(**DB_CONFIG), **POOL_OPTIONS)
+
 # Create connection string
 conn_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
 
@@ -21,22 +63,16 @@ conn_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CON
 def check_table_structure():
     """Check if Django tables exist and have the expected structure"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Check if Django tables exist
-        cur.execute(
-            """
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name IN ('stocks_company', 'ohlc_data');
-        """
-        )
+        with POOL.connection() as conn, conn.cursor() as cur:
+            # Check if Django tables exist
+            cur.execute("""
+                SELECT table_name 
+                FROM information_schema.tables 
+                WHERE table_schema = 'public' 
+                AND table_name IN ('stocks_company', 'ohlc_data');
+            """)
 
-        existing_tables = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+            existing_tables = [row[0] for row in cur.fetchall()]
 
         return existing_tables
 
@@ -45,42 +81,55 @@ def check_table_structure():
         return []
 
 
+# Weekly/monthly rollups share one layout, keyed by bucket start date
+ROLLUP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id BIGSERIAL PRIMARY KEY,
+        company_symbol VARCHAR(10),
+        date DATE,
+        open DECIMAL(10,2),
+        high DECIMAL(10,2),
+        low DECIMAL(10,2),
+        close DECIMAL(10,2),
+        volume BIGINT,
+        UNIQUE(company_symbol, date)
+    );
+"""
+
+# Per-file fingerprints and watermarks for incremental loads
+WATERMARK_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS ingest_watermark (
+        id BIGSERIAL PRIMARY KEY,
+        file_source VARCHAR(50) UNIQUE,
+        company_symbol VARCHAR(10),
+        content_hash VARCHAR(64),
+        history_hash VARCHAR(64),
+        max_date DATE,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
 def create_table_if_not_exists():
-    """Create the OHLC table only if Django migrations haven't been run"""
-    existing_tables = check_table_structure()
+    """Create the OHLC table if neither migrations nor an earlier run did
 
-    if "ohlc_data" in existing_tables:
-        print("Django tables detected. Using existing Django table structure.")
-        return True
+    The rollup and watermark tables are created on every run, so a database
+    set up by an older loader, with only ohlc_data, gains them too.
+    """
+    existing_tables = check_table_structure()
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS ohlc_data (
-            id SERIAL PRIMARY KEY,
-            company_symbol VARCHAR(10),
-            date DATE,
-            open DECIMAL(10,2),
-            high DECIMAL(10,2),
-            low DECIMAL(10,2),
-            close DECIMAL(10,2),
-            volume BIGINT,
-            file_source VARCHAR(50),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(company_symbol, date)
-        );
-        
-        CREATE INDEX IF NOT EXISTS idx_company_symbol_date ON ohlc_data(company_symbol, date);
-        CREATE INDEX IF NOT EXISTS idx_date ON ohlc_data(date);
-        """
-
-        cur.execute(create_table_query)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("Table created successfully!")
+        with POOL.connection() as conn, conn.cursor() as cur:
+            if "ohlc_data" in existing_tables:
+                print("Existing ohlc_data table detected. Using its structure.")
+            else:
+                # ohlc_data is partitioned by year; the loaders add partitions
+                cur.execute(CREATE_PARTITIONED_SQL)
+                print("Table created successfully!")
+
+            for table in ("ohlc_weekly", "ohlc_monthly"):
+                cur.execute(ROLLUP_TABLE_SQL.format(table=table))
+            cur.execute(WATERMARK_TABLE_SQL)
         return True
 
     except Exception as e:
@@ -88,26 +137,284 @@ def create_table_if_not_exists():
         return False
 
 
-def clean_price_column(series):
-    """Clean price columns by removing $ symbol"""
-    return series.astype(str).str.replace("$", "").astype(float)
+def record_touched(touched, df):
+    """Remember which dates each symbol received so rollups can be refreshed"""
+    for symbol, dates in df.groupby("company_symbol")["date"]:
+        touched.setdefault(symbol, []).extend(dates.dt.date)
+
+
+def iter_stock_csv(file_path, lines=None):
+    """Read one CSV file as cleaned DataFrame chunks matching ohlc_data
+
+    lines, if given, is the header plus the subset of the file's lines to parse.
+    """
+    # Extract filename for tracking
+    filename = os.path.basename(file_path)
+
+    # Prices arrive as float64 and dates parsed; "$" is stripped while reading
+    for df in read_csv_chunks(file_path, lines, INGEST_CHUNK_ROWS):
+        yield clean_stock_chunk(df, filename)
+
+
+def read_stock_csv(file_path, lines=None):
+    """Read one CSV file into a cleaned DataFrame matching ohlc_data"""
+    return pd.concat(list(iter_stock_csv(file_path, lines)), ignore_index=True)
+
+
+def clean_stock_chunk(df, filename):
+    """Shape one parsed chunk of a CSV file into ohlc_data columns"""
+    # Standardize column names for your specific CSV format
+    column_mapping = {
+        "Date": "date",
+        "Close/Last": "close",
+        "Volume": "volume",
+        "Open": "open",
+        "High": "high",
+        "Low": "low",
+    }
+
+    # Rename columns if they exist
+    df = df.rename(columns={k: v for k, v in column_mapping.items() if k in df.columns})
+
+    # Add company symbol if not present
+    if "company_symbol" not in df.columns:
+        # Extract company name from filename and map to symbol
+        company_name = filename.split(".")[0]  # Remove .csv extension
+        df["company_symbol"] = company_name.upper()
+
+    # Add file source
+    df["file_source"] = filename
+
+    # Add created_at timestamp for Django compatibility
+    df["created_at"] = pd.Timestamp.now()
+
+    # Select only the columns we need and ensure they exist
+    required_columns = [
+        "company_symbol",
+        "date",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "file_source",
+        "created_at",
+    ]
+    existing_columns = [col for col in required_columns if col in df.columns]
+    df = df[existing_columns]
+
+    # Remove any rows with missing essential data
+    return df.dropna(subset=["date", "close"])
 
 
 def import_csv_files(folder_path):
-    """Import all CSV files from the specified folder"""
+    """Import all CSV files from the specified folder
+
+    Returns a {company_symbol: [dates]} map of the daily rows written.
+    """
+    # Get all CSV files in the folder
+    csv_files = glob.glob(os.path.join(folder_path, "*.csv"))
+
+    if not csv_files:
+        print(f"No CSV files found in {folder_path}")
+        return {}
+
+    print(f"Found {len(csv_files)} CSV files")
+
+    if INGEST_MODE != "copy":
+        return insert_csv_files(csv_files)
+
+    watermarks = load_watermarks()
+    if watermarks is None:
+        return {}
+
+    if INGEST_WORKERS == 1:
+        return copy_csv_files(csv_files, watermarks)
+    return parallel_copy_csv_files(csv_files, watermarks)
+
+
+def read_stock_delta(file_path, watermark=None, stream=False):
+    """Parse only the part of a file that changed since its watermark
+
+    With stream the rows are left as a generator of chunks to be written as
+    they are parsed; otherwise they are parsed up front into one frame.
+    """
+    filename = os.path.basename(file_path)
+    delta = plan_delta(file_path, watermark if INGEST_INCREMENTAL else None)
+    lines = delta.pop("lines")
+
+    delta["file_source"] = filename
+    delta["company_symbol"] = filename.split(".")[0].upper()
+    delta["max_date"] = watermark["max_date"] if watermark else None
+    delta["frames"] = []
+    if delta["action"] != "skip" and stream:
+        delta["frames"] = iter_stock_csv(file_path, lines)
+    elif delta["action"] != "skip":
+        delta["frames"] = [read_stock_csv(file_path, lines)]
+    return delta
+
+
+def upsert_stock_delta(cursor, delta):
+    """Writer step shared by the serial and parallel COPY loaders"""
+    return load_delta(cursor, delta, INGEST_ON_CONFLICT)
 
+
+def load_watermarks():
+    """Fetch every file's watermark, or None if they cannot be read"""
     try:
-        # Create database engine
-        engine = create_engine(conn_string)
+        with POOL.connection() as conn, conn.cursor() as cur:
+            watermarks = fetch_watermarks(cur)
+        return watermarks
+
+    except Exception as e:
+        print(f"Error reading ingest watermarks: {str(e)}")
+        print("Run migrations to create the ingest_watermark table.")
+        return None
+
+
+def describe_load(counts):
+    """One-line summary of what a COPY-mode load did with a file"""
+    if counts["load"] == "skip":
+        return "unchanged, skipped"
+    return (
+        f"{counts['load']} load, {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['skipped']} skipped"
+    )
+
+
+def parallel_copy_csv_files(csv_files, watermarks):
+    """Parse files in a process pool while a few connections COPY them in"""
+    touched = {}
+    totals = {"inserted": 0, "updated": 0, "skipped": 0}
+    workers = INGEST_WORKERS or os.cpu_count() or 1
+    print(
+        f"Parsing with {workers} processes, "
+        f"writing with {INGEST_WRITERS} connections"
+    )
+
+    started = time.perf_counter()
+    try:
+        create_file_partitions(csv_files)
+        results = parallel_ingest(
+            csv_files,
+            functools.partial(read_stock_delta, stream=True),
+            upsert_stock_delta,
+            POOL.getconn,
+            workers=workers,
+            writers=INGEST_WRITERS,
+            release=POOL.putconn,
+            extra={path: watermarks.get(os.path.basename(path)) for path in csv_files},
+        )
+    except Exception as e:
+        print(f"Error in import process: {str(e)}")
+        return touched
+
+    failed = []
+    for result in sorted(results, key=lambda result: result["file"]):
+        timings = (
+            f"parse {result['parse_seconds']:.2f}s, "
+            f"write {result['write_seconds']:.2f}s"
+        )
+        if result["error"] is not None:
+            failed.append(result["file"])
+            print(f"Error processing {result['file']} ({timings}): {result['error']}")
+            continue
+
+        counts = result["counts"]
+        for symbol, day in result["written"]:
+            touched.setdefault(symbol, []).append(day)
+        for key in totals:
+            totals[key] += counts[key]
+        print(f"Imported {result['file']}: {describe_load(counts)} ({timings})")
+
+    print(
+        f"Import process completed in {time.perf_counter() - started:.2f}s! "
+        f"{len(results) - len(failed)} files loaded, {len(failed)} failed; "
+        f"{totals['inserted']} inserted, {totals['updated']} updated, "
+        f"{totals['skipped']} skipped"
+    )
+    if failed:
+        print(f"Failed files: {', '.join(failed)}")
+
+    return touched
+
+
+def copy_csv_files(csv_files, watermarks):
+    """Load files through a COPY staging table and merge them with upserts"""
+    touched = {}
+    totals = {"inserted": 0, "updated": 0, "skipped": 0}
+
+    try:
+        with POOL.connection() as conn, conn.cursor() as cur:
+            for file_path in csv_files:
+                filename = os.path.basename(file_path)
+                try:
+                    print(f"Processing: {filename}")
+                    delta = read_stock_delta(
+                        file_path, watermarks.get(filename), stream=True
+                    )
+
+                    # One transaction per file, so a bad file leaves the rest loaded
+                    counts, written = upsert_stock_delta(cur, delta)
+                    conn.commit()
+
+                    for symbol, day in written:
+                        touched.setdefault(symbol, []).append(day)
+                    for key in totals:
+                        totals[key] += counts[key]
+                    print(f"Imported {filename}: {describe_load(counts)}")
+
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error processing {filename}: {str(e)}")
+                    continue
+
+        print(
+            f"Import process completed! {totals['inserted']} inserted, "
+            f"{totals['updated']} updated, {totals['skipped']} skipped"
+        )
+
+    except Exception as e:
+        print(f"Error in import process: {str(e)}")
 
-        # Get all CSV files in the folder
-        csv_files = glob.glob(os.path.join(folder_path, "*.csv"))
+    return touched
+
+
+def create_partitions(df):
+    """Add the ohlc_data partitions a DataFrame's rows will land in"""
+    if not len(df):
+        return
+    with POOL.connection() as conn, conn.cursor() as cur:
+        created = ensure_partitions(cur, df["date"].min(), df["date"].max())
+    for name in created:
+        print(f"Created partition {name}")
 
-        if not csv_files:
-            print(f"No CSV files found in {folder_path}")
-            return
 
-        print(f"Found {len(csv_files)} CSV files")
+def create_file_partitions(csv_files):
+    """Add the ohlc_data partitions of every year the files cover
+
+    Run before parallel writers start: attaching a partition locks the
+    default partition exclusively, stalling or deadlocking writers loading
+    other files at the same time.
+    """
+    ranges = [span for span in map(csv_date_range, csv_files) if span is not None]
+    if not ranges:
+        return
+    with POOL.connection() as conn, conn.cursor() as cur:
+        created = ensure_partitions(
+            cur, min(first for first, _ in ranges), max(last for _, last in ranges)
+        )
+    for name in created:
+        print(f"Created partition {name}")
+
+
+def insert_csv_files(csv_files):
+    """Load files with pandas inserts, retrying row by row on duplicates"""
+    touched = {}
+
+    try:
+        # Create database engine
+        engine = create_engine(conn_string)
 
         for file_path in csv_files:
             try:
@@ -115,65 +422,8 @@ def import_csv_files(folder_path):
                 filename = os.path.basename(file_path)
                 print(f"Processing: {filename}")
 
-                # Read CSV file
-                df = pd.read_csv(file_path)
-
-                # Standardize column names for your specific CSV format
-                column_mapping = {
-                    "Date": "date",
-                    "Close/Last": "close",
-                    "Volume": "volume",
-                    "Open": "open",
-                    "High": "high",
-                    "Low": "low",
-                }
-
-                # Rename columns if they exist
-                df = df.rename(
-                    columns={k: v for k, v in column_mapping.items() if k in df.columns}
-                )
-
-                # Clean up the data for your specific format
-                price_columns = ["open", "high", "low", "close"]
-                for col in price_columns:
-                    if col in df.columns:
-                        df[col] = clean_price_column(df[col])
-
-                # Add company symbol if not present
-                if "company_symbol" not in df.columns:
-                    # Extract company name from filename and map to symbol
-                    company_name = filename.split(".")[0]  # Remove .csv extension
-                    df["company_symbol"] = company_name.upper()
-
-                # Add file source
-                df["file_source"] = filename
-
-                # Convert date column to datetime
-                if "date" in df.columns:
-                    df["date"] = pd.to_datetime(df["date"], format="%m/%d/%Y")
-
-                # Add created_at timestamp for Django compatibility
-                df["created_at"] = pd.Timestamp.now()
-
-                # Select only the columns we need and ensure they exist
-                required_columns = [
-                    "company_symbol",
-                    "date",
-                    "open",
-                    "high",
-                    "low",
-                    "close",
-                    "volume",
-                    "file_source",
-                    "created_at",
-                ]
-                existing_columns = [
-                    col for col in required_columns if col in df.columns
-                ]
-                df = df[existing_columns]
-
-                # Remove any rows with missing essential data
-                df = df.dropna(subset=["date", "close"])
+                df = read_stock_csv(file_path)
+                create_partitions(df)
 
                 # Import to PostgreSQL using upsert to handle duplicates
                 try:
@@ -185,6 +435,7 @@ def import_csv_files(folder_path):
                         method="multi",
                         chunksize=1000,  # Process in smaller chunks
                     )
+                    record_touched(touched, df)
                     print(f"Successfully imported {len(df)} rows from {filename}")
 
                 except Exception as db_error:
@@ -201,6 +452,7 @@ def import_csv_files(folder_path):
                             row_df.to_sql(
                                 "ohlc_data", engine, if_exists="append", index=False
                             )
+                            record_touched(touched, row_df)
                             success_count += 1
                         except Exception as row_error:
                             if (
@@ -224,76 +476,83 @@ def import_csv_files(folder_path):
     except Exception as e:
         print(f"Error in import process: {str(e)}")
 
+    return touched
+
+
+def refresh_rollup_tables(touched):
+    """Bring ohlc_weekly/ohlc_monthly up to date with the imported rows"""
+    try:
+        with POOL.connection() as conn, conn.cursor() as cur:
+            # First run after the tables appear: roll up the existing history
+            if rollups_missing(cur):
+                rebuild_rollups(cur)
+                print("Rollup tables rebuilt from ohlc_data")
+            else:
+                refreshed = refresh_rollups(cur, touched)
+                print(f"Rollup tables refreshed! Buckets updated: {refreshed}")
+
+            conn.commit()
+        return True
 
-def create_companies_table():
-    """Create companies table and populate with unique symbols"""
+    except Exception as e:
+        print(f"Error refreshing rollup tables: {str(e)}")
+        return False
+
+
+def create_companies_table(touched):
+    """Create companies table and refresh the catalog for imported symbols"""
     existing_tables = check_table_structure()
 
     if "stocks_company" in existing_tables:
         print("stocks_company table already exists (Django managed)")
-        return populate_companies_from_existing_data()
+        return populate_companies_from_existing_data(touched)
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Create companies table
-        create_companies_query = """
-        CREATE TABLE IF NOT EXISTS stocks_company (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE,
-            symbol VARCHAR(10) UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-
-        cur.execute(create_companies_query)
-
-        # Insert unique company symbols from ohlc_data
-        insert_companies_query = """
-        INSERT INTO stocks_company (name, symbol)
-        SELECT DISTINCT company_symbol, company_symbol
-        FROM ohlc_data
-        WHERE company_symbol NOT IN (SELECT symbol FROM stocks_company WHERE symbol IS NOT NULL)
-        ON CONFLICT (symbol) DO NOTHING;
-        """
-
-        cur.execute(insert_companies_query)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("Companies table created and populated!")
-        return True
+        with POOL.connection() as conn, conn.cursor() as cur:
+            # Create companies table, with the catalog summary of each symbol
+            create_companies_query = """
+            CREATE TABLE IF NOT EXISTS stocks_company (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(100) UNIQUE,
+                symbol VARCHAR(10) UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                first_date DATE,
+                last_date DATE,
+                row_count BIGINT,
+                last_close DECIMAL(10,2),
+                last_change DECIMAL(10,2)
+            );
+            """
+
+            cur.execute(create_companies_query)
+            conn.commit()
+        print("Companies table created!")
 
     except Exception as e:
         print(f"Error creating companies table: {str(e)}")
         return False
 
+    return populate_companies_from_existing_data(touched)
 
-def populate_companies_from_existing_data():
-    """Populate companies table from existing stock data when Django tables exist"""
+
+def populate_companies_from_existing_data(touched):
+    """Upsert a catalog entry for every symbol the import wrote rows for"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Insert unique company symbols from ohlc_data into Django managed table
-        insert_companies_query = """
-        INSERT INTO stocks_company (name, symbol, created_at)
-        SELECT DISTINCT company_symbol, company_symbol, CURRENT_TIMESTAMP
-        FROM ohlc_data
-        WHERE company_symbol NOT IN (SELECT symbol FROM stocks_company WHERE symbol IS NOT NULL)
-        ON CONFLICT (symbol) DO NOTHING;
-        """
-
-        cur.execute(insert_companies_query)
-        conn.commit()
-
-        # Get count of inserted companies
-        cur.execute("SELECT COUNT(*) FROM stocks_company;")
-        company_count = cur.fetchone()[0]
-
-        cur.close()
-        conn.close()
+        with POOL.connection() as conn, conn.cursor() as cur:
+            # First run after the catalog appears: summarise the existing history
+            if catalog_missing(cur):
+                rebuild_catalog(cur)
+                print("Company catalog rebuilt from ohlc_data")
+            else:
+                refreshed = refresh_catalog(cur, touched)
+                print(f"Company catalog refreshed! Symbols updated: {refreshed}")
+
+            conn.commit()
+
+            # Get count of catalogued companies
+            cur.execute("SELECT COUNT(*) FROM stocks_company;")
+            company_count = cur.fetchone()[0]
+
         print(f"Companies table populated! Total companies: {company_count}")
         return True
 
@@ -302,48 +561,69 @@ def populate_companies_from_existing_data():
         return False
 
 
-def verify_import():
-    """Verify the imported data"""
+def export_snapshot(chunk_size=50000):
+    """Publish a memory-mapped columnar snapshot of ohlc_data for web workers"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Get total count
-        cur.execute("SELECT COUNT(*) FROM ohlc_data;")
-        total_count = cur.fetchone()[0]
-        print(f"Total records imported: {total_count}")
-
-        if total_count == 0:
-            print("No data found in ohlc_data table!")
+        with POOL.connection() as conn:
+            # Named cursor streams rows from the server instead of loading them
+            cur = conn.cursor(name="snapshot_export")
+            cur.itersize = chunk_size
+            cur.execute("""
+                SELECT company_symbol, date - DATE '1970-01-01',
+                       open::float8, high::float8, low::float8, close::float8,
+                       volume
+                FROM ohlc_data
+                ORDER BY company_symbol, date;
+            """)
+
+            version = publish_snapshot(iter(lambda: cur.fetchmany(chunk_size), []))
             cur.close()
-            conn.close()
-            return
-
-        # Get count by company
-        cur.execute(
-            "SELECT company_symbol, COUNT(*) FROM ohlc_data GROUP BY company_symbol ORDER BY company_symbol;"
-        )
-        company_counts = cur.fetchall()
 
-        print("\nRecords per company:")
-        for company, count in company_counts:
-            print(f"  {company}: {count} records")
-
-        # Get date range
-        cur.execute("SELECT MIN(date), MAX(date) FROM ohlc_data;")
-        date_range = cur.fetchone()
-        print(f"\nDate range: {date_range[0]} to {date_range[1]}")
+        print(f"Snapshot published! Data version: {version}")
+        return True
 
-        # Show sample data
-        cur.execute("SELECT * FROM ohlc_data ORDER BY date DESC LIMIT 5;")
-        sample_data = cur.fetchall()
+    except Exception as e:
+        print(f"Error publishing snapshot: {str(e)}")
+        # Still invalidate worker caches so they fall back to the database
+        print(f"Data version bumped to {bump_version()}")
+        return False
 
-        print("\nSample data (latest 5 records):")
-        for row in sample_data:
-            print(f"  {row}")
 
-        cur.close()
-        conn.close()
+def verify_import():
+    """Verify the imported data"""
+    try:
+        with POOL.connection() as conn, conn.cursor() as cur:
+            # Get total count
+            cur.execute("SELECT COUNT(*) FROM ohlc_data;")
+            total_count = cur.fetchone()[0]
+            print(f"Total records imported: {total_count}")
+
+            if total_count == 0:
+                print("No data found in ohlc_data table!")
+                return
+
+            # Get count by company
+            cur.execute(
+                "SELECT company_symbol, COUNT(*) FROM ohlc_data GROUP BY company_symbol ORDER BY company_symbol;"
+            )
+            company_counts = cur.fetchall()
+
+            print("\nRecords per company:")
+            for company, count in company_counts:
+                print(f"  {company}: {count} records")
+
+            # Get date range
+            cur.execute("SELECT MIN(date), MAX(date) FROM ohlc_data;")
+            date_range = cur.fetchone()
+            print(f"\nDate range: {date_range[0]} to {date_range[1]}")
+
+            # Show sample data
+            cur.execute("SELECT * FROM ohlc_data ORDER BY date DESC LIMIT 5;")
+            sample_data = cur.fetchall()
+
+            print("\nSample data (latest 5 records):")
+            for row in sample_data:
+                print(f"  {row}")
 
     except Exception as e:
         print(f"Error verifying import: {str(e)}")
@@ -369,12 +649,18 @@ def main():
         return
 
     # Step 2: Import CSV files
-    import_csv_files(FOLDER_PATH)
+    touched = import_csv_files(FOLDER_PATH)
+
+    # Step 3: Refresh the weekly/monthly rollups for the buckets that changed
+    refresh_rollup_tables(touched)
+
+    # Step 4: Create companies table and refresh the catalog of changed symbols
+    create_companies_table(touched)
 
-    # Step 3: Create and populate companies table
-    create_companies_table()
+    # Step 5: Publish a snapshot and data version so web workers reload
+    export_snapshot()
 
-    # Step 4: Verify import
+    # Step 6: Verify import
     verify_import()
 
     print("Process completed!")
@@ -0,0 +1,187 @@
+"""Load-test the chart site over HTTP
+
+Replays a request mix against a running server (--url) or one started here
+with gunicorn (--start wsgi|asgi), then prints throughput, error rate and
+p50/p95/p99 latency overall and per aggregation level.
+
+    python loadtest.py --start wsgi --synthesize 500 --record mix.jsonl \\
+        --concurrency 8 --duration 30 --output before.json
+    python loadtest.py --start wsgi --mix mix.jsonl --concurrency 8 \\
+        --duration 30 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from stocks.loadtest import (
+    format_report,
+    parse_index,
+    read_mix,
+    report,
+    run_load,
+    synthesize_mix,
+    write_mix,
+)
+
+SERVERS = {
+    "wsgi": ["stock_viewer.wsgi:application"],
+    "asgi": [
+        "stock_viewer.asgi:application",
+        "-k",
+        "uvicorn.workers.UvicornWorker",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def start_server(kind, workers, timeout=30):
+    """Start gunicorn on a free local port and wait until it serves the index"""
+    port = free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        *SERVERS[kind],
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            fetch(url + "/")
+            return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server did not answer within {timeout}s")
+
+
+def build_mix(args, url):
+    if args.mix:
+        return read_mix(args.mix)
+    company_ids, bounds = parse_index(fetch(url + "/"))
+    if not company_ids:
+        raise RuntimeError("The index page lists no companies to request")
+    return synthesize_mix(
+        company_ids,
+        bounds,
+        args.synthesize,
+        seed=args.seed,
+        index_share=args.index_share,
+        max_points=args.max_points,
+        indicators=args.indicators,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument(
+        "--start", choices=sorted(SERVERS), help="start gunicorn locally"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--mix", help="JSON-lines request mix to replay")
+    source.add_argument(
+        "--synthesize",
+        type=int,
+        default=200,
+        metavar="N",
+        help="draw N requests over the companies the index page lists",
+    )
+    parser.add_argument("--record", help="write the request mix used to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index-share", type=float, default=0.05)
+    parser.add_argument("--max-points", type=int)
+    parser.add_argument("--indicators", help="e.g. sma:20,rsi:14")
+
+    parser.add_argument("--concurrency", type=int, default=8)
+    run = parser.add_mutually_exclusive_group()
+    run.add_argument("--duration", type=float, help="seconds to run for")
+    run.add_argument(
+        "--requests", type=int, help="requests to send (default: one pass)"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=2.0, help="seconds of untimed load first"
+    )
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="earlier results JSON to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    url = args.url.rstrip("/") if args.url else None
+    if args.start:
+        server, url = start_server(args.start, args.workers)
+
+    try:
+        mix = build_mix(args, url)
+        if args.record:
+            write_mix(args.record, mix)
+        if args.warmup:
+            run_load(url, mix, args.concurrency, duration=args.warmup)
+
+        samples, elapsed = run_load(
+            url, mix, args.concurrency, duration=args.duration, total=args.requests
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "url": args.url,
+            "server": args.start,
+            "workers": args.workers if args.start else None,
+            "mix": args.mix or f"synthesized:{args.synthesize}:{args.seed}",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+        },
+        **report(samples, elapsed),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(result, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
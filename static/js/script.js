@@ -235,39 +235,102 @@ function validateInputs() {
   return true;
 }
 
-// Convert data to CSV format
-function convertToCSV(data, aggregation) {
-  let headers = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume'];
-  let csvContent = headers.join(',') + '\n';
-
-  for (let i = 0; i < data.dates.length; i++) {
-    let row = [
-      data.dates[i],
-      data.opens[i].toFixed(2),
-      data.highs[i].toFixed(2),
-      data.lows[i].toFixed(2),
-      data.closes[i].toFixed(2),
-      data.volumes[i],
-    ];
-    csvContent += row.join(',') + '\n';
-  }
-
-  return csvContent;
-}
-
-// Download CSV file
-function downloadCSV(csvContent, filename) {
-  const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
+// Download a file served by the export endpoint
+function downloadCSV(url) {
   const link = document.createElement('a');
-  const url = URL.createObjectURL(blob);
   link.setAttribute('href', url);
-  link.setAttribute('download', filename);
+  // Empty download attribute keeps the server's Content-Disposition filename
+  link.setAttribute('download', '');
   link.style.visibility = 'hidden';
   document.body.appendChild(link);
   link.click();
   document.body.removeChild(link);
 }
 
+// Compact typed-array encoding offered by the chart-data endpoint
+const COLUMNAR_CONTENT_TYPE = 'application/vnd.stocks.ohlc-columnar';
+const COLUMN_TYPES = {
+  int32: Int32Array,
+  float32: Float32Array,
+  float64: Float64Array,
+  int64: BigInt64Array,
+};
+const MS_PER_DAY = 24 * 60 * 60 * 1000;
+
+// Narrowest candlestick worth drawing, in pixels
+const MIN_PIXELS_PER_BAR = 2;
+
+// Fetch chart data with a cacheable GET request
+function fetchChartData(
+  companyId,
+  startDateValue,
+  endDateValue,
+  aggregation,
+  maxPoints
+) {
+  const params = new URLSearchParams({
+    company_id: companyId,
+    start_date: startDateValue,
+    end_date: endDateValue,
+    aggregation: aggregation,
+  });
+
+  // Let the server merge bars the screen could not draw anyway
+  if (maxPoints) {
+    params.set('max_points', maxPoints);
+  }
+
+  return fetch(`/api/chart-data/?${params}`, {
+    headers: { Accept: `${COLUMNAR_CONTENT_TYPE}, application/json;q=0.9` },
+  });
+}
+
+// Decode the columnar payload into the same shape as the JSON response
+function decodeColumnar(buffer) {
+  // Layout: "OHLC", uint32 header length, JSON header, 8-byte aligned columns
+  const headerLength = new DataView(buffer).getUint32(4, true);
+  const header = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength))
+  );
+  const dataStart = Math.ceil((8 + headerLength) / 8) * 8;
+
+  const columns = {};
+  header.columns.forEach((column) => {
+    const TypedArray = COLUMN_TYPES[column.type];
+    columns[column.name] = new TypedArray(
+      buffer,
+      dataStart + column.offset,
+      column.length
+    );
+  });
+  delete header.columns;
+
+  // Prices travel as float32, so snap them back to cents
+  const toPrices = (values) =>
+    Array.from(values, (value) => Math.round(value * 100) / 100);
+
+  header.chart_data = {
+    dates: Array.from(columns.dates, (day) =>
+      new Date(day * MS_PER_DAY).toISOString().slice(0, 10)
+    ),
+    opens: toPrices(columns.opens),
+    highs: toPrices(columns.highs),
+    lows: toPrices(columns.lows),
+    closes: toPrices(columns.closes),
+    volumes: Array.from(columns.volumes, Number),
+  };
+  return header;
+}
+
+// Read a chart-data response in whichever encoding the server chose
+async function readChartResponse(response) {
+  const contentType = response.headers.get('Content-Type') || '';
+  if (response.ok && contentType.startsWith(COLUMNAR_CONTENT_TYPE)) {
+    return decodeColumnar(await response.arrayBuffer());
+  }
+  return response.json();
+}
+
 // Generate chart function
 async function generateChart() {
   if (!validateInputs()) return;
@@ -287,21 +350,18 @@ async function generateChart() {
   chartInfo.classList.add('hidden');
 
   try {
-    const response = await fetch('/api/chart-data/', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': getCookie('csrftoken'),
-      },
-      body: JSON.stringify({
-        company_id: companyId,
-        start_date: startDateValue,
-        end_date: endDateValue,
-        aggregation: aggregation,
-      }),
-    });
+    const maxPoints = Math.floor(
+      getChartDimensions().width / MIN_PIXELS_PER_BAR
+    );
+    const response = await fetchChartData(
+      companyId,
+      startDateValue,
+      endDateValue,
+      aggregation,
+      maxPoints
+    );
 
-    const data = await response.json();
+    const data = await readChartResponse(response);
 
     if (!response.ok) {
       throw new Error(data.error || 'Failed to load chart data');
@@ -358,40 +418,37 @@ async function downloadCSVData() {
   errorMessage.classList.add('hidden');
 
   try {
-    const response = await fetch('/api/chart-data/', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': getCookie('csrftoken'),
-      },
-      body: JSON.stringify({
-        company_id: companyId,
-        start_date: startDateValue,
-        end_date: endDateValue,
-        aggregation: aggregation,
-      }),
+    // The server streams the CSV, so the browser never holds the whole file
+    const params = new URLSearchParams({
+      company_id: companyId,
+      start_date: startDateValue,
+      end_date: endDateValue,
+      aggregation: aggregation,
     });
 
-    const data = await response.json();
-
-    if (!response.ok) {
-      throw new Error(data.error || 'Failed to load data');
+    const url = `/api/export/?${params}`;
+
+    // Check the export first: the browser would save an error response
+    // as the downloaded file
+    const check = await fetch(url, { method: 'HEAD' });
+    if (!check.ok) {
+      throw new Error(
+        check.status === 404
+          ? 'No data found for this company in the selected range'
+          : `CSV export failed (${check.status})`
+      );
     }
 
+    downloadCSV(url);
+
     // Hide CSV loading
     csvLoading.classList.add('hidden');
 
-    // Convert to CSV and download
-    const csvContent = convertToCSV(data.chart_data, data.aggregation);
-    const filename = `${data.company_name}_stock_data_${data.aggregation}_${data.start_date}_to_${data.end_date}.csv`;
-
-    downloadCSV(csvContent, filename);
-
     // Show success message briefly
     const successMsg = document.createElement('div');
     successMsg.className = 'chart-info';
     successMsg.style.backgroundColor = 'var(--success)';
-    successMsg.innerHTML = `<p>CSV downloaded successfully: ${data.data_points} data points</p>`;
+    successMsg.innerHTML = `<p>CSV download started (${aggregation} data)</p>`;
 
     if (!chartPlaceholder.classList.contains('hidden')) {
       chartPlaceholder.style.display = 'none';
@@ -406,11 +463,7 @@ async function downloadCSVData() {
       }
     }, 3000);
 
-    console.log(
-      'CSV downloaded successfully with',
-      data.data_points,
-      'data points'
-    );
+    console.log('CSV download started for', aggregation, 'data');
   } catch (error) {
     console.error('Error downloading CSV:', error);
     csvLoading.classList.add('hidden');
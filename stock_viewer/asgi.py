@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_viewer.settings")
+# Under ASGI the chart endpoints run as async views unless told otherwise
+os.environ.setdefault("STOCK_ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
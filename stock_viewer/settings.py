@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from decouple import config
 
+from stocks.pool import pool_options
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Security settings
@@ -31,8 +33,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "stocks.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "stocks.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -62,9 +65,11 @@ TEMPLATES = [
 WSGI_APPLICATION = "stock_viewer.wsgi.application"
 
 # PostgreSQL Database Configuration - Updated for Docker
+# Connections come from a per-process pool (see stocks/pool.py), so closing
+# one at the end of each request hands it back instead of disconnecting
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "stocks.backends.postgresql",
         "NAME": config("DB_NAME"),
         "USER": config("DB_USER"),
         "PASSWORD": config("DB_PASSWORD"),
@@ -72,6 +77,7 @@ DATABASES = {
         "PORT": config("DB_PORT", default="5432"),
         "OPTIONS": {
             "connect_timeout": 20,
+            "pool": pool_options(config),
         },
     }
 }
@@ -114,6 +120,61 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Custom settings
 STOCK_DATA_PATH = BASE_DIR / "StocksData"
 
+# Where weekly/monthly bars are built: "python" aggregates daily rows with
+# NumPy, "database" lets PostgreSQL aggregate and return only the bars, and
+# "rollup" reads them from the ohlc_weekly/ohlc_monthly tables
+STOCK_AGGREGATION_BACKEND = config("STOCK_AGGREGATION_BACKEND", default="python")
+
+# Browser/proxy freshness for GET chart-data responses; after this they are
+# revalidated with If-None-Match, which is answered without touching the DB
+STOCK_CHART_CACHE_SECONDS = config("STOCK_CHART_CACHE_SECONDS", default=60, cast=int)
+
+# Memory cap for each worker's in-process symbol history cache (0 disables it)
+STOCK_SERIES_CACHE_BYTES = config(
+    "STOCK_SERIES_CACHE_BYTES", default=64 * 1024 * 1024, cast=int
+)
+
+# Most companies a single batch chart-data request may ask for
+STOCK_BATCH_MAX_SYMBOLS = config("STOCK_BATCH_MAX_SYMBOLS", default=50, cast=int)
+
+# Per-worker cache of computed chart indicators, in bytes (0 disables it)
+STOCK_INDICATOR_CACHE_BYTES = config(
+    "STOCK_INDICATOR_CACHE_BYTES", default=16 * 1024 * 1024, cast=int
+)
+
+# Most symbols one analytics request may cover, and how many computed
+# analytics results each worker keeps until the next data version
+STOCK_ANALYTICS_MAX_SYMBOLS = config(
+    "STOCK_ANALYTICS_MAX_SYMBOLS", default=500, cast=int
+)
+STOCK_ANALYTICS_CACHE_ENTRIES = config(
+    "STOCK_ANALYTICS_CACHE_ENTRIES", default=32, cast=int
+)
+
+# Serve the index, chart, batch and analytics views as coroutines (the
+# default under stock_viewer/asgi.py), and how many threads each ASGI worker
+# runs their database queries on
+STOCK_ASYNC_VIEWS = config("STOCK_ASYNC_VIEWS", default=False, cast=bool)
+STOCK_ASYNC_DB_THREADS = config("STOCK_ASYNC_DB_THREADS", default=8, cast=int)
+
+# Log each request's query count, time in queries and time spent obtaining
+# database connections, with the pool's usage, to the "stocks.db" logger
+STOCK_DB_TIMING_LOG = config("STOCK_DB_TIMING_LOG", default=False, cast=bool)
+
+# Send each response's database, aggregation, serialization and template
+# times in a Server-Timing header, and collect per-view latency histograms
+# and counters for /metrics
+STOCK_SERVER_TIMING = config("STOCK_SERVER_TIMING", default=True, cast=bool)
+STOCK_METRICS = config("STOCK_METRICS", default=True, cast=bool)
+
+# Share of requests run under cProfile (0 disables profiling), and how slow
+# one must be, in milliseconds, for its profile to be saved
+STOCK_PROFILE_SAMPLE_RATE = config("STOCK_PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+STOCK_PROFILE_SLOW_MS = config("STOCK_PROFILE_SLOW_MS", default=500, cast=int)
+STOCK_PROFILE_DIR = config(
+    "STOCK_PROFILE_DIR", default=str(BASE_DIR / "var" / "profiles")
+)
+
 # Internationalization
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
@@ -1,14 +1,144 @@
+from datetime import date, timedelta
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, PAGE_VAR, ChangeList
+from django.db.models import F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from .models import Company, StockData
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
-    list_display = ("name", "symbol", "created_at")
+    list_display = (
+        "name",
+        "symbol",
+        "first_date",
+        "last_date",
+        "row_count",
+        "last_close",
+        "last_change",
+    )
     search_fields = ("name", "symbol")
     list_filter = ("created_at",)
     ordering = ("name",)
 
+    # Catalog columns are maintained by the loaders
+    readonly_fields = (
+        "first_date",
+        "last_date",
+        "row_count",
+        "last_close",
+        "last_change",
+    )
+
+
+# Query parameter carrying the (date, company_symbol) of the last row shown
+AFTER_VAR = "after"
+
+
+class CompanySymbolFilter(admin.SimpleListFilter):
+    """Symbol choices from the company catalog instead of a DISTINCT scan"""
+
+    title = "company symbol"
+    parameter_name = "company_symbol"
+
+    def lookups(self, request, model_admin):
+        return (
+            Company.objects.filter(last_date__isnull=False)
+            .order_by("symbol")
+            .values_list("symbol", "symbol")
+        )
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(company_symbol=self.value())
+        return queryset
+
+
+class RecentDateFilter(admin.SimpleListFilter):
+    """Trailing windows ending at the newest date in the catalog"""
+
+    title = "date"
+    parameter_name = "within_days"
+    WINDOWS = {"7": "Last week", "31": "Last month", "366": "Last year"}
+
+    def lookups(self, request, model_admin):
+        return list(self.WINDOWS.items())
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.WINDOWS:
+            return queryset
+        latest = Company.objects.aggregate(latest=Max("last_date"))["latest"]
+        if latest is None:
+            return queryset
+        return queryset.filter(date__gt=latest - timedelta(days=int(self.value())))
+
+
+class KeysetChangeList(ChangeList):
+    """Changelist paging by (date, company_symbol) instead of OFFSET
+
+    Only used with the default ordering; sorting by a column or asking for
+    a numbered page falls back to the regular paginator.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = None
+        self.next_cursor = None
+        self.keyset = not any(
+            name in request.GET for name in (ORDER_VAR, PAGE_VAR, ALL_VAR)
+        )
+        if self.keyset and request.GET.get(AFTER_VAR):
+            try:
+                day, symbol = request.GET[AFTER_VAR].split(",", 1)
+                self.after = (date.fromisoformat(day), symbol)
+            except ValueError:
+                raise IncorrectLookupParameters
+        super().__init__(request, *args, **kwargs)
+
+        # Links built from here on (filters, search) start from the top
+        self.params.pop(AFTER_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        if self.after is not None:
+            day, symbol = self.after
+            queryset = queryset.filter(
+                Q(date__lt=day) | Q(date=day, company_symbol__gt=symbol)
+            )
+
+        # One extra row tells whether there is a next page, without counting
+        rows = list(queryset[: self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.next_cursor = f"{last.date.isoformat()},{last.company_symbol}"
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows[: self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = self.after is not None or self.next_cursor is not None
+
+    def next_page_url(self):
+        return self.get_query_string({AFTER_VAR: self.next_cursor})
+
+    def first_page_url(self):
+        return self.get_query_string()
+
 
 @admin.register(StockData)
 class StockDataAdmin(admin.ModelAdmin):
@@ -21,21 +151,39 @@ class StockDataAdmin(admin.ModelAdmin):
         "volume",
         "file_source",
     )
-    list_filter = ("company_symbol", "date", "file_source")
-    search_fields = ("company_symbol",)
-    date_hierarchy = "date"
+    # Filter choices come from the catalog rather than DISTINCT scans
+    list_filter = (CompanySymbolFilter, RecentDateFilter)
+    search_fields = ("=company_symbol",)
     ordering = ("-date", "company_symbol")
 
     # Limit the number of objects per page for performance
     list_per_page = 50
 
+    # Planner row estimates instead of exact COUNT(*) over the whole table
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     # Read-only fields to prevent accidental modification
     readonly_fields = ("created_at",)
 
     def company_name(self, obj):
-        return obj.company_name
+        return obj.catalog_name
 
     company_name.short_description = "Company Name"
+    company_name.admin_order_field = "catalog_name"
 
     def get_queryset(self, request):
-        return super().get_queryset(request)
+        # Resolve company names in the page query rather than once per row
+        names = Company.objects.filter(symbol=OuterRef("company_symbol"))
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                catalog_name=Coalesce(
+                    Subquery(names.values("name")[:1]), F("company_symbol")
+                )
+            )
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
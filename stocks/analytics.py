@@ -0,0 +1,116 @@
+import numpy as np
+
+# Trading days per year, used to annualise daily volatility
+TRADING_DAYS = 252
+
+# Overlapping returns two symbols need before their correlation is reported
+MIN_CORRELATION_PERIODS = 2
+
+
+def close_matrix(histories, symbols):
+    """Align closes of several symbols on their shared trading calendar
+
+    Returns (dates, closes) where closes has one row per date traded by any
+    symbol and one column per symbol, NaN where that symbol has no bar.
+    """
+    series = [histories[symbol] for symbol in symbols]
+    lengths = [len(history) for history in series]
+    if not sum(lengths):
+        return np.empty(0, dtype="datetime64[D]"), np.empty((0, len(symbols)))
+
+    dates = np.concatenate([history.dates for history in series])
+    columns = np.repeat(np.arange(len(symbols)), lengths)
+    calendar, rows = np.unique(dates, return_inverse=True)
+
+    closes = np.full((len(calendar), len(symbols)), np.nan)
+    closes[rows, columns] = np.concatenate([history.closes for history in series])
+    return calendar, closes
+
+
+def forward_fill(matrix):
+    """Carry each column's last value over the NaN rows that follow it"""
+    rows = np.where(~np.isnan(matrix), np.arange(len(matrix))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(matrix, rows, axis=0)
+
+
+def daily_returns(closes):
+    """Simple returns between consecutive rows of a close matrix
+
+    A return is reported on every date the symbol traded, measured from its
+    previous close even if other symbols traded in between; it is NaN on
+    dates the symbol did not trade and on its first date.
+    """
+    filled = forward_fill(closes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1.0
+    returns[np.isnan(closes[1:])] = np.nan
+    return returns
+
+
+def correlation_matrix(returns, min_periods=MIN_CORRELATION_PERIODS):
+    """Pearson correlation of every pair of columns over their common rows
+
+    Pairwise-complete sums come from a handful of matrix products, so the
+    whole matrix costs a few BLAS calls instead of one pass per pair.
+    """
+    valid = (~np.isnan(returns)).astype(np.float64)
+    values = np.where(valid > 0, returns, 0.0)
+
+    # [i, j] sums run over the rows where both column i and column j are set
+    count = valid.T @ valid
+    sum_x = values.T @ valid
+    sum_xx = (values * values).T @ valid
+    sum_xy = values.T @ values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sum_xy - sum_x * sum_x.T / count
+        variance_x = sum_xx - sum_x * sum_x / count
+        variance_y = variance_x.T
+        correlation = covariance / np.sqrt(variance_x * variance_y)
+
+    correlation[count < min_periods] = np.nan
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def volatility(returns):
+    """Annualised standard deviation of each column's returns"""
+    count = np.count_nonzero(~np.isnan(returns), axis=0)
+    result = np.full(returns.shape[1], np.nan)
+    enough = count > 1
+    if np.any(enough):
+        result[enough] = np.nanstd(returns[:, enough], axis=0, ddof=1)
+    return result * np.sqrt(TRADING_DAYS)
+
+
+def drawdowns(closes):
+    """Decline of each close from the highest close before it, as a fraction"""
+    peaks = np.fmax.accumulate(closes, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return closes / peaks - 1.0
+
+
+def summarise(histories, symbols, window=0):
+    """Returns, correlation, volatility and drawdown for several symbols
+
+    With window > 0 the correlation and volatility use only the last window
+    dates of the range; returns and drawdowns always cover all of it. At
+    least one symbol must have a bar in histories.
+    """
+    dates, closes = close_matrix(histories, symbols)
+    returns = daily_returns(closes)
+    recent = returns[-window:] if window > 0 else returns
+    drawdown = drawdowns(closes)
+
+    with np.errstate(invalid="ignore"):
+        max_drawdown = np.min(np.where(np.isnan(drawdown), 0.0, drawdown), axis=0)
+    max_drawdown[np.all(np.isnan(closes), axis=0)] = np.nan
+
+    return {
+        "dates": dates[1:],
+        "returns": returns,
+        "drawdown": drawdown[1:],
+        "correlation": correlation_matrix(recent),
+        "volatility": volatility(recent),
+        "max_drawdown": max_drawdown,
+    }
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import views
+from .cache import company_directory
+from .models import Company
+from .queries import fetch_bars, fetch_indicator_history, fetch_indicators
+from .resample import FREQUENCIES
+from .timing import phase
+from .wire import wants_columnar
+
+logger = logging.getLogger(__name__)
+
+# Django 4.2's async ORM runs every query on one shared thread, so queries of
+# concurrent requests would queue behind each other. Blocking work runs on
+# this pool instead, borrowing connections from the database pool per call.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.STOCK_ASYNC_DB_THREADS, thread_name_prefix="stocks-db"
+)
+
+
+def in_thread(func):
+    """Wrap a blocking function to be awaited on the database thread pool"""
+
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Pool threads outlive requests, so hand connections back here
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=db_executor)
+
+
+def threaded_view(view):
+    """Serve a synchronous view from the database thread pool under ASGI"""
+
+    async def async_view(request, *args, **kwargs):
+        return await in_thread(view)(request, *args, **kwargs)
+
+    async_view = wraps(view)(async_view)
+    async_view.csrf_exempt = getattr(view, "csrf_exempt", False)
+    return async_view
+
+
+def conditional_response(request, etag_func, last_modified_func):
+    """Async counterpart of the condition decorator's precondition check
+
+    Returns (response, etag, last_modified), where response is a 304 or 412
+    when the request's preconditions settle it and None otherwise.
+    """
+    etag = etag_func(request)
+    etag = quote_etag(etag) if etag else None
+    last_modified = last_modified_func(request)
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return response, etag, last_modified
+
+
+def set_validators(request, response, etag, last_modified):
+    """Add ETag and Last-Modified the way the condition decorator does"""
+    if request.method in ("GET", "HEAD"):
+        if last_modified and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if etag:
+            response.headers.setdefault("ETag", etag)
+    return response
+
+
+async def index(request):
+    companies = await in_thread(list)(
+        Company.objects.filter(last_date__isnull=False).order_by("symbol")
+    )
+    with phase("template"):
+        return render(request, "stocks/index.html", views.index_context(companies))
+
+
+async def build_chart_response(
+    company_id,
+    start_date,
+    end_date,
+    aggregation,
+    max_points=None,
+    columnar=False,
+    indicators=(),
+):
+    """Async build_chart_response, fetching bars and indicator warm-up together"""
+    params = views.parse_chart_params(
+        company_id, start_date, end_date, max_points, indicators
+    )
+    if isinstance(params, HttpResponse):
+        return params
+    max_points, specs = params
+
+    company = await in_thread(company_directory.get)(company_id)
+    if company is None:
+        return JsonResponse({"error": "Company not found"}, status=404)
+    company_symbol, company_name = company
+
+    if aggregation not in FREQUENCIES:
+        aggregation_level = "daily"
+    else:
+        aggregation_level = aggregation
+
+    if not specs:
+        bars = await in_thread(fetch_bars)(
+            company_symbol, start_date, end_date, aggregation_level
+        )
+        indicator_data = {}
+    else:
+        # The bars and the longer history the indicators warm up on are
+        # independent queries, so they run side by side
+        bars, history = await asyncio.gather(
+            in_thread(fetch_bars)(
+                company_symbol, start_date, end_date, aggregation_level
+            ),
+            in_thread(fetch_indicator_history)(
+                company_symbol, start_date, end_date, aggregation_level, specs
+            ),
+        )
+        indicator_data = {}
+        if len(bars):
+            indicator_data = await in_thread(fetch_indicators)(
+                company_symbol,
+                bars,
+                start_date,
+                end_date,
+                aggregation_level,
+                specs,
+                history=history,
+            )
+
+    meta = {
+        "company_name": company_name,
+        "start_date": start_date,
+        "end_date": end_date,
+        "aggregation": aggregation,
+    }
+    return views.render_chart_response(bars, indicator_data, max_points, columnar, meta)
+
+
+async def get_chart_data(request):
+    if request.method in ("GET", "HEAD"):
+        response, etag, last_modified = conditional_response(
+            request, views.chart_data_etag, views.chart_data_last_modified
+        )
+        if response is not None:
+            # A 304 carries the Vary header its 200 would have
+            patch_vary_headers(response, ["Accept"])
+            return response
+
+        try:
+            response = await build_chart_response(
+                request.GET.get("company_id"),
+                request.GET.get("start_date"),
+                request.GET.get("end_date"),
+                request.GET.get("aggregation", "daily"),
+                request.GET.get("max_points"),
+                columnar=wants_columnar(request),
+                indicators=views.split_list(request.GET.get("indicators")),
+            )
+        except Exception as e:
+            logger.exception("Error in get_chart_data")
+            response = JsonResponse({"error": str(e)}, status=500)
+        else:
+            response = views.cache_chart_response(response)
+
+        return set_validators(request, response, etag, last_modified)
+
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            return await build_chart_response(
+                data.get("company_id"),
+                data.get("start_date"),
+                data.get("end_date"),
+                data.get("aggregation", "daily"),
+                data.get("max_points"),
+                columnar=wants_columnar(request),
+                indicators=views.split_list(data.get("indicators")),
+            )
+
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON data"}, status=400)
+        except Exception as e:
+            logger.exception("Error in get_chart_data")
+            return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse({"error": "Method not allowed"}, status=405)
+
+
+# csrf_exempt only learns to wrap coroutine functions in Django 5.0
+get_chart_data.csrf_exempt = True
+
+
+async def stream_in_thread(chunks):
+    """Async iterator pulling each chunk of a blocking iterator on one thread
+
+    Django 4.2 consumes a synchronous streaming body under ASGI with
+    sync_to_async(list), which holds the whole body in memory. Pulling one
+    chunk at a time keeps it streaming, and the dedicated thread keeps a
+    server-side cursor on the connection that opened it.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stocks-stream")
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=False, executor=executor)
+    try:
+        while True:
+            chunk = await pull(chunks, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(finish_stream, thread_sensitive=False, executor=executor)(
+            chunks
+        )
+        executor.shutdown(wait=False)
+
+
+def finish_stream(chunks):
+    """Close a stream's iterators and its thread's connection"""
+    try:
+        chunks.close()
+    finally:
+        close_old_connections()
+
+
+async def export_csv(request):
+    export = await in_thread(views.prepare_export)(request)
+    if isinstance(export, HttpResponse):
+        return export
+    chunks, content_type, filename = export
+    return views.export_response(stream_in_thread(chunks), content_type, filename)
+
+
+# Responses built in full can be served from the pool as they are
+get_batch_chart_data = threaded_view(views.get_batch_chart_data)
+get_analytics = threaded_view(views.get_analytics)
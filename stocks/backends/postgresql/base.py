@@ -0,0 +1,72 @@
+import threading
+import time
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from ...timing import record_wait, time_query
+from ...pool import ConnectionPool
+from .creation import DatabaseCreation
+
+# One pool per database per process, shared by every thread's connection
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(dbname, connect, options):
+    with pools_lock:
+        if dbname not in pools:
+            pools[dbname] = ConnectionPool(connect, **options)
+        return pools[dbname]
+
+
+def close_pools(dbname=None):
+    """Close the pools of one database, or all of them"""
+    with pools_lock:
+        names = [dbname] if dbname is not None else list(pools)
+        closing = [pools.pop(name) for name in names if name in pools]
+    for pool in closing:
+        pool.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend borrowing connections from a ConnectionPool
+
+    Pool settings go in OPTIONS["pool"] as ConnectionPool keyword arguments;
+    without them every connection is opened and closed as usual. Closing
+    the connection, e.g. at the end of a request, returns it to the pool.
+    Queries and connection waits are added to the current RequestTiming.
+    """
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.execute_wrappers.append(time_query)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options:
+            connection = super().get_new_connection(conn_params)
+        else:
+            self.pool = get_pool(
+                conn_params.get("dbname"),
+                partial(super().get_new_connection, conn_params),
+                options,
+            )
+            connection = self.pool.getconn()
+        record_wait(time.perf_counter() - started)
+        return connection
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection)
@@ -0,0 +1,10 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the database from being dropped
+        from .base import close_pools
+
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,192 @@
+# Kept free of Django imports: microbenchmarks of the data path, run over
+# synthetic datasets by benchmark.py
+import io
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .ingest import CurrencyStripper, read_csv_chunks
+from .resample import resample, series_from_rows
+from .synthetic import generate_dataset, synthetic_symbols
+
+# Dataset size -> (symbols, years of daily bars)
+SIZES = {
+    "small": (12, 10),
+    "medium": (50, 20),
+    "large": (200, 30),
+}
+
+# Fixed so a dataset, and so a baseline, is the same on every run
+DATASET_END = "2025-06-06"
+DATASET_SEED = 0
+
+# Timings shorter than this are too noisy to call a regression
+MIN_SECONDS = 0.001
+
+
+def dataset(folder, size):
+    """CSV paths of a synthetic dataset, generated into folder on first use"""
+    symbols, years = SIZES[size]
+    folder = os.path.join(folder, size)
+    paths = [
+        os.path.join(folder, f"{symbol}.csv") for symbol in synthetic_symbols(symbols)
+    ]
+    if not all(os.path.exists(path) for path in paths):
+        paths = generate_dataset(
+            folder,
+            synthetic_symbols(symbols),
+            years,
+            seed=DATASET_SEED,
+            end=DATASET_END,
+        )
+    return paths
+
+
+def load_series(paths):
+    """Each file's bars as an OHLCSeries, oldest first"""
+    histories = []
+    for path in paths:
+        df = pd.concat(read_csv_chunks(path), ignore_index=True)
+        rows = zip(
+            df["Date"].dt.date,
+            df["Open"],
+            df["High"],
+            df["Low"],
+            df["Close/Last"],
+            df["Volume"],
+        )
+        histories.append(resample(series_from_rows(rows), "daily"))
+    return histories
+
+
+def strip_currency(paths):
+    """Read every file through CurrencyStripper, dropping the "$" signs"""
+    for path in paths:
+        with open(path, "rb") as raw, io.BufferedReader(CurrencyStripper(raw)) as f:
+            while f.read(1 << 20):
+                pass
+
+
+def parse_csv(paths):
+    """Parse every file into typed DataFrame chunks, as the loaders do"""
+    for path in paths:
+        for _ in read_csv_chunks(path):
+            pass
+
+
+def resample_all(histories, frequency):
+    for series in histories:
+        resample(series, frequency)
+
+
+def cases(paths, histories):
+    """Benchmark name -> zero-argument callable timed over one dataset"""
+    return {
+        "strip_currency": lambda: strip_currency(paths),
+        "parse_csv": lambda: parse_csv(paths),
+        "resample_weekly": lambda: resample_all(histories, "weekly"),
+        "resample_monthly": lambda: resample_all(histories, "monthly"),
+    }
+
+
+def measure(func, repeat=5, setup=None):
+    """Time func repeat times, then trace one more call for its peak memory
+
+    Tracing slows allocation down, so the timed calls run untraced. The
+    peak covers Python and NumPy allocations made by this process. setup,
+    if given, runs untimed before every call.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "peak_bytes": peak,
+    }
+
+
+def environment():
+    """What produced a set of results, to tell apart baselines"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Describe every case slower or hungrier than baseline by over tolerance
+
+    Results and baseline map size -> case -> measurement. Cases missing
+    from the baseline are not compared.
+    """
+    regressions = []
+    for size, measured in results.items():
+        for case, stats in measured.items():
+            base = baseline.get(size, {}).get(case)
+            if base is None:
+                continue
+            limit = 1 + tolerance
+            if (
+                stats["seconds"] > base["seconds"] * limit
+                and stats["seconds"] - base["seconds"] > MIN_SECONDS
+            ):
+                regressions.append(
+                    f"{size}/{case}: {stats['seconds'] * 1000:.1f} ms, "
+                    f"baseline {base['seconds'] * 1000:.1f} ms"
+                )
+            if stats["peak_bytes"] > base["peak_bytes"] * limit:
+                regressions.append(
+                    f"{size}/{case}: peak {format_bytes(stats['peak_bytes'])}, "
+                    f"baseline {format_bytes(base['peak_bytes'])}"
+                )
+    return regressions
+
+
+def format_bytes(value):
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def format_results(results, baseline=None):
+    """Render results as text, with the ratio to a baseline where known"""
+    lines = [f"{'size':<7} {'case':<18} {'time ms':>10} {'peak':>10}"]
+    for size, measured in results.items():
+        for case, stats in measured.items():
+            line = (
+                f"{size:<7} {case:<18} {stats['seconds'] * 1000:>10.1f} "
+                f"{format_bytes(stats['peak_bytes']):>10}"
+            )
+            base = (baseline or {}).get(size, {}).get(case)
+            if base is not None:
+                line += (
+                    f"   x{stats['seconds'] / base['seconds']:.2f} time, "
+                    f"x{stats['peak_bytes'] / max(base['peak_bytes'], 1):.2f} peak"
+                )
+            lines.append(line)
+    return "\n".join(lines)
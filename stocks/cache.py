@@ -0,0 +1,269 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .dataversion import read_version
+from .models import Company, StockData
+from .resample import series_by_symbol
+from .snapshot import SnapshotReader
+
+
+def load_histories(symbols):
+    """Fetch the full daily history of several symbols with one query"""
+    rows = (
+        StockData.objects.filter(company_symbol__in=symbols)
+        .order_by("company_symbol", "date")
+        .bar_rows("company_symbol")
+    )
+    return series_by_symbol(rows, symbols)
+
+
+class SeriesCache:
+    """Per-process LRU cache of full symbol histories keyed by company_symbol"""
+
+    def __init__(self, max_bytes, loader=load_histories):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.version = None
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _check_version(self):
+        """Drop every cached series once a loader publishes a new version"""
+        version = read_version()
+        if version != self.version:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.version = version
+
+    def _store(self, symbol, series):
+        if series.nbytes > self.max_bytes:
+            return
+
+        # Another request may have loaded the same symbol meanwhile
+        previous = self._entries.pop(symbol, None)
+        if previous is not None:
+            self.total_bytes -= previous.nbytes
+        self._entries[symbol] = series
+        self.total_bytes += series.nbytes
+
+        # Evict least recently used series until we are back under the cap
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+
+    def get_many(self, symbols):
+        """Return {symbol: series}, loading all misses with a single query
+
+        The query runs without the lock, so hits and other requests' loads
+        are not held up behind it; two requests missing the same symbol at
+        once may both load it.
+        """
+        with self._lock:
+            self._check_version()
+            version = self.version
+
+            found = {}
+            for symbol in symbols:
+                if symbol in self._entries:
+                    self._entries.move_to_end(symbol)
+                    found[symbol] = self._entries[symbol]
+
+        missing = [symbol for symbol in symbols if symbol not in found]
+        if not missing:
+            return found
+
+        loaded = self.loader(missing)
+        found.update(loaded)
+        with self._lock:
+            self._check_version()
+            # Rows read across a version change may be the old ones
+            if self.version == version:
+                for symbol, series in loaded.items():
+                    self._store(symbol, series)
+        return found
+
+    def get(self, symbol):
+        """Return the full history of one symbol"""
+        return self.get_many([symbol])[symbol]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.version = None
+
+
+class CompanyDirectory:
+    """Per-process map of company id to (symbol, name)"""
+
+    def __init__(self):
+        self.version = None
+        self._companies = {}
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Reload every company once a loader publishes a new version"""
+        version = read_version()
+        if version != self.version:
+            self._companies = {
+                pk: (symbol, name)
+                for pk, symbol, name in Company.objects.values_list(
+                    "id", "symbol", "name"
+                )
+            }
+            self._names = dict(self._companies.values())
+            self.version = version
+
+    def get(self, company_id):
+        """Return (symbol, name) for a company id, or None if it does not exist"""
+        try:
+            company_id = int(company_id)
+        except (TypeError, ValueError):
+            return None
+
+        with self._lock:
+            self._refresh()
+
+            # Companies can be added by a loader before it bumps the version
+            if company_id not in self._companies:
+                company = (
+                    Company.objects.filter(id=company_id)
+                    .values_list("symbol", "name")
+                    .first()
+                )
+                if company is None:
+                    return None
+                self._companies[company_id] = company
+                self._names[company[0]] = company[1]
+
+            return self._companies[company_id]
+
+    def name_for_symbol(self, symbol):
+        """Return the display name for a symbol, falling back to the symbol"""
+        with self._lock:
+            self._refresh()
+            return self._names.get(symbol, symbol)
+
+
+class IndicatorCache:
+    """Per-process LRU cache of computed indicator columns
+
+    Entries are keyed by (symbol, aggregation, indicator key) and remember
+    the date range their bars were fetched over, so a request is served if
+    that range covers its warm-up start and end date.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _check_version(self):
+        version = read_version()
+        if version != self.version:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.version = version
+
+    def get(self, key, start, end):
+        """Return (dates, columns) computed over a range covering [start, end]"""
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] > start or entry[1] < end:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2], entry[3]
+
+    def put(self, key, start, end, dates, columns):
+        size = dates.nbytes + sum(values.nbytes for values in columns.values())
+        with self._lock:
+            self._check_version()
+            if size > self.max_bytes:
+                return
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[4]
+            self._entries[key] = (start, end, dates, columns, size)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted[4]
+
+
+class ResultCache:
+    """Per-process LRU of computed responses, dropped on a new data version"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            version = read_version()
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            if not self.enabled or read_version() != self.version:
+                return
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+series_cache = SeriesCache(settings.STOCK_SERIES_CACHE_BYTES)
+indicator_cache = IndicatorCache(settings.STOCK_INDICATOR_CACHE_BYTES)
+analytics_cache = ResultCache(settings.STOCK_ANALYTICS_CACHE_ENTRIES)
+snapshot_reader = SnapshotReader()
+company_directory = CompanyDirectory()
+
+
+def get_histories(symbols):
+    """Return {symbol: full history}, or None when no in-memory source is on
+
+    Symbols found in the shared snapshot are returned as zero-copy views;
+    the rest come from this worker's series cache.
+    """
+    histories = {}
+    snapshot = snapshot_reader.current()
+    if snapshot is not None:
+        histories = {
+            symbol: snapshot.series(symbol) for symbol in symbols if symbol in snapshot
+        }
+
+    missing = [symbol for symbol in symbols if symbol not in histories]
+    if missing:
+        if not series_cache.enabled:
+            return None
+        histories.update(series_cache.get_many(missing))
+
+    return histories
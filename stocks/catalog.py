@@ -0,0 +1,99 @@
+# Kept free of Django imports so the standalone loaders can refresh it.
+# Per-symbol summary stored on stocks_company for the index page
+CATALOG_SELECT_SQL = """
+    SELECT
+        summary.company_symbol,
+        summary.company_symbol,
+        CURRENT_TIMESTAMP,
+        summary.first_date,
+        summary.last_date,
+        summary.row_count,
+        latest.closes[1],
+        latest.closes[1] - latest.closes[2]
+    FROM (
+        SELECT company_symbol, MIN(date) AS first_date, MAX(date) AS last_date,
+               COUNT(*) AS row_count
+        FROM ohlc_data
+        {where}
+        GROUP BY company_symbol
+    ) summary
+    CROSS JOIN LATERAL (
+        SELECT array_agg(close ORDER BY date DESC) AS closes
+        FROM (
+            SELECT close, date
+            FROM ohlc_data
+            WHERE ohlc_data.company_symbol = summary.company_symbol
+            ORDER BY date DESC
+            LIMIT 2
+        ) last_two
+    ) latest
+"""
+
+# Display names set elsewhere are kept; only the summary columns change
+CATALOG_UPSERT_SQL = (
+    """
+    INSERT INTO stocks_company
+        (name, symbol, created_at, first_date, last_date, row_count,
+         last_close, last_change)
+"""
+    + CATALOG_SELECT_SQL
+    + """
+    ON CONFLICT (symbol) DO UPDATE SET
+        first_date = EXCLUDED.first_date,
+        last_date = EXCLUDED.last_date,
+        row_count = EXCLUDED.row_count,
+        last_close = EXCLUDED.last_close,
+        last_change = EXCLUDED.last_change
+"""
+)
+
+
+# Companies whose rows are all gone drop out of the index page
+CATALOG_RESET_SQL = """
+    UPDATE stocks_company
+    SET first_date = NULL, last_date = NULL, row_count = 0,
+        last_close = NULL, last_change = NULL
+    WHERE {where}
+"""
+
+
+def refresh_catalog(cursor, symbols, removed=False):
+    """Recompute the catalog entries of the symbols an import touched
+
+    With removed, rows may also have been deleted, so symbols left without
+    any are reset.
+    """
+    symbols = sorted(symbols)
+    if symbols:
+        if removed:
+            cursor.execute(
+                CATALOG_RESET_SQL.format(
+                    where="symbol = ANY(%s) AND NOT EXISTS (SELECT 1 FROM ohlc_data"
+                    " WHERE company_symbol = stocks_company.symbol)"
+                ),
+                [symbols],
+            )
+        cursor.execute(
+            CATALOG_UPSERT_SQL.format(where="WHERE company_symbol = ANY(%s)"),
+            [symbols],
+        )
+    return len(symbols)
+
+
+def rebuild_catalog(cursor):
+    """Recompute every catalog entry from ohlc_data"""
+    cursor.execute(
+        CATALOG_RESET_SQL.format(
+            where="symbol NOT IN (SELECT DISTINCT company_symbol FROM ohlc_data)"
+        )
+    )
+    cursor.execute(CATALOG_UPSERT_SQL.format(where=""))
+
+
+def catalog_missing(cursor):
+    """Whether ohlc_data has rows but no company carries catalog metadata"""
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM ohlc_data)"
+        " AND NOT EXISTS (SELECT 1 FROM stocks_company WHERE last_date IS NOT NULL);"
+    )
+    return cursor.fetchone()[0]
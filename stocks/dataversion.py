@@ -0,0 +1,48 @@
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from decouple import config
+
+# Kept free of Django imports so the standalone loaders can bump it too
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DATA_VERSION_FILE = config(
+    "STOCK_DATA_VERSION_FILE", default=str(BASE_DIR / "var" / "data_version")
+)
+
+
+def read_version(path=DATA_VERSION_FILE):
+    """Return the current dataset version stamp, or "0" if none was written"""
+    try:
+        with open(path) as version_file:
+            return version_file.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def version_datetime(version):
+    """Return when a version was published, or None if it carries no time"""
+    if not version.isdigit() or version == "0":
+        return None
+    return datetime.fromtimestamp(int(version) / 1e9, tz=timezone.utc)
+
+
+def new_version():
+    """Generate a fresh, monotonically increasing version string"""
+    return str(time.time_ns())
+
+
+def bump_version(version=None, path=DATA_VERSION_FILE):
+    """Publish a new dataset version so cached series are dropped"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    version = version or new_version()
+
+    # Write then rename so readers never see a partially written stamp
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as version_file:
+        version_file.write(version)
+    os.replace(temp_path, path)
+
+    return version
@@ -0,0 +1,94 @@
+import csv
+import zlib
+from datetime import timedelta
+from itertools import groupby
+
+# Rows pulled from the database cursor per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Flush the CSV buffer once it holds about this many characters
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+EXPORT_HEADER = ["Symbol", "Date", "Open", "High", "Low", "Close", "Volume"]
+
+
+def bucket_start(day, frequency):
+    """First day of the bucket holding day, matching resample.bucket_labels"""
+    if frequency == "weekly":
+        return day - timedelta(days=day.weekday())
+    if frequency == "monthly":
+        return day.replace(day=1)
+    if frequency == "quarterly":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if frequency == "yearly":
+        return day.replace(month=1, day=1)
+    return day
+
+
+def stream_bars(rows, frequency):
+    """Aggregate (symbol, date, open, high, low, close, volume) rows lazily
+
+    Rows must be ordered by (symbol, date). Only the rows of the bucket being
+    built are held at a time, so memory stays flat for any export size.
+    """
+    if frequency == "daily":
+        yield from rows
+        return
+
+    buckets = groupby(rows, key=lambda row: (row[0], bucket_start(row[1], frequency)))
+    for (symbol, label), bucket in buckets:
+        bucket = list(bucket)
+        yield (
+            symbol,
+            label,
+            bucket[0][2],
+            max(row[3] for row in bucket),
+            min(row[4] for row in bucket),
+            bucket[-1][5],
+            sum(row[6] for row in bucket),
+        )
+
+
+class Echo:
+    """File-like object whose write() hands the value straight back"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(bars):
+    """Render bars as CSV text in buffered chunks"""
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(EXPORT_HEADER)]
+    size = len(buffer[0])
+
+    for symbol, day, open_, high, low, close, volume in bars:
+        line = writer.writerow(
+            [
+                symbol,
+                day.isoformat(),
+                f"{open_:.2f}",
+                f"{high:.2f}",
+                f"{low:.2f}",
+                f"{close:.2f}",
+                volume,
+            ]
+        )
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def gzip_chunks(chunks):
+    """Compress text chunks into a single gzip stream"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,250 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Most indicators one chart request may ask for
+MAX_INDICATORS = 8
+
+# Rough calendar days per bar, used to turn a warm-up in bars into dates
+BAR_DAYS = {
+    "daily": 7 / 5,
+    "weekly": 7,
+    "monthly": 31,
+    "quarterly": 92,
+    "yearly": 366,
+}
+
+# Warm-up lengths after which an exponential average's seed weighs < 0.05%
+EMA_WARMUP = 4
+WILDER_WARMUP = 10
+
+
+def rolling_windows(values, length):
+    """Windows of length consecutive values, one per value from length - 1"""
+    return sliding_window_view(values, length)
+
+
+def pad(values, total):
+    """Left-pad computed values with NaN to line up with the input bars"""
+    return np.concatenate((np.full(total - len(values), np.nan), values))
+
+
+def sma_values(values, length):
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return pad(rolling_windows(values, length).mean(axis=1), len(values))
+
+
+def std_values(values, length):
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return pad(rolling_windows(values, length).std(axis=1), len(values))
+
+
+def smooth(values, alpha, seed, start):
+    """Exponential smoothing of values[start:] starting from seed
+
+    Returns NaN before start. y[t] = (1 - alpha) * y[t-1] + alpha * x[t] is
+    evaluated in closed form over blocks short enough for the decay powers
+    to stay finite, so there is no per-element Python loop.
+    """
+    result = np.full(len(values), np.nan)
+    if start >= len(values):
+        return result
+    result[start] = seed
+
+    decay = 1.0 - alpha
+    if decay == 0.0:
+        result[start + 1 :] = values[start + 1 :]
+        return result
+
+    # decay ** -block must stay well inside the float64 range
+    block = max(1, int(200 / -math.log10(decay)))
+    previous = seed
+    position = start + 1
+    while position < len(values):
+        chunk = values[position : position + block]
+        powers = decay ** np.arange(len(chunk))
+        weighted = np.cumsum(chunk / powers) * powers
+        chunk_result = decay * powers * previous + alpha * weighted
+        result[position : position + len(chunk)] = chunk_result
+        previous = chunk_result[-1]
+        position += len(chunk)
+    return result
+
+
+def ema_values(values, length):
+    """EMA seeded with the SMA of its first length values"""
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return smooth(values, 2.0 / (length + 1), values[:length].mean(), length - 1)
+
+
+def wilder_values(values, length):
+    """Wilder's moving average (alpha = 1 / length) seeded with an SMA"""
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return smooth(values, 1.0 / length, values[:length].mean(), length - 1)
+
+
+def sma(series, length=20):
+    return {"sma": sma_values(series.closes, length)}
+
+
+def ema(series, length=20):
+    return {"ema": ema_values(series.closes, length)}
+
+
+def rsi(series, length=14):
+    changes = np.diff(series.closes)
+    gains = wilder_values(np.clip(changes, 0, None), length)
+    losses = wilder_values(np.clip(-changes, 0, None), length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - 100.0 / (1.0 + gains / losses)
+    # No losses over the window means maximal strength, not a division error
+    values[(losses == 0) & ~np.isnan(gains)] = 100.0
+    return {"rsi": pad(values, len(series))}
+
+
+def macd(series, fast=12, slow=26, signal=9):
+    line = ema_values(series.closes, fast) - ema_values(series.closes, slow)
+    valid = np.flatnonzero(~np.isnan(line))
+    signal_line = np.full(len(series), np.nan)
+    if len(valid):
+        signal_line[valid[0] :] = ema_values(line[valid[0] :], signal)
+    return {
+        "macd": line,
+        "macd_signal": signal_line,
+        "macd_hist": line - signal_line,
+    }
+
+
+def bollinger(series, length=20, width=2.0):
+    middle = sma_values(series.closes, length)
+    spread = width * std_values(series.closes, length)
+    return {
+        "bollinger_upper": middle + spread,
+        "bollinger_middle": middle,
+        "bollinger_lower": middle - spread,
+    }
+
+
+def atr(series, length=14):
+    previous = np.concatenate(([np.nan], series.closes[:-1]))
+    ranges = np.fmax(
+        series.highs - series.lows,
+        np.fmax(np.abs(series.highs - previous), np.abs(series.lows - previous)),
+    )
+    return {"atr": wilder_values(ranges, length)}
+
+
+def vwap(series, length=0):
+    """Volume-weighted typical price, anchored at the first bar or rolling"""
+    typical = (series.highs + series.lows + series.closes) / 3.0
+    volumes = series.volumes.astype(np.float64)
+    if length <= 0:
+        traded, volume = np.cumsum(typical * volumes), np.cumsum(volumes)
+    elif len(series) < length:
+        return {"vwap": np.full(len(series), np.nan)}
+    else:
+        traded = pad(
+            rolling_windows(typical * volumes, length).sum(axis=1), len(series)
+        )
+        volume = pad(rolling_windows(volumes, length).sum(axis=1), len(series))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {"vwap": traded / volume}
+
+
+# name -> (function, default parameters, warm-up bars for the parameters)
+INDICATORS = {
+    "sma": (sma, (20,), lambda length: length - 1),
+    "ema": (ema, (20,), lambda length: EMA_WARMUP * length),
+    "rsi": (rsi, (14,), lambda length: WILDER_WARMUP * length),
+    "macd": (
+        macd,
+        (12, 26, 9),
+        lambda fast, slow, signal: EMA_WARMUP * max(fast, slow) + signal,
+    ),
+    "bollinger": (bollinger, (20, 2.0), lambda length, width: length - 1),
+    "atr": (atr, (14,), lambda length: WILDER_WARMUP * length),
+    # vwap defaults to anchoring at the start of the requested range
+    "vwap": (vwap, (0,), lambda length: max(length - 1, 0)),
+}
+
+
+class IndicatorSpec:
+    """One requested indicator, e.g. "sma:50" or "macd:12:26:9" """
+
+    __slots__ = ("name", "params")
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+    @classmethod
+    def parse(cls, text):
+        name, *raw_params = text.strip().lower().split(":")
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+
+        defaults = INDICATORS[name][1]
+        if len(raw_params) > len(defaults):
+            raise ValueError(f"Too many parameters for {name}")
+        try:
+            params = tuple(
+                type(default)(value) if value else default
+                for default, value in zip(
+                    defaults, raw_params + [""] * (len(defaults) - len(raw_params))
+                )
+            )
+        except ValueError:
+            raise ValueError(f"Invalid parameters for {name}")
+        if any(param < 0 for param in params) or (name != "vwap" and params[0] < 1):
+            raise ValueError(f"Invalid parameters for {name}")
+        return cls(name, params)
+
+    @property
+    def key(self):
+        return ":".join([self.name, *(f"{param:g}" for param in self.params)])
+
+    @property
+    def anchored(self):
+        """Whether values depend on where the range starts (anchored VWAP)"""
+        return self.name == "vwap" and not self.params[0]
+
+    @property
+    def warmup(self):
+        """Bars needed before the first returned bar for stable values"""
+        return INDICATORS[self.name][2](*self.params)
+
+    def compute(self, series):
+        """Return {column name: float64 array aligned with the series}"""
+        function = INDICATORS[self.name][0]
+        suffix = "".join(f"_{param:g}" for param in self.params if param)
+        return {
+            f"{column}{suffix}": values
+            for column, values in function(series, *self.params).items()
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, IndicatorSpec) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def parse_indicators(values):
+    """Parse requested indicator strings into unique specs, in request order"""
+    specs = list(dict.fromkeys(IndicatorSpec.parse(value) for value in values))
+    if len(specs) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators per request")
+    return specs
+
+
+def warmup_start(start_date, bars, aggregation):
+    """First date to fetch so that bars whole bars precede start_date"""
+    days = BAR_DAYS[aggregation]
+    # One extra bar for the partial bucket at the start, plus holiday slack
+    margin = math.ceil((bars + 1) * days) + 7
+    return np.datetime64(start_date, "D") - margin
@@ -0,0 +1,544 @@
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from .partitions import ensure_partitions
+
+# Kept free of Django imports so the standalone loaders can bulk load rows.
+# Columns staged per daily row, in COPY order
+STAGING_COLUMNS = [
+    "company_symbol",
+    "date",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "file_source",
+]
+
+# Session-local; emptied before each load and again at commit
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS ohlc_staging (
+        company_symbol VARCHAR(10),
+        date DATE,
+        open DECIMAL(10,2),
+        high DECIMAL(10,2),
+        low DECIMAL(10,2),
+        close DECIMAL(10,2),
+        volume BIGINT,
+        file_source VARCHAR(50)
+    ) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_SQL = (
+    f"COPY ohlc_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+)
+
+# DISTINCT ON keeps one row per key so ON CONFLICT never hits a row twice.
+# Unchanged rows fail the DO UPDATE condition and are not returned. Inserts
+# are told from updates by a NOT EXISTS subquery, not by (xmax = 0): on a
+# partitioned table PostgreSQL rejects system columns in RETURNING ("cannot
+# retrieve a system column in this context"). The subquery sees ohlc_data
+# as it was before this statement, so it finds no row only for keys the
+# statement inserted.
+MERGE_STAGING_SQL = """
+    INSERT INTO ohlc_data
+        (company_symbol, date, open, high, low, close, volume, file_source,
+         created_at)
+    SELECT DISTINCT ON (company_symbol, date)
+        company_symbol, date, open, high, low, close, volume, file_source,
+        CURRENT_TIMESTAMP
+    FROM ohlc_staging
+    ORDER BY company_symbol, date
+    ON CONFLICT (company_symbol, date) {action}
+    RETURNING company_symbol, date, NOT EXISTS (
+        SELECT 1 FROM ohlc_data AS loaded
+        WHERE loaded.company_symbol = ohlc_data.company_symbol
+          AND loaded.date = ohlc_data.date
+    )
+"""
+
+CONFLICT_ACTIONS = {
+    "update": """DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume,
+        file_source = EXCLUDED.file_source
+    WHERE (ohlc_data.open, ohlc_data.high, ohlc_data.low, ohlc_data.close,
+           ohlc_data.volume)
+        IS DISTINCT FROM
+          (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close,
+           EXCLUDED.volume)""",
+    "nothing": "DO NOTHING",
+}
+
+# Raw CSV columns with explicit types; "$" is stripped before parsing
+CSV_DTYPES = {
+    "Date": str,
+    "Close/Last": "float64",
+    "Volume": "Int64",
+    "Open": "float64",
+    "High": "float64",
+    "Low": "float64",
+}
+
+CSV_DATE_FORMAT = "%m/%d/%Y"
+
+# Rows parsed and written at a time, bounding memory for any file size
+CSV_CHUNK_ROWS = 100000
+
+FETCH_WATERMARKS_SQL = """
+    SELECT file_source, content_hash, history_hash, max_date
+    FROM ingest_watermark
+"""
+
+SAVE_WATERMARK_SQL = """
+    INSERT INTO ingest_watermark
+        (file_source, company_symbol, content_hash, history_hash, max_date,
+         loaded_at)
+    VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+    ON CONFLICT (file_source) DO UPDATE SET
+        company_symbol = EXCLUDED.company_symbol,
+        content_hash = EXCLUDED.content_hash,
+        history_hash = EXCLUDED.history_hash,
+        max_date = EXCLUDED.max_date,
+        loaded_at = EXCLUDED.loaded_at
+"""
+
+
+def copy_into(cursor, sql, buffer):
+    """Run COPY ... FROM STDIN with either psycopg2 or psycopg 3"""
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(sql, buffer)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def copy_upsert(cursor, df, on_conflict="update"):
+    """Bulk load a cleaned DataFrame into ohlc_data through a staging table
+
+    Returns ({"inserted", "updated", "skipped"} counts, [(symbol, date)]
+    of the rows that were inserted or changed). The caller commits.
+    """
+    if on_conflict not in CONFLICT_ACTIONS:
+        raise ValueError(f"Unknown conflict action: {on_conflict}")
+
+    buffer = io.StringIO()
+    df[STAGING_COLUMNS].to_csv(
+        buffer, index=False, header=False, date_format="%Y-%m-%d"
+    )
+    buffer.seek(0)
+
+    if len(df):
+        ensure_partitions(cursor, df["date"].min(), df["date"].max())
+    cursor.execute(CREATE_STAGING_SQL)
+    cursor.execute("TRUNCATE ohlc_staging")
+    copy_into(cursor, COPY_STAGING_SQL, buffer)
+    cursor.execute(MERGE_STAGING_SQL.format(action=CONFLICT_ACTIONS[on_conflict]))
+    written = cursor.fetchall()
+
+    inserted = sum(1 for _, _, is_insert in written if is_insert)
+    counts = {
+        "inserted": inserted,
+        "updated": len(written) - inserted,
+        "skipped": len(df) - len(written),
+    }
+    return counts, [(symbol, day) for symbol, day, _ in written]
+
+
+def fetch_watermarks(cursor):
+    """Return {file_source: watermark} for every file loaded before"""
+    cursor.execute(FETCH_WATERMARKS_SQL)
+    return {
+        file_source: {
+            "content_hash": content_hash,
+            "history_hash": history_hash,
+            "max_date": max_date,
+        }
+        for file_source, content_hash, history_hash, max_date in cursor.fetchall()
+    }
+
+
+class CurrencyStripper(io.RawIOBase):
+    """Binary reader that drops "$" signs from the bytes of a CSV file
+
+    Prices then reach the pandas C parser as plain numbers and load straight
+    into float64, without a pass over per-row Python strings.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            data = self.raw.read(len(buffer))
+            if not data:
+                return 0
+            data = data.replace(b"$", b"")
+            # A block of nothing but "$" must not look like end of file
+            if data:
+                break
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def read_csv_chunks(path, lines=None, chunksize=CSV_CHUNK_ROWS):
+    """Yield a raw stock CSV as DataFrames of at most chunksize rows
+
+    Prices come back as float64, volumes as nullable integers and dates
+    parsed with CSV_DATE_FORMAT. lines, if given, is the header plus the
+    subset of the file's lines to read instead of the file itself.
+    """
+    if lines:
+        raw = io.BytesIO("\n".join(lines).encode())
+    else:
+        raw = open(path, "rb")
+
+    with raw, io.BufferedReader(CurrencyStripper(raw)) as stream:
+        for chunk in pd.read_csv(
+            stream, dtype=CSV_DTYPES, encoding="utf-8-sig", chunksize=chunksize
+        ):
+            if "Date" in chunk.columns:
+                chunk["Date"] = pd.to_datetime(chunk["Date"], format=CSV_DATE_FORMAT)
+            yield chunk
+
+
+def csv_date_range(path, chunksize=CSV_CHUNK_ROWS):
+    """(first, last) dates of a raw stock CSV, or None if it has none
+
+    Only the Date column is parsed; unreadable dates are left for the full
+    parse to report.
+    """
+    first = last = None
+    try:
+        for chunk in pd.read_csv(
+            path,
+            usecols=["Date"],
+            dtype=str,
+            encoding="utf-8-sig",
+            chunksize=chunksize,
+        ):
+            days = pd.to_datetime(
+                chunk["Date"], format=CSV_DATE_FORMAT, errors="coerce"
+            ).dropna()
+            if not len(days):
+                continue
+            first = days.min() if first is None else min(first, days.min())
+            last = days.max() if last is None else max(last, days.max())
+    except (ValueError, pd.errors.EmptyDataError):
+        return None
+    if first is None:
+        return None
+    return first.date(), last.date()
+
+
+def hash_lines(lines):
+    history = hashlib.sha256()
+    for line in lines:
+        history.update(line.encode() + b"\n")
+    return history.hexdigest()
+
+
+def file_hash(path, block_size=1 << 20):
+    content = hashlib.sha256()
+    with open(path, "rb") as csv_file:
+        for block in iter(lambda: csv_file.read(block_size), b""):
+            content.update(block)
+    return content.hexdigest()
+
+
+def plan_delta(path, watermark=None, date_column="Date"):
+    """Work out how much of a CSV file has to be loaded since its watermark
+
+    Returns a dict with the "action" ("skip", "delta" or "full"), the file's
+    "content_hash" and "history_hash", and "lines": for a delta, the header
+    followed by the rows dated after the watermark, otherwise None. If any
+    older line differs from what was loaded, the whole file is reloaded.
+    The file is streamed, so only the delta's lines are held in memory.
+    """
+    plan = {
+        "action": "skip",
+        "content_hash": file_hash(path),
+        "history_hash": None,
+        "lines": None,
+    }
+    if watermark is not None and watermark["content_hash"] == plan["content_hash"]:
+        plan["history_hash"] = watermark["history_hash"]
+        return plan
+
+    max_date = watermark["max_date"] if watermark is not None else None
+    history = hashlib.sha256()
+    loaded = hashlib.sha256()
+    new_rows = []
+    date_index = None
+
+    with open(path, encoding="utf-8-sig", newline="") as csv_file:
+        for line in csv_file:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                continue
+            encoded = line.encode() + b"\n"
+            history.update(encoded)
+            if max_date is None:
+                continue
+
+            if date_index is None:
+                # Header: always part of both the delta and the loaded history
+                new_rows.append(line)
+                loaded.update(encoded)
+                try:
+                    date_index = next(csv.reader([line])).index(date_column)
+                except ValueError:
+                    max_date = None
+                continue
+
+            # Split lines around the watermark without assuming either order
+            try:
+                field = next(csv.reader([line]))[date_index]
+                day = datetime.strptime(field, CSV_DATE_FORMAT).date()
+            except (ValueError, IndexError):
+                # Let the full parse report whatever is malformed
+                max_date = None
+                continue
+            if day > max_date:
+                new_rows.append(line)
+            else:
+                loaded.update(encoded)
+
+    plan["history_hash"] = history.hexdigest()
+    if max_date is not None and loaded.hexdigest() == watermark["history_hash"]:
+        plan["action"] = "delta"
+        plan["lines"] = new_rows
+    else:
+        plan["action"] = "full"
+    return plan
+
+
+def load_delta(cursor, delta, on_conflict="update"):
+    """Upsert the rows of a planned delta and advance the file's watermark
+
+    delta is a plan from plan_delta with the parsed rows as "frames", an
+    iterable of DataFrames written one at a time, plus "file_source",
+    "company_symbol" and the previous "max_date". Returns the same
+    (counts, written) as copy_upsert, with counts["load"] set to the plan's
+    action. The caller commits.
+    """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0, "load": delta["action"]}
+    if delta["action"] == "skip":
+        return counts, []
+
+    written = []
+    max_date = delta["max_date"] if delta["action"] == "delta" else None
+    for df in delta["frames"]:
+        if not len(df):
+            continue
+        loaded, rows = copy_upsert(cursor, df, on_conflict)
+        written.extend(rows)
+        for key, value in loaded.items():
+            counts[key] += value
+        newest = df["date"].max().date()
+        max_date = newest if max_date is None else max(max_date, newest)
+
+    cursor.execute(
+        SAVE_WATERMARK_SQL,
+        (
+            delta["file_source"],
+            delta["company_symbol"],
+            delta["content_hash"],
+            delta["history_hash"],
+            max_date,
+        ),
+    )
+    return counts, written
+
+
+def parallel_ingest(
+    paths, parse, write, connect, workers=None, writers=2, extra=None, release=None
+):
+    """Parse files in a process pool and load them over a few connections
+
+    parse(path) runs in a worker process and returns a dict whose "frames"
+    are an iterable of DataFrames. The rest of the dict, then each frame as
+    it is parsed, is sent to one of `writers` threads, each holding its own
+    connection from connect(); at most QUEUED_CHUNKS frames of a file wait
+    for it, so memory stays bounded per chunk whatever the file size.
+    write(cursor, parsed) gets the dict with "frames" iterating over the
+    chunks as they arrive and returns (counts, written) like copy_upsert.
+    Every file gets its own transaction, so a failure only loses that file.
+    Connections are closed at the end, or handed to release(conn), e.g. to
+    return them to a pool.
+
+    Returns one result dict per file, in completion order, with its counts,
+    written rows, parse/write seconds and any error message. extra may map
+    a path to a second argument for parse.
+    """
+    writers = max(1, writers)
+    local = threading.local()
+    connections = []
+    results = []
+    lock = threading.Lock()
+
+    # Bounds how many files are being parsed or written at once
+    slots = threading.BoundedSemaphore((workers or os.cpu_count() or 1) + writers)
+
+    def load(path, chunks):
+        result = {"file": os.path.basename(path), "counts": None, "written": []}
+        feed = ChunkFeed(chunks)
+        started = time.perf_counter()
+        conn = None
+        try:
+            parsed = feed.parsed()
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = connect()
+                with lock:
+                    connections.append(conn)
+            cursor = conn.cursor()
+            try:
+                result["counts"], result["written"] = write(cursor, parsed)
+            finally:
+                cursor.close()
+            # A frame the writer did not read may still be a parse error
+            feed.drain()
+            conn.commit()
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            result["error"] = str(e)
+        else:
+            result["error"] = None
+        finally:
+            feed.discard()
+        result["parse_seconds"] = feed.parse_seconds
+        result["write_seconds"] = time.perf_counter() - started - feed.wait_seconds
+        with lock:
+            results.append(result)
+        slots.release()
+
+    with multiprocessing.Manager() as manager:
+        with ThreadPoolExecutor(max_workers=writers) as writer_pool:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as parser_pool:
+                    for path in paths:
+                        slots.acquire()
+                        chunks = manager.Queue(maxsize=QUEUED_CHUNKS)
+                        args = (path,) if extra is None else (path, extra.get(path))
+                        future = parser_pool.submit(stream_parse, parse, chunks, *args)
+                        future.add_done_callback(
+                            lambda future, chunks=chunks: report_crash(future, chunks)
+                        )
+                        writer_pool.submit(load, path, chunks)
+            finally:
+                writer_pool.shutdown(wait=True)
+                for conn in connections:
+                    if release is None:
+                        conn.close()
+                    else:
+                        release(conn)
+
+    return results
+
+
+# Parsed frames of one file allowed to wait for its writer
+QUEUED_CHUNKS = 2
+
+
+def stream_parse(parse, chunks, *args):
+    """Run parse in a worker, sending its result and then each frame to chunks
+
+    The last message is ("done", seconds) or ("error", message, seconds),
+    seconds counting the time spent parsing rather than waiting on chunks.
+    """
+    seconds = 0.0
+    started = time.perf_counter()
+    try:
+        parsed = parse(*args)
+        frames = iter(parsed.pop("frames", ()))
+        seconds += time.perf_counter() - started
+        chunks.put(("parsed", parsed))
+        while True:
+            started = time.perf_counter()
+            frame = next(frames, None)
+            seconds += time.perf_counter() - started
+            if frame is None:
+                break
+            chunks.put(("frame", frame))
+    except Exception as e:
+        seconds += time.perf_counter() - started
+        chunks.put(("error", str(e), seconds))
+        return
+    chunks.put(("done", seconds))
+
+
+def report_crash(future, chunks):
+    """End a file's chunks with an error if its worker died"""
+    if future.exception() is not None:
+        chunks.put(("error", str(future.exception()), 0.0))
+
+
+class ParseError(Exception):
+    """A worker failed to parse a file"""
+
+
+class ChunkFeed:
+    """Writer's end of the messages stream_parse sends for one file"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.finished = False
+        self.parse_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def receive(self):
+        started = time.perf_counter()
+        message = self.chunks.get()
+        self.wait_seconds += time.perf_counter() - started
+        if message[0] in ("done", "error"):
+            self.finished = True
+            self.parse_seconds = message[-1]
+        if message[0] == "error":
+            raise ParseError(message[1])
+        return message
+
+    def parsed(self):
+        """The parse result, with "frames" yielding the chunks as they come"""
+        _, parsed = self.receive()
+        parsed["frames"] = self.frames()
+        return parsed
+
+    def frames(self):
+        while not self.finished:
+            message = self.receive()
+            if message[0] == "frame":
+                yield message[1]
+
+    def drain(self):
+        """Read to the end of the stream, raising any parse error"""
+        while not self.finished:
+            self.receive()
+
+    def discard(self):
+        """Drop the rest of the stream, e.g. after a failed write
+
+        Keeps the worker from blocking on a full queue.
+        """
+        while not self.finished:
+            try:
+                self.receive()
+            except ParseError:
+                pass
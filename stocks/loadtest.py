@@ -0,0 +1,261 @@
+# Kept free of Django imports: the harness only talks HTTP to a running server
+import http.client
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+CHART_PATH = "/api/chart-data/"
+
+# Share of synthesized chart requests per aggregation level, and the range
+# lengths in days they are drawn from, roughly as the chart page is used
+AGGREGATION_WEIGHTS = {
+    "daily": 0.4,
+    "weekly": 0.3,
+    "monthly": 0.2,
+    "quarterly": 0.05,
+    "yearly": 0.05,
+}
+RANGE_DAYS = {
+    "daily": (30, 90, 180, 365),
+    "weekly": (180, 365, 3 * 365),
+    "monthly": (365, 3 * 365, 5 * 365),
+    "quarterly": (3 * 365, 5 * 365, 10 * 365),
+    "yearly": (5 * 365, 10 * 365, 20 * 365),
+}
+
+PERCENTILES = ("p50_ms", "p95_ms", "p99_ms")
+
+COMPANY_OPTION = re.compile(r'<option value="(\d+)">')
+DATE_BOUNDS = re.compile(
+    r'id="start-date"[^>]*?min="([\d-]+)"[^>]*?max="([\d-]+)"', re.S
+)
+
+
+def parse_index(html):
+    """Company ids and the (earliest, latest) dates offered by the index page"""
+    match = DATE_BOUNDS.search(html)
+    if match is None:
+        raise ValueError("Index page has no date range")
+    bounds = tuple(date.fromisoformat(value) for value in match.groups())
+    return [int(value) for value in COMPANY_OPTION.findall(html)], bounds
+
+
+def synthesize_mix(
+    company_ids,
+    bounds,
+    count,
+    seed=0,
+    index_share=0.05,
+    max_points=None,
+    indicators=None,
+):
+    """Draw count requests: chart ranges over the catalog plus some index loads"""
+    rng = random.Random(seed)
+    earliest, latest = bounds
+    span = (latest - earliest).days
+    levels, weights = zip(*AGGREGATION_WEIGHTS.items())
+
+    mix = []
+    for _ in range(count):
+        if rng.random() < index_share:
+            mix.append({"path": "/", "group": "index"})
+            continue
+
+        aggregation = rng.choices(levels, weights)[0]
+        days = min(rng.choice(RANGE_DAYS[aggregation]), span)
+        start = earliest + timedelta(days=rng.randint(0, span - days))
+        params = {
+            "company_id": rng.choice(company_ids),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=days)).isoformat(),
+            "aggregation": aggregation,
+        }
+        if max_points:
+            params["max_points"] = max_points
+        if indicators:
+            params["indicators"] = indicators
+        mix.append(params)
+    return [normalise_request(record) for record in mix]
+
+
+def normalise_request(record):
+    """Turn one mix record into {"method", "path", "body", "group"}
+
+    A record is either chart-data parameters, sent as a GET query string or
+    with "method": "POST" as a JSON body, or a literal "path" such as one
+    taken from an access log.
+    """
+    record = dict(record)
+    method = record.pop("method", "GET").upper()
+    if "path" in record:
+        path = record["path"]
+        group = record.get("group")
+        if group is None:
+            query = parse_qs(urlsplit(path).query)
+            group = query.get("aggregation", ["daily"])[0]
+            if not path.startswith(CHART_PATH):
+                group = "other"
+        return {"method": method, "path": path, "body": None, "group": group}
+
+    group = record.get("aggregation", "daily")
+    if method == "POST":
+        return {
+            "method": method,
+            "path": CHART_PATH,
+            "body": json.dumps(record),
+            "group": group,
+        }
+    return {
+        "method": method,
+        "path": f"{CHART_PATH}?{urlencode(record)}",
+        "body": None,
+        "group": group,
+    }
+
+
+def read_mix(path):
+    """Read a JSON-lines request mix, as written by write_mix"""
+    with open(path) as f:
+        return [normalise_request(json.loads(line)) for line in f if line.strip()]
+
+
+def write_mix(path, mix):
+    with open(path, "w") as f:
+        for request in mix:
+            f.write(json.dumps(request) + "\n")
+
+
+def run_load(base_url, mix, concurrency, duration=None, total=None, timeout=30.0):
+    """Replay mix in order from concurrency keep-alive connections
+
+    Runs for duration seconds, or until total requests (one pass over the
+    mix by default) have been sent. Returns (samples, elapsed seconds), with
+    one (group, status, seconds) sample per request; status is None when
+    the request failed without a response.
+    """
+    url = urlsplit(base_url)
+    if total is None and duration is None:
+        total = len(mix)
+    sequence = itertools.count()
+    samples = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    stop_at = started + duration if duration else None
+
+    def worker():
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        headers = {"Content-Type": "application/json"}
+        local = []
+        while True:
+            number = next(sequence)
+            if total is not None and number >= total:
+                break
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                break
+            request = mix[number % len(mix)]
+            sent = time.perf_counter()
+            try:
+                conn.request(
+                    request["method"],
+                    url.path.rstrip("/") + request["path"],
+                    body=request["body"],
+                    headers=headers,
+                )
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = None
+                conn.close()
+            local.append((request["group"], status, time.perf_counter() - sent))
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * fraction // 1))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(samples, elapsed):
+    """Throughput, error rate and latency percentiles (ms) of some samples"""
+    latencies = sorted(seconds for _, _, seconds in samples)
+    errors = sum(1 for _, status, _ in samples if status is None or status >= 400)
+    count = len(samples)
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput": count / elapsed if elapsed else 0.0,
+    }
+    for key, fraction in zip(PERCENTILES, (0.5, 0.95, 0.99)):
+        value = percentile(latencies, fraction)
+        summary[key] = None if value is None else value * 1000
+    return summary
+
+
+def report(samples, elapsed):
+    """Summary of every request plus one per group, e.g. aggregation level"""
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    return {
+        "elapsed_seconds": elapsed,
+        "overall": summarise(samples, elapsed),
+        "groups": {
+            group: summarise(group_samples, elapsed)
+            for group, group_samples in sorted(groups.items())
+        },
+    }
+
+
+def format_report(result, baseline=None):
+    """Render a report as text, with changes against a baseline report"""
+    rows = [("overall", result["overall"])] + list(result["groups"].items())
+    base = {}
+    if baseline is not None:
+        base = {"overall": baseline["overall"], **baseline["groups"]}
+
+    lines = [
+        f"{'group':<10} {'requests':>8} {'req/s':>8} {'errors':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    ]
+    for name, stats in rows:
+        line = (
+            f"{name:<10} {stats['requests']:>8} {stats['throughput']:>8.1f} "
+            f"{stats['error_rate']:>7.1%} "
+            + " ".join(f"{format_ms(stats[key]):>8}" for key in PERCENTILES)
+        )
+        if name in base:
+            line += "   " + describe_change(stats, base[name])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def describe_change(stats, baseline):
+    """Relative change of throughput and p95 latency against a baseline"""
+    parts = []
+    for key, label in (("throughput", "req/s"), ("p95_ms", "p95")):
+        if stats[key] and baseline.get(key):
+            parts.append(f"{label} {stats[key] / baseline[key] - 1:+.1%}")
+    return ", ".join(parts)
@@ -0,0 +1,149 @@
+# Kept free of Django imports: an in-process registry of request metrics,
+# written out in the Prometheus text exposition format
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonic totals, one per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield self.name, format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """Counts of observations at or below each bucket bound, with their sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> ([count per bucket, +Inf last], sum)
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.values.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(c), s)) for key, (c, s) in self.values.items())
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    format_labels(self.labels, labels, [("le", format_value(bound))]),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", format_labels(self.labels, labels), total
+            yield f"{self.name}_count", format_labels(self.labels, labels), cumulative
+
+
+class Registry:
+    """Metrics of this process, rendered together for a scrape"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LABELS = ("view", "aggregation")
+
+request_duration = registry.register(
+    Histogram(
+        "stocks_request_duration_seconds",
+        "Time to build each response",
+        REQUEST_LABELS,
+    )
+)
+requests_total = registry.register(
+    Counter(
+        "stocks_requests_total",
+        "Responses sent, by status code",
+        REQUEST_LABELS + ("status",),
+    )
+)
+db_queries_total = registry.register(
+    Counter("stocks_db_queries_total", "SQL queries run", REQUEST_LABELS)
+)
+phase_seconds_total = registry.register(
+    Counter(
+        "stocks_phase_seconds_total",
+        "Time spent in each phase of the responses",
+        REQUEST_LABELS + ("phase",),
+    )
+)
+
+
+def record_request(view, aggregation, status, seconds, queries, phases):
+    """Add one response, with its {phase: seconds} breakdown, to the metrics"""
+    request_duration.observe(seconds, view, aggregation)
+    requests_total.inc(view, aggregation, str(status))
+    db_queries_total.inc(view, aggregation, amount=queries)
+    for name, phase_seconds in phases.items():
+        phase_seconds_total.inc(view, aggregation, name, amount=phase_seconds)
@@ -0,0 +1,165 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http.request import RawPostDataException
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .backends.postgresql.base import pools
+from .metrics import record_request
+from .profiling import finish_profile, start_profile
+from .resample import FREQUENCIES
+from .timing import RequestTiming, current_timing, server_timing
+
+logger = logging.getLogger("stocks.db")
+profile_logger = logging.getLogger("stocks.profile")
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively under ASGI
+
+    WhiteNoise is synchronous only, and Django adapts a sync middleware by
+    running it, and everything below it, on one shared thread, which would
+    serve the async views one request at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestTimingMiddleware:
+    """Time each request's database work and phases on request.timing
+
+    Counts queries and sums the time spent in them, in obtaining connections
+    and in the phases the views mark, including work the async views run on
+    other threads. The results go out in a Server-Timing header and into
+    the /metrics histograms and counters, labelled by view and aggregation
+    level. With STOCK_DB_TIMING_LOG on, each request is logged with the
+    pool's usage. A STOCK_PROFILE_SAMPLE_RATE share of synchronous requests
+    runs under cProfile; profiles of those slower than STOCK_PROFILE_SLOW_MS
+    are saved to STOCK_PROFILE_DIR.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.timing = RequestTiming()
+        token = current_timing.set(request.timing)
+        profiler = start_profile(settings.STOCK_PROFILE_SAMPLE_RATE)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - started
+            current_timing.reset(token)
+            if profiler is not None:
+                self.save_profile(request, profiler, seconds)
+        self.finish(request, response, seconds)
+        return response
+
+    async def __acall__(self, request):
+        # Not profiled: the event loop thread interleaves concurrent requests
+        request.timing = RequestTiming()
+        token = current_timing.set(request.timing)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - started
+            current_timing.reset(token)
+        self.finish(request, response, seconds)
+        return response
+
+    def finish(self, request, response, seconds):
+        timing = request.timing
+        if settings.STOCK_SERVER_TIMING:
+            response.headers["Server-Timing"] = server_timing(timing, seconds)
+        match = request.resolver_match
+        if settings.STOCK_METRICS and match is not None:
+            record_request(
+                match.view_name,
+                aggregation_label(request),
+                response.status_code,
+                seconds,
+                timing.queries,
+                timing.breakdown(),
+            )
+        if settings.STOCK_DB_TIMING_LOG:
+            self.log(request, response)
+
+    def save_profile(self, request, profiler, seconds):
+        match = request.resolver_match
+        path = finish_profile(
+            profiler,
+            seconds,
+            settings.STOCK_PROFILE_SLOW_MS / 1000,
+            settings.STOCK_PROFILE_DIR,
+            match.view_name if match is not None else request.path,
+        )
+        if path is not None:
+            profile_logger.info(
+                f"{request.method} {request.get_full_path()} took "
+                f"{seconds * 1000:.0f} ms, profile saved to {path}"
+            )
+
+    def log(self, request, response):
+        timing = request.timing
+        message = (
+            f"{request.method} {request.path} {response.status_code}: "
+            f"{timing.queries} queries in {timing.query_seconds * 1000:.1f} ms, "
+            f"{timing.connections} connections in {timing.wait_seconds * 1000:.1f} ms"
+        )
+        pool = pools.get(connection.settings_dict["NAME"])
+        if pool is not None:
+            stats = pool.stats()
+            message += (
+                f"; pool {stats['in_use']}/{stats['max_size']} in use, "
+                f"{stats['idle']} idle, {stats['waits']} waits"
+            )
+        logger.info(message)
+
+
+def aggregation_label(request):
+    """Aggregation level a request asked for, or "none" for the metrics
+
+    Read from the query string, or from a JSON body the view has already
+    parsed. Unknown values are grouped under "none" too, so one label
+    value exists per level.
+    """
+    aggregation = request.GET.get("aggregation")
+    if aggregation is None and request.content_type == "application/json":
+        try:
+            aggregation = json.loads(request.body).get("aggregation")
+        except (ValueError, AttributeError, RawPostDataException):
+            aggregation = None
+    return aggregation if aggregation in FREQUENCIES else "none"
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0002_alter_company_table"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WeeklyBar",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("company_symbol", models.CharField(max_length=10)),
+                ("date", models.DateField()),
+                ("open", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("high", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("low", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("close", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("volume", models.BigIntegerField()),
+            ],
+            options={
+                "db_table": "ohlc_weekly",
+                "ordering": ["-date"],
+                "abstract": False,
+                "unique_together": {("company_symbol", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="MonthlyBar",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("company_symbol", models.CharField(max_length=10)),
+                ("date", models.DateField()),
+                ("open", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("high", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("low", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("close", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("volume", models.BigIntegerField()),
+            ],
+            options={
+                "db_table": "ohlc_monthly",
+                "ordering": ["-date"],
+                "abstract": False,
+                "unique_together": {("company_symbol", "date")},
+            },
+        ),
+    ]
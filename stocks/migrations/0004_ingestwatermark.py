@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0003_rollup_tables"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_source", models.CharField(max_length=50, unique=True)),
+                ("company_symbol", models.CharField(max_length=10)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("history_hash", models.CharField(max_length=64)),
+                ("max_date", models.DateField(null=True)),
+                ("loaded_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "ingest_watermark",
+            },
+        ),
+    ]
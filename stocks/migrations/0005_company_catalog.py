@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:30
+
+from django.db import migrations, models
+
+# Frozen copy of stocks.catalog.rebuild_catalog as of this migration, so
+# later changes to the catalog do not alter what it does
+RESET_CATALOG_SQL = """
+    UPDATE stocks_company
+    SET first_date = NULL, last_date = NULL, row_count = 0,
+        last_close = NULL, last_change = NULL
+    WHERE symbol NOT IN (SELECT DISTINCT company_symbol FROM ohlc_data)
+"""
+
+BUILD_CATALOG_SQL = """
+    INSERT INTO stocks_company
+        (name, symbol, created_at, first_date, last_date, row_count,
+         last_close, last_change)
+    SELECT
+        summary.company_symbol,
+        summary.company_symbol,
+        CURRENT_TIMESTAMP,
+        summary.first_date,
+        summary.last_date,
+        summary.row_count,
+        latest.closes[1],
+        latest.closes[1] - latest.closes[2]
+    FROM (
+        SELECT company_symbol, MIN(date) AS first_date, MAX(date) AS last_date,
+               COUNT(*) AS row_count
+        FROM ohlc_data
+        GROUP BY company_symbol
+    ) summary
+    CROSS JOIN LATERAL (
+        SELECT array_agg(close ORDER BY date DESC) AS closes
+        FROM (
+            SELECT close, date
+            FROM ohlc_data
+            WHERE ohlc_data.company_symbol = summary.company_symbol
+            ORDER BY date DESC
+            LIMIT 2
+        ) last_two
+    ) latest
+    ON CONFLICT (symbol) DO UPDATE SET
+        first_date = EXCLUDED.first_date,
+        last_date = EXCLUDED.last_date,
+        row_count = EXCLUDED.row_count,
+        last_close = EXCLUDED.last_close,
+        last_change = EXCLUDED.last_change
+"""
+
+
+def build_catalog(apps, schema_editor):
+    """Fill the catalog columns from the rows already loaded"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(RESET_CATALOG_SQL)
+        cursor.execute(BUILD_CATALOG_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0004_ingestwatermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="first_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="last_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="row_count",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="last_close",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="company",
+            name="last_change",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.RunPython(build_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,154 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:36
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# Frozen copy of the stocks.partitions schema as of this migration, so
+# later changes to that module do not alter what it does
+CREATE_PARTITIONED_SQL = """
+    CREATE TABLE IF NOT EXISTS ohlc_data (
+        id SERIAL,
+        company_symbol VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        open DECIMAL(10,2) NOT NULL,
+        high DECIMAL(10,2) NOT NULL,
+        low DECIMAL(10,2) NOT NULL,
+        close DECIMAL(10,2) NOT NULL,
+        volume BIGINT NOT NULL,
+        file_source VARCHAR(50),
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, date),
+        CONSTRAINT ohlc_data_company_symbol_date_key UNIQUE (company_symbol, date)
+    ) PARTITION BY RANGE (date);
+
+    CREATE INDEX IF NOT EXISTS ohlc_data_date_brin ON ohlc_data
+        USING brin (date) WITH (pages_per_range = 32);
+
+    CREATE TABLE IF NOT EXISTS ohlc_data_default PARTITION OF ohlc_data DEFAULT;
+"""
+
+# The new table is empty, so each year is created in place
+CREATE_PARTITION_SQL = """
+    CREATE TABLE ohlc_data_{year} PARTITION OF ohlc_data
+        FOR VALUES FROM ('{year}-01-01') TO ('{next_year}-01-01')
+"""
+
+COLUMNS = (
+    "id, company_symbol, date, open, high, low, close, volume, file_source, "
+    "created_at"
+)
+
+# Indexes the unpartitioned table had under 0005, recreated on reversal
+HEAP_INDEXES = (
+    "ALTER TABLE ohlc_data ADD CONSTRAINT ohlc_data_pkey PRIMARY KEY (id)",
+    "ALTER TABLE ohlc_data ADD CONSTRAINT "
+    "ohlc_data_company_symbol_date_dc5a41bf_uniq UNIQUE (company_symbol, date)",
+    "CREATE INDEX ohlc_data_company_8c1fb6_idx ON ohlc_data (company_symbol, date)",
+    "CREATE INDEX ohlc_data_date_639daa_idx ON ohlc_data (date)",
+    "CREATE INDEX ohlc_data_company_symbol_909db7c7 ON ohlc_data (company_symbol)",
+    "CREATE INDEX ohlc_data_company_symbol_909db7c7_like "
+    "ON ohlc_data (company_symbol varchar_pattern_ops)",
+)
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('ohlc_data')"
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0]
+
+
+def partition_ohlc_data(apps, schema_editor):
+    """Move ohlc_data into a table partitioned by year of date"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+
+        # Free the names the partitioned table's constraints and id sequence use
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'ohlc_data'")
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "heap_{name}"')
+        cursor.execute("SELECT pg_get_serial_sequence('ohlc_data', 'id')")
+        (sequence,) = cursor.fetchone()
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO ohlc_data_heap_id_seq")
+        cursor.execute("ALTER TABLE ohlc_data RENAME TO ohlc_data_heap")
+
+        cursor.execute(CREATE_PARTITIONED_SQL)
+        cursor.execute("SELECT MIN(date), MAX(date) FROM ohlc_data_heap")
+        first_date, last_date = cursor.fetchone()
+        if first_date is not None:
+            for year in range(first_date.year, last_date.year + 1):
+                cursor.execute(
+                    CREATE_PARTITION_SQL.format(year=year, next_year=year + 1)
+                )
+
+        cursor.execute(
+            f"INSERT INTO ohlc_data ({COLUMNS}) SELECT {COLUMNS} FROM ohlc_data_heap"
+        )
+        cursor.execute("DROP TABLE ohlc_data_heap")
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('ohlc_data', 'id'),"
+            " COALESCE(MAX(id), 0) + 1, false) FROM ohlc_data"
+        )
+
+
+def merge_partitions(apps, schema_editor):
+    """Copy the partitions back into one unpartitioned ohlc_data table"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return
+
+        cursor.execute(
+            "CREATE TABLE ohlc_data_heap (LIKE ohlc_data INCLUDING DEFAULTS)"
+        )
+        cursor.execute(
+            f"INSERT INTO ohlc_data_heap ({COLUMNS}) SELECT {COLUMNS} FROM ohlc_data"
+        )
+        cursor.execute("ALTER SEQUENCE ohlc_data_id_seq OWNED BY ohlc_data_heap.id")
+        cursor.execute("DROP TABLE ohlc_data")
+        cursor.execute("ALTER TABLE ohlc_data_heap RENAME TO ohlc_data")
+        for sql in HEAP_INDEXES:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0005_company_catalog"),
+    ]
+
+    operations = [
+        # On PostgreSQL the table is rebuilt with the new indexes in one step
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name="stockdata",
+                    name="ohlc_data_company_8c1fb6_idx",
+                ),
+                migrations.RemoveIndex(
+                    model_name="stockdata",
+                    name="ohlc_data_date_639daa_idx",
+                ),
+                migrations.AlterField(
+                    model_name="stockdata",
+                    name="company_symbol",
+                    field=models.CharField(max_length=10),
+                ),
+                migrations.AddIndex(
+                    model_name="stockdata",
+                    index=django.contrib.postgres.indexes.BrinIndex(
+                        fields=["date"], name="ohlc_data_date_brin", pages_per_range=32
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition_ohlc_data, merge_partitions),
+            ],
+        ),
+    ]
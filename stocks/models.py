@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.db.models import FloatField
+from django.db.models.functions import Cast
 
 
 class Company(models.Model):
@@ -6,6 +9,17 @@ class Company(models.Model):
     symbol = models.CharField(max_length=10, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Catalog summary of the symbol's ohlc_data rows, kept by the loaders
+    first_date = models.DateField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+    row_count = models.BigIntegerField(null=True, blank=True)
+    last_close = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    last_change = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+
     def __str__(self):
         return f"{self.name} ({self.symbol})"
 
@@ -14,9 +28,20 @@ class Company(models.Model):
         db_table = "stocks_company"
 
 
+class StockDataQuerySet(models.QuerySet):
+    def bar_rows(self, *fields):
+        """Tuples of fields then (date, open, high, low, close, volume)
+
+        Prices are cast to double precision in SQL, so rows arrive as plain
+        floats without building a model or a Decimal per value.
+        """
+        prices = (Cast(name, FloatField()) for name in ("open", "high", "low", "close"))
+        return self.values_list(*fields, "date", *prices, "volume")
+
+
 class StockData(models.Model):
     id = models.AutoField(primary_key=True)
-    company_symbol = models.CharField(max_length=10, db_index=True)
+    company_symbol = models.CharField(max_length=10)
     date = models.DateField()
     open = models.DecimalField(max_digits=10, decimal_places=2)
     high = models.DecimalField(max_digits=10, decimal_places=2)
@@ -26,6 +51,8 @@ class StockData(models.Model):
     file_source = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = StockDataQuerySet.as_manager()
+
     @property
     def company_name(self):
         try:
@@ -38,10 +65,58 @@ class StockData(models.Model):
         return f"{self.company_symbol} - {self.date}"
 
     class Meta:
+        # On PostgreSQL the table is partitioned by year of date, see
+        # stocks/partitions.py; the unique index covers (company_symbol, date)
         db_table = "ohlc_data"
         unique_together = ("company_symbol", "date")
         ordering = ["-date"]
         indexes = [
-            models.Index(fields=["company_symbol", "date"]),
-            models.Index(fields=["date"]),
+            BrinIndex(fields=["date"], name="ohlc_data_date_brin", pages_per_range=32),
         ]
+
+
+class RollupBar(models.Model):
+    """Pre-aggregated OHLC bar, labelled by the first day of its bucket"""
+
+    company_symbol = models.CharField(max_length=10)
+    date = models.DateField()
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    volume = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.company_symbol} - {self.date}"
+
+    class Meta:
+        abstract = True
+        unique_together = ("company_symbol", "date")
+        ordering = ["-date"]
+
+
+class WeeklyBar(RollupBar):
+    class Meta(RollupBar.Meta):
+        db_table = "ohlc_weekly"
+
+
+class MonthlyBar(RollupBar):
+    class Meta(RollupBar.Meta):
+        db_table = "ohlc_monthly"
+
+
+class IngestWatermark(models.Model):
+    """What load_postgres.py last loaded from one CSV file"""
+
+    file_source = models.CharField(max_length=50, unique=True)
+    company_symbol = models.CharField(max_length=10)
+    content_hash = models.CharField(max_length=64)
+    history_hash = models.CharField(max_length=64)
+    max_date = models.DateField(null=True)
+    loaded_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_source} through {self.max_date}"
+
+    class Meta:
+        db_table = "ingest_watermark"
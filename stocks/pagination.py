@@ -0,0 +1,40 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many estimated rows an exact COUNT(*) is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def planner_row_estimate(queryset):
+    """Return PostgreSQL's row estimate for a queryset, or None elsewhere"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    # psycopg2 decodes the json column itself; other drivers may not
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator reporting the planner's estimate for large result sets"""
+
+    # Set once count has fallen back on the planner's estimate
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = planner_row_estimate(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        self.estimated = True
+        return estimate
@@ -0,0 +1,104 @@
+# Kept free of Django imports so the standalone loaders can add partitions.
+# ohlc_data is range partitioned on date, one partition per calendar year.
+# Rows outside every yearly partition land in ohlc_data_default until
+# ensure_partitions creates their year and moves them.
+DEFAULT_PARTITION = "ohlc_data_default"
+
+# (company_symbol, date) is unique and leads with the symbol, so it serves the
+# per-symbol range scans; date gets a BRIN index, which stays tiny because
+# each partition is appended to in roughly date order
+CREATE_PARTITIONED_SQL = f"""
+    CREATE TABLE IF NOT EXISTS ohlc_data (
+        id SERIAL,
+        company_symbol VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        open DECIMAL(10,2) NOT NULL,
+        high DECIMAL(10,2) NOT NULL,
+        low DECIMAL(10,2) NOT NULL,
+        close DECIMAL(10,2) NOT NULL,
+        volume BIGINT NOT NULL,
+        file_source VARCHAR(50),
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, date),
+        CONSTRAINT ohlc_data_company_symbol_date_key UNIQUE (company_symbol, date)
+    ) PARTITION BY RANGE (date);
+
+    CREATE INDEX IF NOT EXISTS ohlc_data_date_brin ON ohlc_data
+        USING brin (date) WITH (pages_per_range = 32);
+
+    CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF ohlc_data DEFAULT;
+"""
+
+# Whether ohlc_data is partitioned, and the names of its partitions
+PARTITIONS_SQL = """
+    SELECT parent.relkind = 'p', array_remove(array_agg(child.relname::text), NULL)
+    FROM pg_class parent
+    LEFT JOIN pg_inherits ON pg_inherits.inhparent = parent.oid
+    LEFT JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.oid = to_regclass('ohlc_data')
+    GROUP BY parent.relkind
+"""
+
+# The partition is filled and attached rather than created in place, so
+# rows already in the default partition for its year move across. ATTACH
+# takes an ACCESS EXCLUSIVE lock on the default partition until commit,
+# which stalls anything reading or writing it and can deadlock concurrent
+# writers; bulk loaders create their partitions before they start writing.
+CREATE_PARTITION_SQL = (
+    "CREATE TABLE {name} (LIKE ohlc_data INCLUDING DEFAULTS)",
+    f"""
+    WITH moved AS (
+        DELETE FROM {DEFAULT_PARTITION}
+        WHERE date >= %(start)s AND date < %(stop)s
+        RETURNING *
+    )
+    INSERT INTO {{name}} SELECT * FROM moved
+    """,
+    """
+    ALTER TABLE ohlc_data
+        ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(stop)s)
+    """,
+)
+
+
+def partition_name(year):
+    return f"ohlc_data_{year}"
+
+
+def existing_partitions(cursor):
+    """Names of the partitions of ohlc_data, or None if it is not partitioned"""
+    cursor.execute(PARTITIONS_SQL)
+    row = cursor.fetchone()
+    if row is None or not row[0]:
+        return None
+    return set(row[1])
+
+
+def ensure_partitions(cursor, first_date, last_date):
+    """Create the yearly partitions covering first_date through last_date
+
+    Returns the names of the partitions created. Does nothing when ohlc_data
+    is not partitioned. The caller commits; concurrent loaders wait on an
+    advisory lock until then instead of racing to create the same year.
+    """
+    existing = existing_partitions(cursor)
+    if existing is None:
+        return []
+
+    years = range(first_date.year, last_date.year + 1)
+    if all(partition_name(year) in existing for year in years):
+        return []
+
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('ohlc_data_partitions'))")
+    existing = existing_partitions(cursor)
+
+    created = []
+    for year in years:
+        name = partition_name(year)
+        if name in existing:
+            continue
+        bounds = {"start": f"{year}-01-01", "stop": f"{year + 1}-01-01"}
+        for sql in CREATE_PARTITION_SQL:
+            cursor.execute(sql.format(name=name), bounds)
+        created.append(name)
+    return created
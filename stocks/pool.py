@@ -0,0 +1,222 @@
+# Kept free of Django imports so the standalone loaders share the pool with
+# the web app's database backend (stocks/backends/postgresql).
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free in time"""
+
+
+def pool_options(config):
+    """Pool keyword arguments from the STOCK_DB_POOL_* settings, or None
+
+    config is python-decouple's config, so the web app and the loaders read
+    the same environment variables.
+    """
+    max_size = config("STOCK_DB_POOL_SIZE", default=8, cast=int)
+    if max_size <= 0:
+        return None
+    return {
+        "max_size": max_size,
+        "timeout": config("STOCK_DB_POOL_TIMEOUT", default=10.0, cast=float),
+        "max_idle": config("STOCK_DB_POOL_MAX_IDLE", default=300.0, cast=float),
+        "max_lifetime": config(
+            "STOCK_DB_POOL_MAX_LIFETIME", default=3600.0, cast=float
+        ),
+        "check_after": config("STOCK_DB_POOL_CHECK_AFTER", default=30.0, cast=float),
+    }
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections
+
+    connect() opens a new connection. At most max_size are open at once, and
+    getconn() waits up to timeout seconds for one to be returned. Returned
+    connections are rolled back and reused newest first. One that sat idle
+    for check_after seconds is pinged before it is handed out; one idle for
+    max_idle seconds, or open for max_lifetime, is closed instead.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=8,
+        timeout=10.0,
+        max_idle=300.0,
+        max_lifetime=3600.0,
+        check_after=30.0,
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, returned at), newest on the right
+        self._opened_at = {}  # id(connection) -> when it was opened
+        self._reserved = 0  # slots taken by connections still being opened
+        self._closed = False
+
+        # Counters for tuning max_size
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def stats(self):
+        """Current size and lifetime counters of the pool"""
+        with self._condition:
+            size = len(self._opened_at) + self._reserved
+            return {
+                "max_size": self.max_size,
+                "size": size,
+                "idle": len(self._idle),
+                "in_use": size - len(self._idle),
+                "opened": self.connections_opened,
+                "closed": self.connections_closed,
+                "waits": self.waits,
+                "wait_seconds": self.wait_seconds,
+            }
+
+    def getconn(self):
+        """Borrow a connection, opening one if the pool has room"""
+        while True:
+            conn, idle_for = self._reserve()
+            if conn is None:
+                return self._open()
+            if idle_for < self.check_after or self._ping(conn):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn, discard=False):
+        """Give a borrowed connection back, closing it if it is no longer fit"""
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = False
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        with self._condition:
+            opened_at = self._opened_at.get(id(conn))
+            if (
+                not discard
+                and not conn.closed
+                and not self._closed
+                and opened_at is not None
+                and now - opened_at < self.max_lifetime
+            ):
+                self._idle.append((conn, now))
+                self._condition.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for a block, committing if it succeeds"""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            # Anything left open after an error is rolled back here
+            self.putconn(conn)
+
+    def close(self):
+        """Close idle connections now and borrowed ones when they come back"""
+        with self._condition:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def _reserve(self):
+        """Take an idle connection, or a slot for a new one (returned as None)"""
+        deadline = None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                now = time.monotonic()
+                self._expire(now)
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    return conn, now - returned_at
+                if len(self._opened_at) + self._reserved < self.max_size:
+                    self._reserved += 1
+                    return None, 0.0
+
+                if deadline is None:
+                    deadline = now + self.timeout
+                    self.waits += 1
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout:g}s "
+                        f"({self.max_size} in use)"
+                    )
+                started = time.monotonic()
+                self._condition.wait(remaining)
+                self.wait_seconds += time.monotonic() - started
+
+    def _expire(self, now):
+        """Close idle connections past max_idle or max_lifetime (lock held)"""
+        keep = deque()
+        for conn, returned_at in self._idle:
+            opened_at = self._opened_at.get(id(conn), now)
+            if (
+                now - returned_at >= self.max_idle
+                or now - opened_at >= self.max_lifetime
+            ):
+                self._forget(conn)
+                conn.close()
+            else:
+                keep.append((conn, returned_at))
+        self._idle = keep
+
+    def _open(self):
+        try:
+            conn = self.connect()
+        except BaseException:
+            with self._condition:
+                self._reserved -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._reserved -= 1
+            self._opened_at[id(conn)] = time.monotonic()
+            self.connections_opened += 1
+        return conn
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _forget(self, conn):
+        if self._opened_at.pop(id(conn), None) is not None:
+            self.connections_closed += 1
+
+    def _discard(self, conn):
+        with self._condition:
+            self._forget(conn)
+            self._condition.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
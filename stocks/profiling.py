@@ -0,0 +1,55 @@
+# Kept free of Django imports: samples requests with cProfile and keeps the
+# profiles of slow ones
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+
+# cProfile allows one active profiler per process on newer Pythons, and a
+# profile of two overlapping requests would mix them, so one runs at a time
+profile_lock = threading.Lock()
+
+
+def start_profile(sample_rate):
+    """Start profiling a sampled request, or return None
+
+    The caller must pass a returned profiler to finish_profile.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    if not profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler, e.g. a debugger's, is already running
+        profile_lock.release()
+        return None
+    return profiler
+
+
+def finish_profile(profiler, seconds, threshold, directory, label):
+    """Stop a profile and save it if the request took threshold seconds
+
+    Returns the path of the saved .prof file, or None. Files load with
+    pstats or tools such as snakeviz.
+    """
+    try:
+        profiler.disable()
+    finally:
+        profile_lock.release()
+    if seconds < threshold:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "request"
+    path = os.path.join(
+        directory,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}-"
+        f"{seconds * 1000:.0f}ms.prof",
+    )
+    profiler.dump_stats(path)
+    return path
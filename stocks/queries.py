@@ -0,0 +1,344 @@
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_histories, indicator_cache
+from .indicators import warmup_start
+from .models import StockData
+from .resample import (
+    bucket_labels,
+    concat_series,
+    next_bucket_start,
+    resample,
+    series_by_symbol,
+    series_from_rows,
+    slice_dates,
+)
+from .rollups import ROLLUP_TABLES
+from .timing import phase
+
+# date_trunc() precision for each aggregation level handled in SQL
+SQL_TRUNC_UNITS = {
+    "weekly": "week",
+    "monthly": "month",
+    "quarterly": "quarter",
+    "yearly": "year",
+}
+
+# Open and close come from ordered aggregates so each bucket needs one pass.
+# Prices are returned as float8 so the driver does not build Decimals
+AGGREGATE_BARS_SQL = """
+    SELECT
+        company_symbol,
+        date_trunc(%(unit)s, date::timestamp)::date AS bucket,
+        (array_agg(open ORDER BY date ASC))[1]::float8,
+        MAX(high)::float8,
+        MIN(low)::float8,
+        (array_agg(close ORDER BY date DESC))[1]::float8,
+        SUM(volume)::bigint
+    FROM ohlc_data
+    WHERE company_symbol = ANY(%(symbols)s) AND date BETWEEN %(start)s AND %(end)s
+    GROUP BY company_symbol, bucket
+    ORDER BY 1, 2
+"""
+
+# Whole buckets come from the rollup table; partial buckets at either end of
+# the range are aggregated from the daily rows that fall inside it
+ROLLUP_BARS_SQL = """
+    SELECT
+        company_symbol,
+        date_trunc(%(unit)s, date::timestamp)::date AS bucket,
+        (array_agg(open ORDER BY date ASC))[1]::float8,
+        MAX(high)::float8,
+        MIN(low)::float8,
+        (array_agg(close ORDER BY date DESC))[1]::float8,
+        SUM(volume)::bigint
+    FROM ohlc_data
+    WHERE company_symbol = ANY(%(symbols)s)
+      AND date BETWEEN %(start)s AND %(end)s
+      AND (date < %(full_start)s OR date >= %(full_stop)s)
+    GROUP BY company_symbol, bucket
+    UNION ALL
+    SELECT
+        company_symbol, date, open::float8, high::float8, low::float8,
+        close::float8, volume
+    FROM {table}
+    WHERE company_symbol = ANY(%(symbols)s)
+      AND date >= %(full_start)s AND date < %(full_stop)s
+    ORDER BY 1, 2
+"""
+
+
+def use_database_aggregation():
+    """Whether bars should be aggregated by PostgreSQL instead of NumPy"""
+    return (
+        settings.STOCK_AGGREGATION_BACKEND in ("database", "rollup")
+        and connection.vendor == "postgresql"
+    )
+
+
+def fetch_daily_rows(symbols, start_date, end_date):
+    """Fetch daily rows of several symbols with one query, split per symbol"""
+    rows = (
+        StockData.objects.filter(
+            company_symbol__in=symbols,
+            date__gte=start_date,
+            date__lte=end_date,
+        )
+        .order_by("company_symbol", "date")
+        .bar_rows("company_symbol")
+    )
+    return series_by_symbol(rows, symbols)
+
+
+def iter_daily_rows(symbols, start_date, end_date, chunk_size):
+    """Stream daily rows of several symbols ordered by (symbol, date)
+
+    On PostgreSQL iterator() reads through a server-side cursor, fetching
+    chunk_size rows per round trip instead of the whole result set.
+    """
+    return (
+        StockData.objects.filter(
+            company_symbol__in=symbols,
+            date__gte=start_date,
+            date__lte=end_date,
+        )
+        .order_by("company_symbol", "date")
+        .values_list("company_symbol", "date", "open", "high", "low", "close", "volume")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def has_daily_rows(symbols, start_date, end_date):
+    """Whether any of symbols has a daily row within the range"""
+    return StockData.objects.filter(
+        company_symbol__in=symbols,
+        date__gte=start_date,
+        date__lte=end_date,
+    ).exists()
+
+
+def fetch_bars_python(company_symbol, start_date, end_date, aggregation):
+    """Fetch daily rows and aggregate them in-process"""
+    rows = (
+        StockData.objects.filter(
+            company_symbol=company_symbol,
+            date__gte=start_date,
+            date__lte=end_date,
+        )
+        .order_by("date")
+        .bar_rows()
+    )
+
+    series = series_from_rows(rows)
+    with phase("aggregation"):
+        return resample(series, aggregation)
+
+
+def fetch_many_bars_database(symbols, start_date, end_date, aggregation):
+    """Aggregate bars of several symbols inside PostgreSQL in one query"""
+    if aggregation not in SQL_TRUNC_UNITS:
+        return fetch_daily_rows(symbols, start_date, end_date)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            AGGREGATE_BARS_SQL,
+            {
+                "unit": SQL_TRUNC_UNITS[aggregation],
+                "symbols": list(symbols),
+                "start": start_date,
+                "end": end_date,
+            },
+        )
+        return series_by_symbol(cursor.fetchall(), symbols)
+
+
+def fetch_many_bars_rollup(symbols, start_date, end_date, aggregation):
+    """Read pre-aggregated weekly/monthly bars from the rollup tables"""
+    if aggregation not in ROLLUP_TABLES:
+        return fetch_many_bars_database(symbols, start_date, end_date, aggregation)
+
+    table, unit = ROLLUP_TABLES[aggregation]
+    start = np.datetime64(start_date, "D")
+    end = np.datetime64(end_date, "D")
+    start_label, after_end_label = bucket_labels(
+        np.array([start, end + 1]), aggregation
+    )
+
+    # Buckets in [full_start, full_stop) lie entirely inside the range
+    if start_label == start:
+        full_start = start
+    else:
+        full_start = next_bucket_start(start_label, aggregation)
+    full_stop = after_end_label
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ROLLUP_BARS_SQL.format(table=table),
+            {
+                "unit": unit,
+                "symbols": list(symbols),
+                "start": str(start),
+                "end": str(end),
+                "full_start": str(full_start),
+                "full_stop": str(full_stop),
+            },
+        )
+        return series_by_symbol(cursor.fetchall(), symbols)
+
+
+def fetch_bars_database(company_symbol, start_date, end_date, aggregation):
+    """Aggregate bars inside PostgreSQL and fetch only the results"""
+    return fetch_many_bars_database(
+        [company_symbol], start_date, end_date, aggregation
+    )[company_symbol]
+
+
+def fetch_bars_rollup(company_symbol, start_date, end_date, aggregation):
+    """Read pre-aggregated weekly/monthly bars for one symbol"""
+    return fetch_many_bars_rollup([company_symbol], start_date, end_date, aggregation)[
+        company_symbol
+    ]
+
+
+def fetch_many_bars(symbols, start_date, end_date, aggregation):
+    """Return {symbol: OHLC bars} for several symbols over one range"""
+    if use_database_aggregation():
+        if settings.STOCK_AGGREGATION_BACKEND == "rollup":
+            return fetch_many_bars_rollup(symbols, start_date, end_date, aggregation)
+        return fetch_many_bars_database(symbols, start_date, end_date, aggregation)
+
+    histories = get_histories(symbols)
+    if histories is None:
+        histories = fetch_daily_rows(symbols, start_date, end_date)
+
+    with phase("aggregation"):
+        return {
+            symbol: resample(slice_dates(history, start_date, end_date), aggregation)
+            for symbol, history in histories.items()
+        }
+
+
+def fetch_bars(company_symbol, start_date, end_date, aggregation):
+    """Return OHLC bars for a symbol and range at the requested level"""
+    if use_database_aggregation():
+        if settings.STOCK_AGGREGATION_BACKEND == "rollup":
+            return fetch_bars_rollup(company_symbol, start_date, end_date, aggregation)
+        return fetch_bars_database(company_symbol, start_date, end_date, aggregation)
+
+    histories = get_histories([company_symbol])
+    if histories is None:
+        return fetch_bars_python(company_symbol, start_date, end_date, aggregation)
+
+    history = histories[company_symbol]
+    with phase("aggregation"):
+        return resample(slice_dates(history, start_date, end_date), aggregation)
+
+
+def indicator_range(start_date, end_date, aggregation, spec):
+    """Return (cache key suffix, warm-up start) for one indicator
+
+    The warm-up starts on a bucket boundary so its first bar is whole. A
+    range that begins or ends inside a bucket shows that bucket clipped,
+    which changes every value computed from it, so such edges are part of
+    the cache key.
+    """
+    start = np.datetime64(start_date, "D")
+    end = np.datetime64(end_date, "D")
+    start_label, after_end_label = bucket_labels(
+        np.array([start, end + 1]), aggregation
+    )
+    edges = (
+        str(start) if start_label != start else None,
+        str(end) if after_end_label != end + 1 else None,
+    )
+    warmup = warmup_start(start_date, spec.warmup, aggregation)
+    return edges, bucket_labels(np.array([warmup]), aggregation)[0]
+
+
+def fetch_warmup_bars(company_symbol, start, start_date, aggregation):
+    """Fetch the whole bars from start up to the bucket holding start_date"""
+    first_label = bucket_labels(np.array([np.datetime64(start_date, "D")]), aggregation)
+    return fetch_bars(company_symbol, str(start), str(first_label[0] - 1), aggregation)
+
+
+def fetch_indicator_history(company_symbol, start_date, end_date, aggregation, specs):
+    """Fetch the warm-up bars fetch_indicators needs, as (start, bars)
+
+    Returns None when no uncached indicator needs them. Lets the async views
+    run this fetch alongside the one for the bars themselves.
+    """
+    end = np.datetime64(end_date, "D")
+    starts = []
+    for spec in specs:
+        if spec.anchored:
+            continue
+        edges, start = indicator_range(start_date, end_date, aggregation, spec)
+        key = (company_symbol, aggregation, spec.key, edges)
+        if indicator_cache.get(key, start, end) is None:
+            starts.append(start)
+
+    if not starts:
+        return None
+    start = min(starts)
+    return start, fetch_warmup_bars(company_symbol, start, start_date, aggregation)
+
+
+def fetch_indicators(
+    company_symbol, bars, start_date, end_date, aggregation, specs, history=None
+):
+    """Return indicator columns aligned with bars for the requested range
+
+    Indicators run over whole bars from far enough before start_date to warm
+    up, followed by bars itself, so values at the left edge use the same
+    clipped first bucket the chart shows. The warm-up bars are fetched unless
+    history from fetch_indicator_history already starts there. Results are
+    cached per (symbol, aggregation, indicator) until the next data version.
+    """
+    columns = {}
+    end = np.datetime64(end_date, "D")
+    pending = []
+    for spec in specs:
+        # Anchored indicators start from the first returned bar
+        if spec.anchored:
+            with phase("indicators"):
+                columns.update(spec.compute(bars))
+            continue
+
+        edges, start = indicator_range(start_date, end_date, aggregation, spec)
+        key = (company_symbol, aggregation, spec.key, edges)
+        cached = indicator_cache.get(key, start, end)
+        aligned = cached and align_columns(bars.dates, *cached)
+        if aligned:
+            columns.update(aligned)
+        else:
+            pending.append((spec, key, start))
+
+    if pending:
+        # One fetch covers the longest warm-up among the uncached indicators
+        start = min(start for _, _, start in pending)
+        if history is not None and history[0] == start:
+            warmup = history[1]
+        else:
+            warmup = fetch_warmup_bars(company_symbol, start, start_date, aggregation)
+        history = concat_series(warmup, bars)
+        for spec, key, _ in pending:
+            with phase("indicators"):
+                computed = spec.compute(history)
+            if indicator_cache.enabled:
+                indicator_cache.put(key, start, end, history.dates, computed)
+            with phase("indicators"):
+                columns.update(align_columns(bars.dates, history.dates, computed))
+
+    return columns
+
+
+def align_columns(dates, source_dates, columns):
+    """Pick the values of columns computed over source_dates at dates
+
+    Returns None if some date is missing from source_dates.
+    """
+    index = np.searchsorted(source_dates, dates)
+    if np.any(index >= len(source_dates)) or np.any(source_dates[index] != dates):
+        return None
+    return {name: values[index] for name, values in columns.items()}
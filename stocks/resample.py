@@ -0,0 +1,244 @@
+import numpy as np
+
+# Aggregation levels understood by the resampling engine
+FREQUENCIES = ("daily", "weekly", "monthly", "quarterly", "yearly")
+
+# Layout of (date, open, high, low, close, volume) rows read from the database
+ROW_DTYPE = np.dtype(
+    [
+        ("dates", "datetime64[D]"),
+        ("opens", np.float64),
+        ("highs", np.float64),
+        ("lows", np.float64),
+        ("closes", np.float64),
+        ("volumes", np.int64),
+    ]
+)
+
+
+class OHLCSeries:
+    """Columnar OHLCV bars stored as parallel NumPy arrays"""
+
+    __slots__ = ("dates", "opens", "highs", "lows", "closes", "volumes")
+
+    def __init__(self, dates, opens, highs, lows, closes, volumes):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.opens = np.asarray(opens, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.volumes = np.asarray(volumes, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        """Total memory held by the column arrays"""
+        return sum(getattr(self, column).nbytes for column in self.__slots__)
+
+    def take(self, index):
+        """Return a new series holding the rows selected by index"""
+        return OHLCSeries(
+            self.dates[index],
+            self.opens[index],
+            self.highs[index],
+            self.lows[index],
+            self.closes[index],
+            self.volumes[index],
+        )
+
+
+def series_from_records(records):
+    """Build a series from objects exposing date/open/high/low/close/volume"""
+    records = list(records)
+    count = len(records)
+
+    return OHLCSeries(
+        dates=np.fromiter(
+            (record.date for record in records), dtype="datetime64[D]", count=count
+        ),
+        opens=np.fromiter(
+            (record.open for record in records), dtype=np.float64, count=count
+        ),
+        highs=np.fromiter(
+            (record.high for record in records), dtype=np.float64, count=count
+        ),
+        lows=np.fromiter(
+            (record.low for record in records), dtype=np.float64, count=count
+        ),
+        closes=np.fromiter(
+            (record.close for record in records), dtype=np.float64, count=count
+        ),
+        volumes=np.fromiter(
+            (record.volume for record in records), dtype=np.int64, count=count
+        ),
+    )
+
+
+def series_from_rows(rows):
+    """Build a series from (date, open, high, low, close, volume) tuples
+
+    Rows are unpacked into one structured array in a single pass, then each
+    field is copied out as a contiguous column.
+    """
+    table = np.fromiter(iter(rows), dtype=ROW_DTYPE)
+    return OHLCSeries(*(np.ascontiguousarray(table[name]) for name in ROW_DTYPE.names))
+
+
+def slice_dates(series, start_date, end_date):
+    """Return the rows of a date-ordered series within [start_date, end_date]"""
+    start = np.searchsorted(series.dates, np.datetime64(start_date, "D"), "left")
+    stop = np.searchsorted(series.dates, np.datetime64(end_date, "D"), "right")
+    return series.take(slice(start, stop))
+
+
+def concat_series(first, second):
+    """Return the rows of first followed by the rows of second"""
+    return OHLCSeries(
+        *(
+            np.concatenate((getattr(first, column), getattr(second, column)))
+            for column in OHLCSeries.__slots__
+        )
+    )
+
+
+def series_by_symbol(rows, symbols=()):
+    """Split (symbol, date, open, high, low, close, volume) rows per symbol
+
+    Rows must be grouped by symbol. Symbols listed in symbols but absent
+    from rows map to empty series.
+    """
+    rows = list(rows)
+    histories = {symbol: series_from_rows([]) for symbol in symbols}
+    if not rows:
+        return histories
+
+    # Rows arrive grouped by symbol, so split them at each symbol change
+    row_symbols = np.array([row[0] for row in rows])
+    starts = list(group_starts(row_symbols)) + [len(rows)]
+    for start, stop in zip(starts[:-1], starts[1:]):
+        histories[str(row_symbols[start])] = series_from_rows(
+            row[1:] for row in rows[start:stop]
+        )
+
+    return histories
+
+
+def bucket_labels(dates, frequency):
+    """Map each date to the first calendar day of its bucket"""
+    if frequency == "daily":
+        return dates
+    if frequency == "weekly":
+        # 1970-01-01 was a Thursday, so Monday-based weekdays are offset by 3
+        days = dates.astype(np.int64)
+        return dates - ((days + 3) % 7).astype("timedelta64[D]")
+    if frequency == "monthly":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if frequency == "quarterly":
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        return (months - months % 3).astype("datetime64[M]").astype("datetime64[D]")
+    if frequency == "yearly":
+        return dates.astype("datetime64[Y]").astype("datetime64[D]")
+    raise ValueError(f"Unsupported frequency: {frequency}")
+
+
+def next_bucket_start(label, frequency):
+    """Return the first day of the bucket following the one starting at label"""
+    label = np.datetime64(label, "D")
+    if frequency == "daily":
+        return label + 1
+    if frequency == "weekly":
+        return label + 7
+
+    months = {"monthly": 1, "quarterly": 3, "yearly": 12}[frequency]
+    return (label.astype("datetime64[M]") + months).astype("datetime64[D]")
+
+
+def group_starts(labels):
+    """Return the index of the first row of every run of equal labels"""
+    if len(labels) == 0:
+        return np.empty(0, dtype=np.intp)
+    boundaries = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    return np.concatenate(([0], boundaries))
+
+
+def reduce_groups(series, starts, labels):
+    """Collapse consecutive rows into bars, one per entry in starts"""
+    if len(starts) == 0:
+        return series.take(slice(0, 0))
+
+    ends = np.append(starts[1:], len(series)) - 1
+
+    return OHLCSeries(
+        dates=labels[starts],
+        opens=series.opens[starts],
+        highs=np.maximum.reduceat(series.highs, starts),
+        lows=np.minimum.reduceat(series.lows, starts),
+        closes=series.closes[ends],
+        volumes=np.add.reduceat(series.volumes, starts),
+    )
+
+
+def resample(series, frequency):
+    """Aggregate daily bars into weekly, monthly, quarterly or yearly bars"""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {frequency}")
+
+    # Buckets are built from contiguous runs, so rows must be in date order
+    if len(series) > 1 and np.any(series.dates[1:] < series.dates[:-1]):
+        series = series.take(np.argsort(series.dates, kind="stable"))
+
+    if frequency == "daily":
+        return series
+
+    labels = bucket_labels(series.dates, frequency)
+    return reduce_groups(series, group_starts(labels), labels)
+
+
+def downsample(series, max_points):
+    """Merge runs of adjacent bars so at most max_points remain
+
+    Each merged bar keeps the first open, last close, summed volume and the
+    high/low envelope of its run, so no price extreme is lost.
+    """
+    starts = run_starts(len(series), max_points)
+    if starts is None:
+        return series
+    return reduce_groups(series, starts, series.dates)
+
+
+def run_starts(length, max_points):
+    """First bar of each run downsample merges, or None if none are merged"""
+    if max_points <= 0 or length <= max_points:
+        return None
+
+    run_length = -(-length // max_points)
+    return np.arange(0, length, run_length)
+
+
+def chart_columns(series):
+    """Chart structure keeping prices and volumes as NumPy arrays
+
+    Same keys as to_chart_data, for serialisers that write arrays directly.
+    """
+    return {
+        "dates": np.datetime_as_string(series.dates, unit="D").tolist(),
+        "opens": series.opens,
+        "highs": series.highs,
+        "lows": series.lows,
+        "closes": series.closes,
+        "volumes": series.volumes,
+    }
+
+
+def to_chart_data(series):
+    """Convert a series into the JSON-friendly structure used by the chart"""
+    return {
+        "dates": np.datetime_as_string(series.dates, unit="D").tolist(),
+        "opens": series.opens.tolist(),
+        "highs": series.highs.tolist(),
+        "lows": series.lows.tolist(),
+        "closes": series.closes.tolist(),
+        "volumes": series.volumes.tolist(),
+    }
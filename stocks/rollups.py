@@ -0,0 +1,102 @@
+import numpy as np
+
+from .resample import bucket_labels
+
+# Kept free of Django imports so the standalone loaders can refresh rollups.
+# Aggregation level -> (rollup table, date_trunc precision)
+ROLLUP_TABLES = {
+    "weekly": ("ohlc_weekly", "week"),
+    "monthly": ("ohlc_monthly", "month"),
+}
+
+ROLLUP_SELECT_SQL = """
+    SELECT
+        company_symbol,
+        date_trunc('{unit}', date::timestamp)::date AS bucket,
+        (array_agg(open ORDER BY date ASC))[1],
+        MAX(high),
+        MIN(low),
+        (array_agg(close ORDER BY date DESC))[1],
+        SUM(volume)::bigint
+    FROM ohlc_data
+"""
+
+ROLLUP_UPSERT_SQL = """
+    ON CONFLICT (company_symbol, date) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume
+"""
+
+REFRESH_ROLLUP_SQL = (
+    "INSERT INTO {table} (company_symbol, date, open, high, low, close, volume)"
+    + ROLLUP_SELECT_SQL
+    + """
+    WHERE company_symbol = %s
+      AND date >= %s
+      AND date_trunc('{unit}', date::timestamp)::date = ANY(%s::date[])
+    GROUP BY company_symbol, bucket
+"""
+    + ROLLUP_UPSERT_SQL
+)
+
+REBUILD_ROLLUP_SQL = (
+    "INSERT INTO {table} (company_symbol, date, open, high, low, close, volume)"
+    + ROLLUP_SELECT_SQL
+    + """
+    GROUP BY company_symbol, bucket
+"""
+    + ROLLUP_UPSERT_SQL
+)
+
+
+def refresh_rollups(cursor, touched, removed=False):
+    """Re-aggregate only the buckets that received new daily rows
+
+    touched maps each company symbol to the dates written by an import.
+    With removed, rows may also have been deleted, so the buckets are
+    cleared first and those left without rows are dropped.
+    """
+    refreshed = 0
+
+    for symbol, dates in touched.items():
+        dates = np.asarray(list(dates), dtype="datetime64[D]")
+        if not len(dates):
+            continue
+
+        for frequency, (table, unit) in ROLLUP_TABLES.items():
+            buckets = np.unique(bucket_labels(dates, frequency))
+            if removed:
+                cursor.execute(
+                    f"DELETE FROM {table}"
+                    " WHERE company_symbol = %s AND date = ANY(%s::date[])",
+                    [symbol, [str(bucket) for bucket in buckets]],
+                )
+            cursor.execute(
+                REFRESH_ROLLUP_SQL.format(table=table, unit=unit),
+                [symbol, str(buckets[0]), [str(bucket) for bucket in buckets]],
+            )
+            refreshed += len(buckets)
+
+    return refreshed
+
+
+def rebuild_rollups(cursor):
+    """Recompute every rollup table from ohlc_data"""
+    for table, unit in ROLLUP_TABLES.values():
+        cursor.execute(f"TRUNCATE {table};")
+        cursor.execute(REBUILD_ROLLUP_SQL.format(table=table, unit=unit))
+
+
+def rollups_missing(cursor):
+    """Whether ohlc_data has rows that were never rolled up"""
+    for table, _ in ROLLUP_TABLES.values():
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM ohlc_data)"
+            f" AND NOT EXISTS (SELECT 1 FROM {table});"
+        )
+        if cursor.fetchone()[0]:
+            return True
+    return False
@@ -0,0 +1,64 @@
+import threading
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import refresh_catalog
+from .dataversion import bump_version
+from .models import StockData
+from .rollups import refresh_rollups
+from .snapshot import drop_snapshot
+
+# {symbol: {dates}} of rows edited through the ORM on this thread, waiting
+# for their transaction to commit
+pending = threading.local()
+
+
+def mark_edited(symbol, day):
+    touched = getattr(pending, "touched", None)
+    if touched is None:
+        touched = pending.touched = {}
+    touched.setdefault(symbol, set()).add(day)
+    transaction.on_commit(publish_edits)
+
+
+@receiver(pre_save, sender=StockData)
+def remember_previous_key(sender, instance, **kwargs):
+    """A row moved to another symbol or date leaves its old buckets to redo"""
+    if instance.pk is None:
+        return
+    previous = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("company_symbol", "date")
+        .first()
+    )
+    if previous is not None:
+        mark_edited(*previous)
+
+
+@receiver(post_save, sender=StockData)
+@receiver(post_delete, sender=StockData)
+def publish_data_change(sender, instance, **kwargs):
+    mark_edited(instance.company_symbol, instance.date)
+
+
+def publish_edits():
+    """Bring rollups, catalog and caches up to date with committed edits
+
+    Only the edited symbols' buckets and catalog entries are recomputed.
+    The shared snapshot is withdrawn rather than rebuilt, so workers read
+    from the database until a loader publishes the next one. Rows loaded
+    with bulk_create or SQL send no signals and are left to the loaders.
+    """
+    touched = getattr(pending, "touched", None)
+    if not touched:
+        return
+    pending.touched = {}
+
+    if connection.vendor == "postgresql":
+        with transaction.atomic(), connection.cursor() as cursor:
+            refresh_rollups(cursor, touched, removed=True)
+            refresh_catalog(cursor, touched, removed=True)
+    drop_snapshot()
+    bump_version()
@@ -0,0 +1,165 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+from decouple import config
+
+from .dataversion import bump_version, new_version, read_version
+from .resample import OHLCSeries, group_starts
+
+# Kept free of Django imports so the standalone loaders can publish snapshots
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SNAPSHOT_DIR = config("STOCK_SNAPSHOT_DIR", default=str(BASE_DIR / "var" / "snapshot"))
+
+# Column files making up a snapshot, in OHLCSeries field order
+COLUMNS = {
+    "dates": "datetime64[D]",
+    "opens": np.float64,
+    "highs": np.float64,
+    "lows": np.float64,
+    "closes": np.float64,
+    "volumes": np.int64,
+}
+
+
+class Snapshot:
+    """Read-only view of a packed columnar snapshot mapped into memory"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "index.json")) as index_file:
+            index = json.load(index_file)
+
+        self.path = path
+        self.version = index["version"]
+        self.symbols = index["symbols"]
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    def series(self, symbol):
+        """Return a zero-copy series over the rows of one symbol"""
+        offset, length = self.symbols[symbol]
+        window = slice(offset, offset + length)
+        return OHLCSeries(
+            **{name: column[window] for name, column in self.columns.items()}
+        )
+
+
+def open_snapshot(root=SNAPSHOT_DIR):
+    """Map the current snapshot, or return None if none has been published"""
+    current = os.path.join(root, "current")
+    try:
+        return Snapshot(os.path.realpath(current))
+    except FileNotFoundError:
+        # Nothing published yet, or a newer load removed it while we resolved
+        return None
+
+
+def build_columns(chunks):
+    """Collect (symbol, date, open, high, low, close, volume) row chunks"""
+    symbols, parts = [], {name: [] for name in COLUMNS}
+
+    for rows in chunks:
+        rows = list(rows)
+        if not rows:
+            continue
+        chunk_symbols, *values = zip(*rows)
+        symbols.extend(chunk_symbols)
+        for (name, dtype), column in zip(COLUMNS.items(), values):
+            parts[name].append(np.array(column, dtype=dtype))
+
+    columns = {
+        name: (np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype))
+        for name, dtype in COLUMNS.items()
+    }
+    return np.array(symbols, dtype=object), columns
+
+
+def write_snapshot(chunks, version, root=SNAPSHOT_DIR):
+    """Write rows ordered by (symbol, date) as a snapshot and make it current"""
+    os.makedirs(root, exist_ok=True)
+    symbols, columns = build_columns(chunks)
+
+    # Offset index: symbol -> (first row, row count) in the packed columns
+    starts = group_starts(symbols)
+    stops = np.append(starts[1:], len(symbols))
+    index = {
+        "version": version,
+        "symbols": {
+            str(symbols[start]): [int(start), int(stop - start)]
+            for start, stop in zip(starts, stops)
+        },
+    }
+
+    # Build in a scratch directory so readers never see a partial snapshot
+    temp_path = os.path.join(root, f".tmp-{os.getpid()}")
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for name, column in columns.items():
+        np.save(os.path.join(temp_path, f"{name}.npy"), column)
+    with open(os.path.join(temp_path, "index.json"), "w") as index_file:
+        json.dump(index, index_file)
+
+    final_path = os.path.join(root, version)
+    os.replace(temp_path, final_path)
+
+    # Swap the "current" symlink atomically
+    link_path = os.path.join(root, f"current.tmp-{os.getpid()}")
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(version, link_path)
+    os.replace(link_path, os.path.join(root, "current"))
+
+    # Workers still mapping an old snapshot keep their pages after unlinking
+    for entry in os.listdir(root):
+        if entry not in (version, "current") and not entry.startswith("."):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+    return final_path
+
+
+def publish_snapshot(chunks, root=SNAPSHOT_DIR):
+    """Write a new snapshot, then bump the data version to match it"""
+    version = new_version()
+    write_snapshot(chunks, version, root=root)
+    bump_version(version)
+    return version
+
+
+def drop_snapshot(root=SNAPSHOT_DIR):
+    """Withdraw the current snapshot once rows change outside a loader
+
+    Workers fall back to the database until the next snapshot is published;
+    the next write_snapshot removes the old files.
+    """
+    current = os.path.join(root, "current")
+    if os.path.lexists(current):
+        os.remove(current)
+
+
+class SnapshotReader:
+    """Per-process handle on the snapshot matching the current data version"""
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+        self.version = None
+        self.snapshot = None
+
+    def current(self):
+        """Return the mapped snapshot, or None if it is missing or stale"""
+        version = read_version()
+        if version != self.version:
+            snapshot = open_snapshot(self.root)
+            # A loader that skipped the snapshot leaves it behind the data
+            if snapshot is not None and snapshot.version != version:
+                snapshot = None
+            self.snapshot = snapshot
+            self.version = version
+        return self.snapshot
@@ -0,0 +1,113 @@
+# Kept free of Django imports: generates CSV files for the loaders and the
+# benchmarks without a database
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Bar spacing by name; any other pandas offset alias is used as given
+BAR_FREQUENCIES = {"daily": "B", "weekly": "W-FRI", "calendar": "D"}
+
+TRADING_DAYS_PER_YEAR = 252
+
+CSV_HEADER = "Date,Close/Last,Volume,Open,High,Low\n"
+
+
+def synthetic_symbols(count, prefix="SYN"):
+    """count distinct ticker-like symbols that fit ohlc_data's 10 characters"""
+    width = max(3, len(str(count - 1)))
+    return [f"{prefix}{number:0{width}d}" for number in range(count)]
+
+
+def generate_bars(years, frequency="daily", seed=0, end=None, start_price=None):
+    """Random-walk OHLCV bars covering years up to end, oldest first
+
+    Closes follow a geometric random walk with a per-series drift and
+    volatility. Each bar opens with a small gap from the previous close and
+    its high and low extend past the open and close by an intraday range.
+    Volume grows with the size of the move. Returns a DataFrame with the
+    columns date, open, high, low, close and volume.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or date.today())
+    start = end - pd.DateOffset(years=years)
+    dates = pd.date_range(
+        start, end, freq=BAR_FREQUENCIES.get(frequency, frequency), inclusive="right"
+    )
+    count = len(dates)
+
+    # Volatility and drift scale with the calendar time each bar spans
+    days_per_bar = 365.25 / TRADING_DAYS_PER_YEAR
+    if count > 1:
+        days_per_bar = max((dates[-1] - dates[0]).days / (count - 1), 1)
+    bar_years = days_per_bar / 365.25
+    volatility = rng.uniform(0.15, 0.6) * np.sqrt(bar_years)
+    drift = rng.uniform(-0.02, 0.15) * bar_years
+
+    if start_price is None:
+        start_price = float(np.exp(rng.uniform(np.log(5), np.log(500))))
+    returns = rng.normal(drift - volatility**2 / 2, volatility, count)
+    closes = start_price * np.exp(np.cumsum(returns))
+
+    previous = np.concatenate(([start_price], closes[:-1]))
+    opens = previous * np.exp(rng.normal(0, volatility / 4, count))
+    spread = np.abs(rng.normal(0, volatility / 2, (2, count)))
+    opens, closes = np.round(opens, 2), np.round(closes, 2)
+    highs = np.round(np.maximum(opens, closes) * (1 + spread[0]), 2)
+    lows = np.round(np.minimum(opens, closes) * (1 - spread[1]), 2)
+
+    # Prices never fall below a cent
+    opens, highs, lows, closes = (
+        np.maximum(column, 0.01) for column in (opens, highs, lows, closes)
+    )
+
+    base_volume = np.exp(rng.uniform(np.log(1e5), np.log(5e7))) * days_per_bar
+    move = np.abs(returns) / volatility
+    volumes = base_volume * rng.lognormal(0, 0.3, count) * (0.5 + move)
+
+    return pd.DataFrame(
+        {
+            "date": dates,
+            "open": opens,
+            "high": highs,
+            "low": lows,
+            "close": closes,
+            "volume": volumes.astype(np.int64),
+        }
+    )
+
+
+def write_stock_csv(path, bars):
+    """Write bars in the StocksData layout: newest first, "$"-prefixed prices"""
+    bars = bars.iloc[::-1]
+    table = pd.DataFrame(
+        {
+            "Date": bars["date"].dt.strftime("%m/%d/%Y"),
+            "Close/Last": bars["close"].map("${:.2f}".format),
+            "Volume": bars["volume"],
+            "Open": bars["open"].map("${:.2f}".format),
+            "High": bars["high"].map("${:.2f}".format),
+            "Low": bars["low"].map("${:.2f}".format),
+        }
+    )
+    with open(path, "w", newline="") as f:
+        f.write(CSV_HEADER)
+        table.to_csv(f, header=False, index=False)
+
+
+def generate_dataset(folder, symbols, years, frequency="daily", seed=0, end=None):
+    """Write one random-walk CSV per symbol into folder
+
+    Each symbol's walk is seeded from seed and its position, so the same
+    arguments, end included, always produce the same files. Returns the
+    paths written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for number, symbol in enumerate(symbols):
+        bars = generate_bars(years, frequency, seed=(seed, number), end=end)
+        path = os.path.join(folder, f"{symbol}.csv")
+        write_stock_csv(path, bars)
+        paths.append(path)
+    return paths
@@ -1,3 +1,1585 @@
-from django.test import TestCase
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from . import async_views, metrics, wire
+from .analytics import summarise
+from .benchmarks import compare as compare_benchmarks
+from .cache import SeriesCache
+from .catalog import refresh_catalog
+from .export import bucket_start
+from .indicators import IndicatorSpec, parse_indicators
+from .ingest import (
+    copy_upsert,
+    csv_date_range,
+    parallel_ingest,
+    plan_delta,
+    read_csv_chunks,
+)
+from .loadtest import (
+    normalise_request,
+    parse_index,
+    percentile,
+    report,
+    synthesize_mix,
+)
+from .models import Company, MonthlyBar, StockData, WeeklyBar
+from .partitions import ensure_partitions, existing_partitions
+from .pool import ConnectionPool, PoolTimeout
+from .queries import fetch_bars_database, fetch_bars_python, fetch_bars_rollup
+from .resample import (
+    FREQUENCIES,
+    OHLCSeries,
+    bucket_labels,
+    chart_columns,
+    downsample,
+    resample,
+    series_from_records,
+    series_from_rows,
+    to_chart_data,
+)
+from .rollups import ROLLUP_TABLES, refresh_rollups
+from .snapshot import open_snapshot, write_snapshot
+from .synthetic import generate_bars, generate_dataset, synthetic_symbols
+from .wire import COLUMNAR_CONTENT_TYPE, decode_columnar, dumps_json, wants_columnar
+
+
+def make_records(start, days):
+    """Build ascending daily records with a deterministic price pattern"""
+    records = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        base = Decimal(100 + (offset * 7) % 23)
+        records.append(
+            SimpleNamespace(
+                date=day,
+                open=base,
+                high=base + Decimal("2.25"),
+                low=base - Decimal("1.50"),
+                close=base + Decimal("0.75"),
+                volume=1000 + offset,
+            )
+        )
+    return records
+
+
+def parse_fixture(path):
+    """Picklable stand-in for read_stock_delta in the parallel ingest tests"""
+    if path.startswith("bad"):
+        raise ValueError(f"cannot parse {path}")
+    return {"file": path, "frames": parse_fixture_frames(path)}
+
+
+def parse_fixture_frames(path):
+    for close in (1.0, 2.0, 3.0):
+        if path.startswith("truncated") and close == 3.0:
+            raise ValueError(f"{path} ends mid-row")
+        yield pd.DataFrame({"company_symbol": [path.upper()], "close": [close]})
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return mock.Mock()
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        self.log.append("close")
+
+
+def reference_aggregate(records, key):
+    """Row-by-row aggregation matching the original view implementation"""
+    groups = {}
+    for record in records:
+        groups.setdefault(key(record.date), []).append(record)
+
+    bars = []
+    for label, group in sorted(groups.items()):
+        bars.append(
+            SimpleNamespace(
+                date=label,
+                open=group[0].open,
+                high=max(record.high for record in group),
+                low=min(record.low for record in group),
+                close=group[-1].close,
+                volume=sum(record.volume for record in group),
+            )
+        )
+    return {
+        "dates": [bar.date.strftime("%Y-%m-%d") for bar in bars],
+        "opens": [float(bar.open) for bar in bars],
+        "highs": [float(bar.high) for bar in bars],
+        "lows": [float(bar.low) for bar in bars],
+        "closes": [float(bar.close) for bar in bars],
+        "volumes": [bar.volume for bar in bars],
+    }
+
+
+class ResampleTests(SimpleTestCase):
+    def setUp(self):
+        self.records = make_records(date(2019, 12, 20), 800)
+        self.series = series_from_records(self.records)
+
+    def test_weekly_matches_reference(self):
+        expected = reference_aggregate(
+            self.records, lambda day: day - timedelta(days=day.weekday())
+        )
+        self.assertEqual(to_chart_data(resample(self.series, "weekly")), expected)
+
+    def test_monthly_matches_reference(self):
+        expected = reference_aggregate(self.records, lambda day: day.replace(day=1))
+        self.assertEqual(to_chart_data(resample(self.series, "monthly")), expected)
+
+    def test_quarterly_and_yearly_labels(self):
+        quarterly = resample(self.series, "quarterly")
+        yearly = resample(self.series, "yearly")
+        self.assertEqual(str(quarterly.dates[1]), "2020-01-01")
+        self.assertEqual(str(quarterly.dates[2]), "2020-04-01")
+        self.assertEqual(str(yearly.dates[-1]), "2022-01-01")
+        self.assertEqual(yearly.volumes.sum(), self.series.volumes.sum())
+
+    def test_unsorted_input_is_ordered(self):
+        shuffled = series_from_records(reversed(self.records))
+        self.assertEqual(
+            to_chart_data(resample(shuffled, "monthly")),
+            to_chart_data(resample(self.series, "monthly")),
+        )
+
+    def test_downsample_keeps_envelope(self):
+        reduced = downsample(self.series, 100)
+        self.assertLessEqual(len(reduced), 100)
+        self.assertEqual(reduced.highs.max(), self.series.highs.max())
+        self.assertEqual(reduced.lows.min(), self.series.lows.min())
+        self.assertEqual(reduced.volumes.sum(), self.series.volumes.sum())
+        self.assertEqual(reduced.opens[0], self.series.opens[0])
+        self.assertEqual(reduced.closes[-1], self.series.closes[-1])
+        self.assertIs(downsample(self.series, len(self.series)), self.series)
+
+    def test_empty_series(self):
+        self.assertEqual(len(resample(series_from_records([]), "weekly")), 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "SQL aggregation needs PostgreSQL")
+class AggregationBackendParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        records = make_records(date(2019, 12, 20), 800)
+        StockData.objects.bulk_create(
+            StockData(company_symbol="TEST", file_source="TEST.csv", **vars(record))
+            for record in records
+        )
+        with connection.cursor() as cursor:
+            refresh_rollups(cursor, {"TEST": [record.date for record in records]})
+
+    def test_database_matches_python(self):
+        for aggregation in FREQUENCIES:
+            with self.subTest(aggregation=aggregation):
+                args = ("TEST", "2020-01-15", "2021-06-10", aggregation)
+                self.assertEqual(
+                    to_chart_data(fetch_bars_database(*args)),
+                    to_chart_data(fetch_bars_python(*args)),
+                )
+
+    def test_rollup_matches_python(self):
+        ranges = [("2020-01-15", "2021-06-10"), ("2020-03-02", "2020-05-31")]
+        for aggregation in ROLLUP_TABLES:
+            for start_date, end_date in ranges:
+                with self.subTest(aggregation=aggregation, start_date=start_date):
+                    args = ("TEST", start_date, end_date, aggregation)
+                    self.assertEqual(
+                        to_chart_data(fetch_bars_rollup(*args)),
+                        to_chart_data(fetch_bars_python(*args)),
+                    )
+
+
+class IndicatorTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        closes = 100 + np.cumsum(rng.normal(size=500))
+        self.series = OHLCSeries(
+            np.arange(500).astype("datetime64[D]"),
+            closes,
+            closes + 1,
+            closes - 1,
+            closes,
+            rng.integers(1, 1000, 500),
+        )
+
+    def test_ema_matches_recursive_definition(self):
+        closes = self.series.closes
+        expected = [closes[:20].mean()]
+        for close in closes[20:]:
+            expected.append(expected[-1] + (close - expected[-1]) * 2 / 21)
+
+        values = IndicatorSpec.parse("ema").compute(self.series)["ema_20"]
+        self.assertTrue(np.isnan(values[:19]).all())
+        np.testing.assert_allclose(values[19:], expected, rtol=1e-12)
+
+    def test_columns_and_ranges(self):
+        columns = {}
+        for spec in parse_indicators(["rsi", "macd", "atr:5", "vwap:10", "rsi:14"]):
+            columns.update(spec.compute(self.series))
+
+        self.assertEqual(
+            set(columns),
+            {
+                "rsi_14",
+                "macd_12_26_9",
+                "macd_signal_12_26_9",
+                "macd_hist_12_26_9",
+                "atr_5",
+                "vwap_10",
+            },
+        )
+        self.assertTrue(all(len(values) == 500 for values in columns.values()))
+        rsi = columns["rsi_14"][14:]
+        self.assertTrue(((rsi >= 0) & (rsi <= 100)).all())
+        np.testing.assert_allclose(columns["atr_5"][4:], 2.0, atol=2.0)
+
+    def test_invalid_specs(self):
+        for text in ("nope", "sma:0", "sma:x", "macd:1:2:3:4"):
+            with self.assertRaises(ValueError):
+                IndicatorSpec.parse(text)
+        with self.assertRaises(ValueError):
+            parse_indicators([f"sma:{length}" for length in range(1, 10)])
+
+
+class AnalyticsTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        days = np.arange("2021-01-04", "2021-07-01", dtype="datetime64[D]")
+        closes = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, (len(days), 3)), axis=0))
+        self.histories = {}
+        for column, symbol in enumerate(("AAA", "BBB", "CCC")):
+            # Each symbol misses a different set of days
+            keep = rng.random(len(days)) > 0.1 * column
+            self.histories[symbol] = OHLCSeries(
+                days[keep],
+                closes[keep, column],
+                closes[keep, column],
+                closes[keep, column],
+                closes[keep, column],
+                np.ones(keep.sum()),
+            )
+
+    def frame(self):
+        return pd.DataFrame(
+            {
+                symbol: pd.Series(history.closes, index=history.dates)
+                for symbol, history in self.histories.items()
+            }
+        )
+
+    def test_matches_pandas(self):
+        summary = summarise(self.histories, ["AAA", "BBB", "CCC"])
+        closes = self.frame()
+        returns = closes.ffill().pct_change(fill_method=None)[closes.notna()]
+
+        self.assertTrue((summary["dates"] == closes.index[1:].to_numpy()).all())
+        np.testing.assert_allclose(
+            summary["returns"], returns.iloc[1:].to_numpy(), equal_nan=True
+        )
+        np.testing.assert_allclose(
+            summary["correlation"], returns.corr().to_numpy(), rtol=1e-9
+        )
+        np.testing.assert_allclose(
+            summary["volatility"], returns.std().to_numpy() * np.sqrt(252)
+        )
+        np.testing.assert_allclose(
+            summary["max_drawdown"], (closes / closes.cummax() - 1).min().to_numpy()
+        )
+
+    def test_window_uses_trailing_returns(self):
+        summary = summarise(self.histories, ["AAA", "BBB"], window=30)
+        returns = self.frame()[["AAA", "BBB"]]
+        returns = returns.ffill().pct_change(fill_method=None)[returns.notna()]
+
+        np.testing.assert_allclose(
+            summary["correlation"], returns.iloc[-30:].corr().to_numpy(), rtol=1e-9
+        )
+        self.assertEqual(len(summary["returns"]), len(returns) - 1)
+
+
+class JsonEncodingTests(SimpleTestCase):
+    def test_accept_negotiation(self):
+        factory = RequestFactory()
+        cases = {
+            COLUMNAR_CONTENT_TYPE: True,
+            f"{COLUMNAR_CONTENT_TYPE}, application/json;q=0.9": True,
+            f"application/json, {COLUMNAR_CONTENT_TYPE.upper()};q=1": True,
+            f"{COLUMNAR_CONTENT_TYPE};q=0, */*": False,
+            f"{COLUMNAR_CONTENT_TYPE};q=0.5, application/json": False,
+            f"{COLUMNAR_CONTENT_TYPE};q=0.5, */*;q=0.1": True,
+            f"{COLUMNAR_CONTENT_TYPE}-v2": False,
+            "*/*": False,
+            "": False,
+        }
+        for accept, expected in cases.items():
+            with self.subTest(accept=accept):
+                request = factory.get("/", HTTP_ACCEPT=accept)
+                self.assertIs(wants_columnar(request), expected)
+
+    def test_arrays_match_list_encoding(self):
+        series = series_from_rows(
+            [
+                (date(2020, 1, 2), Decimal("1.50"), 2.0, 1.0, 1.75, 100),
+                (date(2020, 1, 3), 1.75, 2.5, 1.25, 2.25, 200),
+            ]
+        )
+        table = np.zeros(3, dtype=[("a", "f8"), ("b", "f8")])
+        table["a"] = [0.5, np.nan, 2.0]
+        payload = {
+            "chart_data": chart_columns(series),
+            "strided": table["a"],
+            "matrix": np.eye(2),
+            "count": np.int64(3),
+        }
+        expected = {
+            "chart_data": to_chart_data(series),
+            "strided": [0.5, None, 2.0],
+            "matrix": [[1.0, 0.0], [0.0, 1.0]],
+            "count": 3,
+        }
+
+        for orjson in (wire.orjson, None):
+            with mock.patch("stocks.wire.orjson", orjson):
+                self.assertEqual(json.loads(dumps_json(payload)), expected)
+
+
+class SeriesCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.loads = []
+        self.series = series_from_records(make_records(date(2020, 1, 1), 30))
+
+        def loader(symbols):
+            self.loads.append(list(symbols))
+            return {symbol: self.series for symbol in symbols}
+
+        self.cache = SeriesCache(self.series.nbytes * 2, loader=loader)
+        patcher = mock.patch("stocks.cache.read_version", return_value="1")
+        self.read_version = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_misses_are_loaded_together(self):
+        self.cache.get_many(["AAPL", "MSFT"])
+        self.cache.get("AAPL")
+        self.assertEqual(self.loads, [["AAPL", "MSFT"]])
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.get_many(["AAPL", "MSFT"])
+        self.cache.get("AAPL")
+        self.cache.get("KO")
+        self.cache.get("AAPL")
+        self.cache.get("MSFT")
+        self.assertEqual(self.loads, [["AAPL", "MSFT"], ["KO"], ["MSFT"]])
+
+    def test_version_bump_drops_entries(self):
+        self.cache.get("AAPL")
+        self.read_version.return_value = "2"
+        self.cache.get("AAPL")
+        self.assertEqual(self.loads, [["AAPL"], ["AAPL"]])
+
+    def test_loads_do_not_hold_the_lock(self):
+        self.cache.get("AAPL")
+        loading = threading.Event()
+        release = threading.Event()
+
+        def slow_loader(symbols):
+            loading.set()
+            release.wait(5)
+            # A loader publishes a new version while the rows are read
+            self.read_version.return_value = "2"
+            return {symbol: self.series for symbol in symbols}
+
+        self.cache.loader = slow_loader
+        miss = threading.Thread(target=self.cache.get, args=["MSFT"])
+        miss.start()
+        try:
+            self.assertTrue(loading.wait(5))
+            # A hit is served while the miss is still loading
+            self.assertIs(self.cache.get_many(["AAPL"])["AAPL"], self.series)
+        finally:
+            release.set()
+            miss.join()
+
+        # The load straddled the version change, so it was not kept
+        self.assertEqual(self.cache.total_bytes, 0)
+        self.assertNotIn("MSFT", self.cache._entries)
+
+
+class SnapshotTests(SimpleTestCase):
+    def test_round_trip_and_swap(self):
+        records = make_records(date(2020, 1, 1), 60)
+        rows = [
+            (symbol, r.date, r.open, r.high, r.low, r.close, r.volume)
+            for symbol in ("AAPL", "MSFT")
+            for r in records
+        ]
+
+        with tempfile.TemporaryDirectory() as root:
+            write_snapshot([rows[:10], rows[10:]], "1", root=root)
+            write_snapshot([rows[: len(records)]], "2", root=root)
+
+            snapshot = open_snapshot(root)
+            self.assertEqual(snapshot.version, "2")
+            self.assertNotIn("MSFT", snapshot)
+            self.assertEqual(
+                to_chart_data(snapshot.series("AAPL")),
+                to_chart_data(series_from_records(records)),
+            )
+
+
+# Fixtures are not rolled up, so read them through the in-process path
+@override_settings(STOCK_AGGREGATION_BACKEND="python")
+class ChartDataConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Test Corp", symbol="TEST")
+        StockData.objects.bulk_create(
+            StockData(company_symbol="TEST", file_source="TEST.csv", **vars(record))
+            for record in make_records(date(2020, 1, 1), 120)
+        )
+
+    def setUp(self):
+        # A fresh version per test keeps the per-process caches isolated
+        version = str(1_700_000_000_000_000_000 + id(self))
+        for module in ("views", "cache", "snapshot"):
+            patcher = mock.patch(f"stocks.{module}.read_version", return_value=version)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.params = {
+            "company_id": self.company.id,
+            "start_date": "2020-01-01",
+            "end_date": "2020-03-31",
+            "aggregation": "weekly",
+        }
+
+    def test_get_sets_validators(self):
+        response = self.client.get(reverse("stocks:chart_data"), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertEqual(response.json()["data_points"], 14)
+
+    def test_matching_etag_skips_database(self):
+        response = self.client.get(reverse("stocks:chart_data"), self.params)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                reverse("stocks:chart_data"),
+                self.params,
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn("Accept", not_modified["Vary"])
+
+    def test_columnar_encoding(self):
+        response = self.client.get(
+            reverse("stocks:chart_data"),
+            self.params,
+            HTTP_ACCEPT=COLUMNAR_CONTENT_TYPE,
+        )
+        self.assertEqual(response["Content-Type"], COLUMNAR_CONTENT_TYPE)
+        self.assertIn("Accept", response["Vary"])
+
+        expected = self.client.get(reverse("stocks:chart_data"), self.params).json()
+        meta, columns = decode_columnar(response.content)
+        self.assertEqual(meta["data_points"], expected["data_points"])
+        self.assertEqual(columns["volumes"].tolist(), expected["chart_data"]["volumes"])
+        self.assertEqual(
+            columns["closes"].round(2).tolist(), expected["chart_data"]["closes"]
+        )
+
+    def test_indicators_are_warmed_up_before_start_date(self):
+        params = dict(
+            self.params,
+            start_date="2020-03-02",
+            aggregation="daily",
+            indicators="sma:5,rsi,bollinger:10:2.5",
+        )
+        response = self.client.get(reverse("stocks:chart_data"), params)
+        self.assertEqual(response.status_code, 200)
+        chart_data = response.json()["chart_data"]
+        self.assertEqual(
+            set(chart_data) - {"dates", "opens", "highs", "lows", "closes", "volumes"},
+            {
+                "sma_5",
+                "rsi_14",
+                "bollinger_upper_10_2.5",
+                "bollinger_middle_10_2.5",
+                "bollinger_lower_10_2.5",
+            },
+        )
+
+        # The first returned bar already averages the four bars before it
+        closes = [
+            float(close)
+            for close in StockData.objects.filter(date__lte="2020-03-02")
+            .order_by("-date")
+            .values_list("close", flat=True)[:5]
+        ]
+        self.assertAlmostEqual(chart_data["sma_5"][0], sum(closes) / 5)
+        self.assertNotIn(None, chart_data["rsi_14"])
+
+        response = self.client.get(
+            reverse("stocks:chart_data"), dict(params, indicators="sma:5,nope")
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_indicators_use_the_clipped_edge_buckets(self):
+        params = dict(
+            self.params,
+            start_date="2020-02-05",
+            end_date="2020-03-18",
+            indicators="sma:2,vwap:2",
+        )
+        # A cached run over a longer range must not leak whole edge buckets
+        self.client.get(
+            reverse("stocks:chart_data"), dict(params, end_date="2020-03-31")
+        )
+        chart_data = self.client.get(reverse("stocks:chart_data"), params).json()[
+            "chart_data"
+        ]
+
+        def week(start, end):
+            rows = list(
+                StockData.objects.filter(date__range=(start, end))
+                .order_by("date")
+                .values_list("high", "low", "close", "volume")
+            )
+            high = float(max(row[0] for row in rows))
+            low = float(min(row[1] for row in rows))
+            close = float(rows[-1][2])
+            return (high + low + close) / 3, sum(row[3] for row in rows), close
+
+        before = week("2020-01-27", "2020-01-31")
+        first = week("2020-02-05", "2020-02-07")
+        self.assertAlmostEqual(chart_data["sma_2"][0], (before[2] + first[2]) / 2)
+        self.assertAlmostEqual(
+            chart_data["vwap_2"][0],
+            (before[0] * before[1] + first[0] * first[1]) / (before[1] + first[1]),
+        )
+
+        previous = week("2020-03-09", "2020-03-13")
+        last = week("2020-03-16", "2020-03-18")
+        self.assertAlmostEqual(chart_data["sma_2"][-1], (previous[2] + last[2]) / 2)
+
+    def test_batch_matches_single_requests(self):
+        other = Company.objects.create(name="Other Corp", symbol="OTHR")
+        StockData.objects.bulk_create(
+            StockData(company_symbol="OTHR", file_source="OTHR.csv", **vars(record))
+            for record in make_records(date(2020, 2, 1), 60)
+        )
+        params = dict(self.params, company_ids=f"{self.company.id},{other.id}")
+        params["symbols"] = "othr,NOPE"
+        del params["company_id"]
+
+        response = self.client.get(reverse("stocks:chart_data_batch"), params)
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(list(payload["series"]), ["TEST", "OTHR"])
+        self.assertEqual(payload["not_found"], ["NOPE"])
+
+        for company in (self.company, other):
+            single = self.client.get(
+                reverse("stocks:chart_data"),
+                dict(self.params, company_id=company.id),
+            ).json()
+            batched = payload["series"][company.symbol]
+            self.assertEqual(batched["company_name"], single["company_name"])
+            self.assertEqual(batched["chart_data"], single["chart_data"])
+
+        response = self.client.get(
+            reverse("stocks:chart_data_batch"),
+            params,
+            HTTP_ACCEPT=COLUMNAR_CONTENT_TYPE,
+        )
+        meta, columns = decode_columnar(response.content)
+        self.assertEqual(
+            meta["series"]["OTHR"]["data_points"], len(columns["OTHR.dates"])
+        )
+        self.assertEqual(
+            columns["OTHR.volumes"].tolist(),
+            payload["series"]["OTHR"]["chart_data"]["volumes"],
+        )
+
+
+class AsyncViewTests(TransactionTestCase):
+    """The async views query from a thread pool, so the rows must be committed"""
+
+    def setUp(self):
+        version = str(1_700_000_000_000_000_000 + id(self))
+        for module in ("views", "cache", "snapshot"):
+            patcher = mock.patch(f"stocks.{module}.read_version", return_value=version)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.company = Company.objects.create(
+            name="Test Corp",
+            symbol="TEST",
+            first_date=date(2020, 1, 1),
+            last_date=date(2020, 4, 29),
+        )
+        StockData.objects.bulk_create(
+            StockData(company_symbol="TEST", file_source="TEST.csv", **vars(record))
+            for record in make_records(date(2020, 1, 1), 120)
+        )
+        self.factory = AsyncRequestFactory()
+        self.params = {
+            "company_id": self.company.id,
+            "start_date": "2020-03-02",
+            "end_date": "2020-03-31",
+            "aggregation": "daily",
+            "indicators": "sma:5,ema:10,vwap",
+        }
+
+    def get(self, params, headers=None):
+        request = self.factory.get(
+            reverse("stocks:chart_data"), params, headers=headers
+        )
+        return async_to_sync(async_views.get_chart_data)(request)
+
+    def test_chart_data_matches_sync_view(self):
+        response = self.get(self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertIn("public", response["Cache-Control"])
+
+        expected = self.client.get(reverse("stocks:chart_data"), self.params)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response["ETag"], expected["ETag"])
+
+        not_modified = self.get(self.params, {"If-None-Match": response["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn("Accept", not_modified["Vary"])
+
+    def test_post_and_errors(self):
+        request = self.factory.post(
+            reverse("stocks:chart_data"),
+            dict(self.params, aggregation="weekly", indicators=["sma:2"]),
+            content_type="application/json",
+        )
+        response = async_to_sync(async_views.get_chart_data)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data_points"], 5)
+
+        self.assertEqual(self.get(dict(self.params, company_id=0)).status_code, 404)
+        self.assertEqual(self.get(dict(self.params, max_points="x")).status_code, 400)
+        response = self.get(
+            dict(self.params, start_date="2021-01-01", end_date="2021-02-01")
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_lists_catalog(self):
+        request = self.factory.get(reverse("stocks:index"))
+        response = async_to_sync(async_views.index)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Test Corp", response.content)
+
+    def test_export_streams_asynchronously(self):
+        params = {
+            "company_id": self.company.id,
+            "start_date": "2020-01-01",
+            "end_date": "2020-04-29",
+        }
+        request = self.factory.get(reverse("stocks:export_csv"), params)
+        response = async_to_sync(async_views.export_csv)(request)
+        self.assertEqual(response.status_code, 200)
+        # An async body is not buffered with sync_to_async(list) under ASGI
+        self.assertTrue(response.is_async)
+
+        async def consume():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        expected = self.client.get(reverse("stocks:export_csv"), params)
+        self.assertEqual(async_to_sync(consume)(), b"".join(expected.streaming_content))
+
+        request = self.factory.get(reverse("stocks:export_csv"), {"company_id": 0})
+        response = async_to_sync(async_views.export_csv)(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportCsvTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Test Corp", symbol="TEST")
+        for symbol in ("TEST", "OTHR"):
+            StockData.objects.bulk_create(
+                StockData(company_symbol=symbol, file_source="x.csv", **vars(record))
+                for record in make_records(date(2020, 1, 1), 400)
+            )
+
+    def export(self, **params):
+        params = dict({"start_date": "2020-01-01", "end_date": "2020-12-31"}, **params)
+        response = self.client.get(reverse("stocks:export_csv"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_bucket_start_matches_resample(self):
+        days = np.arange("2019-12-01", "2021-03-01", dtype="datetime64[D]")
+        for frequency in FREQUENCIES:
+            expected = bucket_labels(days, frequency).astype("datetime64[D]")
+            self.assertEqual(
+                [bucket_start(day, frequency) for day in days.tolist()],
+                expected.tolist(),
+            )
+
+    def test_aggregated_rows_match_resample(self):
+        response, content = self.export(
+            company_id=self.company.id, aggregation="monthly"
+        )
+        self.assertIn("Test Corp_stock_data_monthly", response["Content-Disposition"])
+
+        rows = list(csv.reader(content.decode().splitlines()))
+        self.assertEqual(rows[0][:2], ["Symbol", "Date"])
+
+        expected = resample(
+            series_from_records(
+                StockData.objects.filter(
+                    company_symbol="TEST", date__year=2020
+                ).order_by("date")
+            ),
+            "monthly",
+        )
+        self.assertEqual(len(rows) - 1, len(expected))
+        self.assertEqual([row[1] for row in rows[1:]], to_chart_data(expected)["dates"])
+        self.assertEqual(
+            [float(row[5]) for row in rows[1:]], to_chart_data(expected)["closes"]
+        )
+        self.assertEqual(
+            [int(row[6]) for row in rows[1:]], to_chart_data(expected)["volumes"]
+        )
+
+    def test_multiple_symbols_gzip(self):
+        response, content = self.export(symbols="TEST,OTHR", gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+
+        rows = list(csv.reader(gzip.decompress(content).decode().splitlines()))
+        symbols = [row[0] for row in rows[1:]]
+        self.assertEqual(symbols, sorted(symbols))
+        self.assertEqual(symbols.count("OTHR"), symbols.count("TEST"))
+
+    def test_head_checks_without_reading_rows(self):
+        url = reverse("stocks:export_csv")
+        params = {
+            "symbols": "TEST",
+            "start_date": "2020-01-01",
+            "end_date": "2020-12-31",
+        }
+        with mock.patch("stocks.views.iter_daily_rows") as iter_daily_rows:
+            response = self.client.head(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("attachment", response["Content-Disposition"])
+            self.assertEqual(
+                self.client.head(url, {"symbols": "TEST"}).status_code, 400
+            )
+            empty = dict(params, start_date="2030-01-01", end_date="2030-12-31")
+            self.assertEqual(self.client.head(url, empty).status_code, 404)
+        iter_daily_rows.assert_not_called()
+
+
+@override_settings(STOCK_AGGREGATION_BACKEND="python")
+class AnalyticsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for symbol, start in (("TEST", date(2020, 1, 1)), ("OTHR", date(2020, 1, 4))):
+            Company.objects.create(
+                name=f"{symbol} Corp", symbol=symbol, last_date=date(2020, 4, 30)
+            )
+            StockData.objects.bulk_create(
+                StockData(company_symbol=symbol, file_source="x.csv", **vars(record))
+                for record in make_records(start, 120)
+            )
+
+    def setUp(self):
+        version = str(1_700_000_000_000_000_000 + id(self))
+        for module in ("views", "cache", "snapshot"):
+            patcher = mock.patch(f"stocks.{module}.read_version", return_value=version)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.params = {"start_date": "2020-01-01", "end_date": "2020-03-31"}
+
+    def test_matrix_is_cached_per_version(self):
+        params = dict(self.params, symbols="TEST,OTHR,NOPE", window="20")
+        response = self.client.get(reverse("stocks:analytics"), params)
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+
+        self.assertEqual(payload["symbols"], ["TEST", "OTHR"])
+        self.assertEqual(payload["not_found"], ["NOPE"])
+        self.assertEqual(payload["correlation"][0][0], 1.0)
+        self.assertEqual(payload["correlation"][0][1], payload["correlation"][1][0])
+        self.assertEqual(len(payload["returns"]["OTHR"]), len(payload["dates"]))
+        # OTHR starts after TEST, so its first shared-calendar dates are empty
+        self.assertIsNone(payload["returns"]["OTHR"][0])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse("stocks:analytics"), params)
+        self.assertEqual(cached.content, response.content)
+
+    def test_universe_without_series(self):
+        response = self.client.get(
+            reverse("stocks:analytics"), dict(self.params, series="0")
+        )
+        payload = response.json()
+        self.assertEqual(payload["symbols"], ["OTHR", "TEST"])
+        self.assertNotIn("returns", payload)
+
+        response = self.client.get(
+            reverse("stocks:analytics"), dict(self.params, window="x")
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY staging needs PostgreSQL")
+class CopyUpsertTests(TestCase):
+    def frame(self, closes):
+        return pd.DataFrame(
+            {
+                "company_symbol": "TEST",
+                "date": pd.date_range("2021-03-01", periods=len(closes)),
+                "open": 10.0,
+                "high": 12.5,
+                "low": 9.25,
+                "close": closes,
+                "volume": 1000,
+                "file_source": "TEST.csv",
+            }
+        )
+
+    def test_counts_and_written_rows(self):
+        with connection.cursor() as cursor:
+            counts, written = copy_upsert(cursor, self.frame([11.0, 11.5, 12.0]))
+            self.assertEqual(counts, {"inserted": 3, "updated": 0, "skipped": 0})
+            self.assertEqual(len(written), 3)
+
+            # Rerunning the same file writes nothing; a corrected close updates
+            counts, written = copy_upsert(cursor, self.frame([11.0, 11.75, 12.0]))
+            self.assertEqual(counts, {"inserted": 0, "updated": 1, "skipped": 2})
+            self.assertEqual(written, [("TEST", date(2021, 3, 2))])
+
+            counts, _ = copy_upsert(
+                cursor, self.frame([1.0, 1.0, 1.0, 1.0]), on_conflict="nothing"
+            )
+            self.assertEqual(counts, {"inserted": 1, "updated": 0, "skipped": 3})
+
+        closes = StockData.objects.order_by("date").values_list("close", flat=True)
+        self.assertEqual(
+            list(closes),
+            [Decimal("11.00"), Decimal("11.75"), Decimal("12.00"), Decimal("1.00")],
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning needs PostgreSQL")
+class PartitionTests(TestCase):
+    def partition_counts(self, cursor):
+        cursor.execute(
+            "SELECT tableoid::regclass::text, COUNT(*) FROM ohlc_data GROUP BY 1"
+        )
+        return dict(cursor.fetchall())
+
+    def test_rows_move_out_of_the_default_partition(self):
+        records = make_records(date(2019, 12, 1), 90)
+        StockData.objects.bulk_create(
+            StockData(company_symbol="TEST", file_source="TEST.csv", **vars(record))
+            for record in records
+        )
+        in_2019 = sum(record.date.year == 2019 for record in records)
+        with connection.cursor() as cursor:
+            self.assertEqual(
+                self.partition_counts(cursor), {"ohlc_data_default": len(records)}
+            )
+
+            created = ensure_partitions(cursor, date(2019, 12, 1), date(2020, 2, 28))
+            self.assertEqual(created, ["ohlc_data_2019", "ohlc_data_2020"])
+            self.assertEqual(
+                self.partition_counts(cursor),
+                {"ohlc_data_2019": in_2019, "ohlc_data_2020": len(records) - in_2019},
+            )
+            self.assertEqual(
+                ensure_partitions(cursor, date(2020, 1, 1), date(2020, 1, 2)), []
+            )
+
+            # Chart queries only touch the partitions their range overlaps
+            plan = (
+                StockData.objects.filter(
+                    company_symbol="TEST",
+                    date__gte="2020-01-06",
+                    date__lte="2020-02-07",
+                )
+                .bar_rows()
+                .explain()
+            )
+            self.assertIn("ohlc_data_2020", plan)
+            self.assertNotIn("ohlc_data_2019", plan)
+            self.assertNotIn("ohlc_data_default", plan)
+
+    def test_copy_upsert_creates_partitions(self):
+        frame = pd.DataFrame(
+            {
+                "company_symbol": "TEST",
+                "date": pd.to_datetime(["2017-12-29", "2018-01-02"]),
+                "open": 10.0,
+                "high": 12.5,
+                "low": 9.25,
+                "close": 11.0,
+                "volume": 1000,
+                "file_source": "TEST.csv",
+            }
+        )
+        with connection.cursor() as cursor:
+            copy_upsert(cursor, frame)
+            self.assertEqual(
+                self.partition_counts(cursor),
+                {"ohlc_data_2017": 1, "ohlc_data_2018": 1},
+            )
+
+
+class PooledConnection:
+    """Just enough of a psycopg2 connection for ConnectionPool"""
+
+    def __init__(self, healthy=True):
+        self.closed = False
+        self.healthy = healthy
+        self.autocommit = False
+        self.info = SimpleNamespace(transaction_status=0)
+
+    def cursor(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        if not self.healthy:
+            cursor.execute.side_effect = Exception("server closed the connection")
+        return cursor
+
+    def commit(self):
+        self.info.transaction_status = 0
+
+    def rollback(self):
+        self.info.transaction_status = 0
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        self.opened.append(PooledConnection())
+        return self.opened[-1]
+
+    def test_connections_are_reused_and_rolled_back(self):
+        pool = ConnectionPool(self.connect, max_size=2)
+        with pool.connection() as conn:
+            pass
+        conn.info.transaction_status = 2  # left inside a transaction
+        second = pool.getconn()
+        self.assertIs(second, conn)
+        pool.putconn(second)
+        self.assertEqual(conn.info.transaction_status, 0)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+        # Closed connections are dropped rather than handed out again
+        conn.close()
+        pool.putconn(pool.getconn())
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertEqual(pool.stats()["closed"], 1)
+
+    def test_waits_for_a_free_connection(self):
+        pool = ConnectionPool(self.connect, max_size=1, timeout=0.05)
+        conn = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()["waits"], 1)
+        self.assertEqual(pool.stats()["in_use"], 1)
+
+        threading.Timer(0.01, pool.putconn, [conn]).start()
+        pool.timeout = 5
+        self.assertIs(pool.getconn(), conn)
+
+    def test_idle_connections_are_checked_and_recycled(self):
+        pool = ConnectionPool(self.connect, max_size=2, check_after=0)
+        conn = pool.getconn()
+        conn.healthy = False
+        pool.putconn(conn)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+
+        pool.max_idle = 0
+        pool.putconn(replacement)
+        self.assertIsNot(pool.getconn(), replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+
+
+class RequestTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Test Corp", symbol="TEST")
+        StockData.objects.bulk_create(
+            StockData(company_symbol="TEST", file_source="TEST.csv", **vars(record))
+            for record in make_records(date(2020, 1, 1), 30)
+        )
+
+    def chart_params(self, **params):
+        return {
+            "company_id": self.company.id,
+            "start_date": "2020-01-01",
+            "end_date": "2020-01-31",
+            **params,
+        }
+
+    def test_request_counts_and_times_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("stocks:chart_data"), self.chart_params()
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.timing.queries, len(queries))
+
+        with self.assertLogs("stocks.db", "INFO") as logs:
+            with override_settings(STOCK_DB_TIMING_LOG=True):
+                response = self.client.get(reverse("stocks:index"))
+        timing = response.wsgi_request.timing
+        self.assertEqual(timing.queries, 1)
+        self.assertGreater(timing.query_seconds, 0)
+        self.assertIn("GET / 200: 1 queries", logs.output[0])
+
+    def test_server_timing_lists_phases(self):
+        response = self.client.get(
+            reverse("stocks:chart_data"),
+            self.chart_params(aggregation="weekly", indicators="sma:5"),
+        )
+        entries = dict(
+            entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+        )
+        self.assertLessEqual(
+            {"db", "aggregation", "indicators", "serialization", "total"},
+            set(entries),
+        )
+        queries = response.wsgi_request.timing.queries
+        self.assertTrue(entries["db"].endswith(f'desc="{queries} queries"'))
+
+        response = self.client.get(reverse("stocks:index"))
+        self.assertIn("template;dur=", response["Server-Timing"])
+
+        with override_settings(STOCK_SERVER_TIMING=False):
+            response = self.client.get(reverse("stocks:index"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_metrics_are_labelled_by_view_and_aggregation(self):
+        self.client.get(reverse("stocks:chart_data"), self.chart_params())
+        self.client.post(
+            reverse("stocks:chart_data"),
+            json.dumps(self.chart_params(aggregation="monthly")),
+            content_type="application/json",
+        )
+
+        response = self.client.get(reverse("stocks:metrics"))
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        labels = 'view="stocks:chart_data",aggregation="monthly"'
+        self.assertIn(f'stocks_requests_total{{{labels},status="200"}}', text)
+        self.assertIn(f"stocks_request_duration_seconds_count{{{labels}}}", text)
+        self.assertIn(f'stocks_phase_seconds_total{{{labels},phase="db"}}', text)
+        self.assertIn('view="stocks:chart_data",aggregation="none"', text)
+
+        with override_settings(STOCK_METRICS=False):
+            response = self.client.get(reverse("stocks:metrics"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_slow_sampled_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                STOCK_PROFILE_SAMPLE_RATE=1.0,
+                STOCK_PROFILE_SLOW_MS=0,
+                STOCK_PROFILE_DIR=directory,
+            ), self.assertLogs("stocks.profile", "INFO"):
+                self.client.get(reverse("stocks:index"))
+            (name,) = os.listdir(directory)
+            self.assertIn("stocks_index", name)
+            stats = pstats.Stats(os.path.join(directory, name))
+            self.assertTrue(any(function[2] == "index" for function in stats.stats))
+
+            with override_settings(
+                STOCK_PROFILE_SAMPLE_RATE=1.0,
+                STOCK_PROFILE_SLOW_MS=60000,
+                STOCK_PROFILE_DIR=directory,
+            ):
+                self.client.get(reverse("stocks:index"))
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        histogram = registry.register(
+            metrics.Histogram("latency_seconds", "Latency", ("view",), (0.1, 1.0))
+        )
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, 'a"b')
+
+        lines = registry.render().splitlines()
+        self.assertEqual(
+            lines[:2],
+            ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"],
+        )
+        self.assertEqual(
+            lines[2:],
+            [
+                'latency_seconds_bucket{view="a\\"b",le="0.1"} 2',
+                'latency_seconds_bucket{view="a\\"b",le="1"} 3',
+                'latency_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+                'latency_seconds_sum{view="a\\"b"} 2.65',
+                'latency_seconds_count{view="a\\"b"} 4',
+            ],
+        )
+
+
+class ParallelIngestTests(SimpleTestCase):
+    def test_errors_are_isolated_per_file(self):
+        log = []
+
+        def write(cursor, parsed):
+            symbol = parsed["file"].upper()
+            if symbol == "LOCKED":
+                raise RuntimeError("deadlock detected")
+            rows = sum(len(df) for df in parsed["frames"])
+            return {"inserted": rows, "updated": 0, "skipped": 0}, [symbol]
+
+        results = parallel_ingest(
+            ["aapl", "bad", "locked", "msft", "truncated"],
+            parse_fixture,
+            write,
+            lambda: FakeConnection(log),
+            workers=2,
+            writers=2,
+        )
+
+        by_file = {result["file"]: result for result in results}
+        self.assertEqual(set(by_file), {"aapl", "bad", "locked", "msft", "truncated"})
+        self.assertEqual(by_file["bad"]["error"], "cannot parse bad")
+        self.assertEqual(by_file["locked"]["error"], "deadlock detected")
+        self.assertEqual(by_file["truncated"]["error"], "truncated ends mid-row")
+        self.assertEqual(by_file["msft"]["written"], ["MSFT"])
+        # Every chunk reached the writer
+        self.assertEqual(by_file["aapl"]["counts"]["inserted"], 3)
+        self.assertTrue(all(result["parse_seconds"] >= 0 for result in results))
+
+        # Two commits, two rollbacks, and every writer connection closed
+        self.assertEqual(log.count("commit"), 2)
+        self.assertEqual(log.count("rollback"), 2)
+        self.assertEqual(log.count("close"), len(log) - 4)
+        self.assertLessEqual(log.count("close"), 2)
+
+
+class PlanDeltaTests(SimpleTestCase):
+    HEADER = "Date,Close/Last,Volume,Open,High,Low"
+    ROWS = [
+        "03/03/2021,$11.00,100,$10.00,$12.00,$9.00",
+        "03/02/2021,$10.50,100,$10.00,$11.00,$9.50",
+        "03/01/2021,$10.00,100,$9.50,$10.50,$9.00",
+    ]
+
+    def write(self, rows):
+        handle = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        self.addCleanup(os.remove, handle.name)
+        with handle:
+            handle.write("\n".join([self.HEADER] + rows) + "\n")
+        return handle.name
+
+    def watermark(self, rows):
+        plan = plan_delta(self.write(rows))
+        return {
+            "content_hash": plan["content_hash"],
+            "history_hash": plan["history_hash"],
+            "max_date": date(2021, 3, 2),
+        }
+
+    def test_unchanged_file_is_skipped(self):
+        watermark = self.watermark(self.ROWS[1:])
+        plan = plan_delta(self.write(self.ROWS[1:]), watermark)
+        self.assertEqual(plan["action"], "skip")
+        self.assertIsNone(plan["lines"])
+
+    def test_new_rows_at_the_top_load_as_delta(self):
+        watermark = self.watermark(self.ROWS[1:])
+        plan = plan_delta(self.write(self.ROWS), watermark)
+        self.assertEqual(plan["action"], "delta")
+        self.assertEqual(plan["lines"], [self.HEADER, self.ROWS[0]])
+        self.assertEqual(
+            plan["history_hash"], plan_delta(self.write(self.ROWS))["history_hash"]
+        )
+
+    def test_altered_history_falls_back_to_full_reload(self):
+        watermark = self.watermark(self.ROWS[1:])
+        edited = [self.ROWS[0], self.ROWS[1].replace("$10.50", "$10.55"), self.ROWS[2]]
+        plan = plan_delta(self.write(edited), watermark)
+        self.assertEqual(plan["action"], "full")
+        self.assertIsNone(plan["lines"])
+
+    def test_chunks_parse_prices_and_dates(self):
+        chunks = list(read_csv_chunks(self.write(self.ROWS), chunksize=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(chunks[0]["Close/Last"].tolist(), [11.0, 10.5])
+        self.assertEqual(chunks[1]["Low"].dtype, np.float64)
+        self.assertEqual(chunks[1]["Date"].iloc[0], pd.Timestamp("2021-03-01"))
+
+        delta = [self.HEADER, self.ROWS[0]]
+        (chunk,) = read_csv_chunks("unused.csv", lines=delta)
+        self.assertEqual(chunk["Volume"].tolist(), [100])
+
+    def test_date_range_spans_unordered_rows(self):
+        rows = [self.ROWS[1], "12/31/2020,$9.00,100,$9.00,$9.00,$9.00", self.ROWS[0]]
+        self.assertEqual(
+            csv_date_range(self.write(rows), chunksize=2),
+            (date(2020, 12, 31), date(2021, 3, 3)),
+        )
+        self.assertIsNone(csv_date_range(self.write([])))
+
+
+@skipUnless(connection.vendor == "postgresql", "catalog SQL needs PostgreSQL")
+class CatalogTests(TestCase):
+    def test_index_renders_from_catalog(self):
+        for offset, close in enumerate([10, 12, 11]):
+            StockData.objects.create(
+                company_symbol="TEST",
+                date=date(2021, 3, 1) + timedelta(days=offset),
+                open=10,
+                high=13,
+                low=9,
+                close=close,
+                volume=100,
+            )
+        Company.objects.create(name="Idle Corp", symbol="IDLE")
+
+        with connection.cursor() as cursor:
+            self.assertEqual(refresh_catalog(cursor, {"TEST": []}), 1)
+
+        company = Company.objects.get(symbol="TEST")
+        self.assertEqual(company.name, "TEST")
+        self.assertEqual(
+            (company.first_date, company.last_date, company.row_count),
+            (date(2021, 3, 1), date(2021, 3, 3), 3),
+        )
+        self.assertEqual(company.last_close, Decimal("11.00"))
+        self.assertEqual(company.last_change, Decimal("-1.00"))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("stocks:index"))
+        self.assertEqual(list(response.context["companies"]), [company])
+        self.assertEqual(response.context["earliest_date"], date(2021, 3, 1))
+        self.assertEqual(response.context["latest_date"], date(2021, 3, 3))
+
+
+@skipUnless(connection.vendor == "postgresql", "partitions need PostgreSQL")
+class LoadDataTests(TestCase):
+    CSV = (
+        "Date,Close/Last,Volume,Open,High,Low\n"
+        "01/04/2021,$11.00,,$10.00,$12.00,$9.00\n"
+        "12/31/2020,$10.50,200,$10.00,$11.00,$9.50\n"
+        "12/30/2020,$10.00,100,$9.50,$10.50,$9.00\n"
+    )
+
+    def test_loads_partitions_rollups_and_catalog(self):
+        import load_data
+
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "TEST.csv"), "w") as csv_file:
+                csv_file.write(self.CSV)
+            with mock.patch("load_data.publish_snapshot") as publish_snapshot:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    # The second run clears and reloads the company
+                    load_data.load_stock_data(folder)
+                    load_data.load_stock_data(folder)
+
+        rows = StockData.objects.filter(company_symbol="TEST").order_by("date")
+        self.assertEqual(
+            [(row.date, row.close, row.volume, row.file_source) for row in rows],
+            [
+                (date(2020, 12, 30), Decimal("10.00"), 100, "TEST.csv"),
+                (date(2020, 12, 31), Decimal("10.50"), 200, "TEST.csv"),
+                (date(2021, 1, 4), Decimal("11.00"), 0, "TEST.csv"),
+            ],
+        )
+        with connection.cursor() as cursor:
+            partitions = existing_partitions(cursor)
+        self.assertLessEqual({"ohlc_data_2020", "ohlc_data_2021"}, partitions)
+
+        monthly = MonthlyBar.objects.filter(company_symbol="TEST").order_by("date")
+        self.assertEqual(
+            [(bar.date, bar.open, bar.close) for bar in monthly],
+            [
+                (date(2020, 12, 1), Decimal("9.50"), Decimal("10.50")),
+                (date(2021, 1, 1), Decimal("10.00"), Decimal("11.00")),
+            ],
+        )
+        company = Company.objects.get(symbol="TEST")
+        self.assertEqual((company.last_date, company.row_count), (date(2021, 1, 4), 3))
+
+        (chunks,), _ = publish_snapshot.call_args
+        self.assertEqual([len(chunk) for chunk in chunks], [3])
+
+
+# The manifest storage needs collectstatic, which tests do not run
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class StockDataAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        Company.objects.create(name="Test Corp", symbol="TEST", last_date=date.today())
+        StockData.objects.bulk_create(
+            StockData(
+                company_symbol=symbol,
+                date=date(2021, 3, 1) + timedelta(days=offset),
+                open=10,
+                high=12,
+                low=9,
+                close=11,
+                volume=100,
+            )
+            for symbol in ("OTHR", "TEST")
+            for offset in range(60)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse("admin:stocks_stockdata_changelist")
+
+    def test_keyset_pages_walk_every_row_once(self):
+        seen = []
+        response = self.client.get(self.url)
+        while True:
+            cl = response.context["cl"]
+            seen.extend((row.date, row.company_symbol) for row in cl.result_list)
+            if cl.next_cursor is None:
+                break
+            response = self.client.get(self.url + cl.next_page_url())
+
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(
+            seen, sorted(seen, key=lambda key: (-key[0].toordinal(), key[1]))
+        )
+        # Symbols missing from stocks_company fall back to the symbol
+        names = [row.catalog_name for row in response.context["cl"].result_list]
+        self.assertEqual(names[-2:], ["OTHR", "Test Corp"])
+
+    def test_company_names_and_filters_do_not_scan_per_row(self):
+        response = self.client.get(self.url, {"company_symbol": "TEST"})
+        cl = response.context["cl"]
+        self.assertEqual({row.catalog_name for row in cl.result_list}, {"Test Corp"})
+        self.assertEqual(cl.result_count, 60)
+
+        # Rendering the page must not query once per row
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertLess(len(queries), 15)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(self.url, {"after": "not-a-date"})
+        self.assertRedirects(response, self.url + "?e=1", fetch_redirect_response=False)
+
+    @skipUnless(connection.vendor == "postgresql", "rollup SQL needs PostgreSQL")
+    def test_admin_edits_refresh_rollups_catalog_and_version(self):
+        row = StockData.objects.get(company_symbol="TEST", date=date(2021, 3, 1))
+        change_url = reverse("admin:stocks_stockdata_change", args=[row.pk])
+        data = {
+            "company_symbol": "TEST",
+            "date": "2021-03-01",
+            "open": "10",
+            "high": "12",
+            "low": "9",
+            "close": "11.50",
+            "volume": "100",
+            "file_source": "",
+        }
+        with mock.patch("stocks.signals.bump_version") as bump_version, mock.patch(
+            "stocks.signals.drop_snapshot"
+        ) as drop_snapshot:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(change_url, data)
+            self.assertEqual(response.status_code, 302)
+            bump_version.assert_called_once_with()
+            drop_snapshot.assert_called_once_with()
+
+            # Only the edited symbol's buckets are rolled up
+            weekly = WeeklyBar.objects.get()
+            self.assertEqual((weekly.company_symbol, weekly.date), ("TEST", row.date))
+            self.assertEqual(weekly.volume, 700)
+            monthly = MonthlyBar.objects.get()
+            self.assertEqual(monthly.open, Decimal("10.00"))
+
+            delete_url = reverse("admin:stocks_stockdata_delete", args=[row.pk])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(delete_url, {"post": "yes"})
+            self.assertEqual(bump_version.call_count, 2)
+
+        self.assertEqual(WeeklyBar.objects.get().volume, 600)
+        company = Company.objects.get(symbol="TEST")
+        self.assertEqual(
+            (company.first_date, company.row_count), (date(2021, 3, 2), 59)
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "rollup SQL needs PostgreSQL")
+    def test_company_edits_send_no_data_change(self):
+        with mock.patch("stocks.signals.bump_version") as bump_version:
+            with self.captureOnCommitCallbacks(execute=True):
+                Company.objects.get_or_create(name="New Corp", symbol="NEW")
+        bump_version.assert_not_called()
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_synthesized_mix_is_seeded_and_stays_in_range(self):
+        bounds = (date(2020, 1, 1), date(2023, 12, 31))
+        mix = synthesize_mix([1, 2], bounds, 200, seed=3, index_share=0.1)
+        self.assertEqual(
+            mix, synthesize_mix([1, 2], bounds, 200, seed=3, index_share=0.1)
+        )
+
+        groups = {request["group"] for request in mix}
+        self.assertIn("index", groups)
+        self.assertLessEqual(
+            groups, {"index", "daily", "weekly", "monthly", "quarterly", "yearly"}
+        )
+        for request in mix:
+            if request["group"] == "index":
+                self.assertEqual(request["path"], "/")
+                continue
+            path, query = request["path"].split("?")
+            self.assertEqual(path, "/api/chart-data/")
+            params = dict(pair.split("=") for pair in query.split("&"))
+            self.assertEqual(params["aggregation"], request["group"])
+            self.assertLessEqual(bounds[0].isoformat(), params["start_date"])
+            self.assertLessEqual(params["end_date"], bounds[1].isoformat())
+
+    def test_records_name_parameters_or_paths(self):
+        post = normalise_request(
+            {"method": "post", "company_id": 1, "aggregation": "weekly"}
+        )
+        self.assertEqual(post["method"], "POST")
+        self.assertEqual(json.loads(post["body"])["company_id"], 1)
+        self.assertEqual(post["group"], "weekly")
+
+        logged = normalise_request(
+            {"path": "/api/chart-data/?company_id=1&aggregation=monthly"}
+        )
+        self.assertEqual(logged["group"], "monthly")
+        self.assertEqual(normalise_request({"path": "/"})["group"], "other")
+        self.assertEqual(normalise_request(logged), logged)
+
+    def test_report_breaks_down_by_group(self):
+        samples = [("daily", 200, n / 1000) for n in range(1, 101)]
+        samples += [("weekly", 500, 0.5), ("weekly", None, 1.0)]
+        result = report(samples, 2.0)
+
+        self.assertEqual(result["overall"]["requests"], 102)
+        self.assertEqual(result["overall"]["throughput"], 51.0)
+        daily = result["groups"]["daily"]
+        self.assertEqual(daily["error_rate"], 0.0)
+        self.assertAlmostEqual(daily["p50_ms"], 50.0)
+        self.assertAlmostEqual(daily["p95_ms"], 95.0)
+        self.assertAlmostEqual(daily["p99_ms"], 99.0)
+        self.assertEqual(result["groups"]["weekly"]["error_rate"], 1.0)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_parse_index_reads_companies_and_dates(self):
+        html = render_to_string(
+            "stocks/index.html",
+            {
+                "companies": [SimpleNamespace(id=7, name="Test Corp")],
+                "earliest_date": date(2020, 1, 2),
+                "latest_date": date(2021, 6, 30),
+            },
+        )
+        self.assertEqual(
+            parse_index(html), ([7], (date(2020, 1, 2), date(2021, 6, 30)))
+        )
+
+
+class SyntheticDataTests(SimpleTestCase):
+    def test_bars_are_consistent_and_reproducible(self):
+        bars = generate_bars(5, seed=4, end="2024-12-31")
+        self.assertTrue(bars.equals(generate_bars(5, seed=4, end="2024-12-31")))
+        self.assertEqual(bars["date"].iloc[-1], pd.Timestamp("2024-12-31"))
+        self.assertTrue(bars["date"].is_monotonic_increasing)
+        self.assertTrue((bars["date"].dt.dayofweek < 5).all())
+        self.assertTrue((bars["low"] <= bars[["open", "close"]].min(axis=1)).all())
+        self.assertTrue((bars["high"] >= bars[["open", "close"]].max(axis=1)).all())
+        self.assertTrue((bars["low"] > 0).all() and (bars["volume"] > 0).all())
+
+        weekly = generate_bars(5, "weekly", seed=4, end="2024-12-31")
+        self.assertTrue((weekly["date"].dt.dayofweek == 4).all())
+
+    def test_files_load_like_the_real_ones(self):
+        with tempfile.TemporaryDirectory() as folder:
+            (path,) = generate_dataset(
+                folder, synthetic_symbols(1), 2, seed=1, end="2024-12-31"
+            )
+            self.assertEqual(os.path.basename(path), "SYN000.csv")
+            with open(path) as f:
+                header, newest = f.readline(), f.readline()
+            self.assertEqual(header, "Date,Close/Last,Volume,Open,High,Low\n")
+            self.assertTrue(newest.startswith("12/31/2024,$"))
+
+            (df,) = read_csv_chunks(path)
+            bars = generate_bars(2, seed=(1, 0), end="2024-12-31")
+            self.assertEqual(len(df), len(bars))
+            np.testing.assert_allclose(df["Close/Last"][::-1], bars["close"])
+
+    def test_baseline_comparison_flags_slower_and_larger_cases(self):
+        baseline = {"small": {"parse_csv": {"seconds": 0.1, "peak_bytes": 1000}}}
+        results = {
+            "small": {
+                "parse_csv": {"seconds": 0.2, "peak_bytes": 1100},
+                "new_case": {"seconds": 9.0, "peak_bytes": 1},
+            }
+        }
+        self.assertEqual(len(compare_benchmarks(results, baseline)), 1)
+        results["small"]["parse_csv"]["peak_bytes"] = 2000
+        self.assertEqual(len(compare_benchmarks(results, baseline)), 2)
+        results["small"]["parse_csv"] = {"seconds": 0.11, "peak_bytes": 1000}
+        self.assertEqual(compare_benchmarks(results, baseline), [])
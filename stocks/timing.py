@@ -0,0 +1,91 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Timing of the request being served. Context variables follow the request
+# into sync_to_async threads, so work done there is counted too.
+current_timing = ContextVar("current_timing", default=None)
+
+
+class RequestTiming:
+    """Database work and timed phases of one request
+
+    Phases that run side by side, such as the async views' concurrent
+    fetches, each add their full duration.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.connections = 0
+        self.wait_seconds = 0.0
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+    def add_wait(self, seconds):
+        with self._lock:
+            self.connections += 1
+            self.wait_seconds += seconds
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        """{phase: seconds} of the request, database work included"""
+        phases = {"db": self.query_seconds}
+        if self.connections:
+            phases["connect"] = self.wait_seconds
+        phases.update(self.phases)
+        return phases
+
+
+def server_timing(timing, total_seconds):
+    """Server-Timing header value listing a request's phases in milliseconds"""
+    entries = [
+        f'db;dur={timing.query_seconds * 1000:.2f};desc="{timing.queries} queries"'
+    ]
+    for name, seconds in timing.breakdown().items():
+        if name != "db":
+            entries.append(f"{name};dur={seconds * 1000:.2f}")
+    entries.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in a block to the current request's named phase"""
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add_phase(name, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper adding each query to the current request's timing"""
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(time.perf_counter() - started)
+
+
+def record_wait(seconds):
+    """Add the time taken to obtain a connection to the current request"""
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add_wait(seconds)
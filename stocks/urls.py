@@ -1,9 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.STOCK_ASYNC_VIEWS:
+    from . import async_views as chart_views
+else:
+    chart_views = views
+
 app_name = "stocks"
 
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("api/chart-data/", views.get_chart_data, name="chart_data"),
+    path("", chart_views.index, name="index"),
+    path("api/chart-data/", chart_views.get_chart_data, name="chart_data"),
+    path(
+        "api/chart-data/batch/",
+        chart_views.get_batch_chart_data,
+        name="chart_data_batch",
+    ),
+    path("api/analytics/", chart_views.get_analytics, name="analytics"),
+    path("api/export/", chart_views.export_csv, name="export_csv"),
+    path("metrics", views.metrics, name="metrics"),
 ]
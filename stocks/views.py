@@ -1,204 +1,660 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from django.db.models import Avg, Max, Min, Sum
 from datetime import datetime, timedelta
-from .models import Company, StockData
+from .analytics import summarise
+from .cache import analytics_cache, company_directory
+from .dataversion import read_version, version_datetime
+from .export import EXPORT_CHUNK_SIZE, csv_chunks, gzip_chunks, stream_bars
+from .models import Company
+from .indicators import parse_indicators
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .metrics import registry
+from .queries import (
+    fetch_bars,
+    fetch_indicators,
+    fetch_many_bars,
+    has_daily_rows,
+    iter_daily_rows,
+)
+from .resample import (
+    FREQUENCIES,
+    chart_columns,
+    downsample,
+    run_starts,
+)
+from .timing import phase
+from .wire import (
+    COLUMNAR_CONTENT_TYPE,
+    dumps_json,
+    encode_columnar,
+    series_columns,
+    wants_columnar,
+)
+import hashlib
 import json
-from collections import defaultdict
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 def index(request):
-    # Get unique company symbols from stock data
-    company_symbols = (
-        StockData.objects.values_list("company_symbol", flat=True)
-        .distinct()
-        .order_by("company_symbol")
-    )
+    # Companies with loaded rows, summarised by the loaders in the catalog
+    companies = list(Company.objects.filter(last_date__isnull=False).order_by("symbol"))
+    with phase("template"):
+        return render(request, "stocks/index.html", index_context(companies))
 
-    # Get companies from the database, create if they don't exist
-    companies = []
-    for symbol in company_symbols:
-        try:
-            company = Company.objects.get(symbol=symbol)
-            companies.append(company)
-        except Company.DoesNotExist:
-            # Create company if it doesn't exist
-            company = Company.objects.create(name=symbol, symbol=symbol)
-            companies.append(company)
 
+def index_context(companies):
+    """Template context for the index page, shared with the async view"""
     # Get date range for the date picker
-    earliest_date = StockData.objects.order_by("date").first()
-    latest_date = StockData.objects.order_by("-date").first()
+    earliest_date = min((company.first_date for company in companies), default=None)
+    latest_date = max((company.last_date for company in companies), default=None)
 
-    context = {
+    return {
         "companies": companies,
-        "earliest_date": (
-            earliest_date.date
-            if earliest_date
-            else datetime.now().date() - timedelta(days=3650)
-        ),
-        "latest_date": latest_date.date if latest_date else datetime.now().date(),
+        "earliest_date": earliest_date or datetime.now().date() - timedelta(days=3650),
+        "latest_date": latest_date or datetime.now().date(),
+    }
+
+
+# Query parameters that fully determine a GET chart-data response
+CHART_PARAMS = (
+    "company_id",
+    "start_date",
+    "end_date",
+    "aggregation",
+    "max_points",
+    "indicators",
+)
+
+
+# Query parameters that fully determine a GET batch chart-data response
+BATCH_CHART_PARAMS = (
+    "symbols",
+    "company_ids",
+    "start_date",
+    "end_date",
+    "aggregation",
+    "max_points",
+)
+
+
+# Query parameters that fully determine a GET analytics response
+ANALYTICS_PARAMS = (
+    "symbols",
+    "company_ids",
+    "start_date",
+    "end_date",
+    "window",
+    "series",
+)
+
+
+def json_response(payload):
+    """JSON response serialised with dumps_json, so arrays need no conversion"""
+    with phase("serialization"):
+        content = dumps_json(payload)
+    return HttpResponse(content, content_type="application/json")
+
+
+def params_etag(request, params):
+    """Strong ETag over the data version, encoding and the given GET params"""
+    if request.method not in ("GET", "HEAD"):
+        return None
+    key = "|".join(
+        [read_version(), str(wants_columnar(request))]
+        + [request.GET.get(name, "") for name in params]
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def chart_data_etag(request):
+    """Strong ETag for GET chart requests, computed without touching the DB"""
+    return params_etag(request, CHART_PARAMS)
+
+
+def batch_chart_data_etag(request):
+    """Strong ETag for GET batch chart requests"""
+    return params_etag(request, BATCH_CHART_PARAMS)
+
+
+def analytics_etag(request):
+    """Strong ETag for GET analytics requests"""
+    return params_etag(request, ANALYTICS_PARAMS)
+
+
+def chart_data_last_modified(request):
+    """Last-Modified for GET chart requests: when the data was last loaded"""
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return version_datetime(read_version())
+
+
+def cache_chart_response(response):
+    """Mark a GET chart response as cacheable until the next data version"""
+    patch_vary_headers(response, ["Accept"])
+    if response.status_code == 200:
+        patch_cache_control(
+            response, public=True, max_age=settings.STOCK_CHART_CACHE_SECONDS
+        )
+    return response
+
+
+def parse_chart_params(company_id, start_date, end_date, max_points, indicators):
+    """Validate chart parameters, returning (max_points, specs) or an error"""
+    if not all([company_id, start_date, end_date]):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    # Optional cap on returned bars, typically the chart's width in pixels
+    try:
+        max_points = int(max_points or 0)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid max_points"}, status=400)
+
+    # Optional overlays such as "sma:50" or "macd:12:26:9"
+    try:
+        specs = parse_indicators(indicators)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return max_points, specs
+
+
+def render_chart_response(bars, indicator_data, max_points, columnar, meta):
+    """Downsample bars and their indicators and encode them for the client"""
+    if not len(bars):
+        return JsonResponse(
+            {"error": "No data found for the selected range"}, status=404
+        )
+
+    # Indicators are computed on the full bars, then sampled at the last bar
+    # of each run that downsampling merges
+    with phase("aggregation"):
+        starts = run_starts(len(bars), max_points)
+        if starts is not None:
+            ends = np.append(starts[1:], len(bars)) - 1
+            indicator_data = {
+                name: values[ends] for name, values in indicator_data.items()
+            }
+        bars = downsample(bars, max_points)
+    meta = {"data_points": len(bars), **meta}
+
+    # Typed little-endian arrays for clients that asked for them
+    if columnar:
+        columns = series_columns(bars) + [
+            (name, "float32", values) for name, values in indicator_data.items()
+        ]
+        with phase("serialization"):
+            content = encode_columnar(columns, meta)
+        return HttpResponse(content, content_type=COLUMNAR_CONTENT_TYPE)
+
+    # Prepare data for candlestick chart
+    chart_data = chart_columns(bars)
+    chart_data.update(indicator_data)
+
+    return json_response({"chart_data": chart_data, **meta})
+
+
+def build_chart_response(
+    company_id,
+    start_date,
+    end_date,
+    aggregation,
+    max_points=None,
+    columnar=False,
+    indicators=(),
+):
+    """Build the chart-data response shared by GET and POST requests"""
+    params = parse_chart_params(
+        company_id, start_date, end_date, max_points, indicators
+    )
+    if isinstance(params, HttpResponse):
+        return params
+    max_points, specs = params
+
+    # Get company by ID and then get its symbol
+    company = company_directory.get(company_id)
+    if company is None:
+        return JsonResponse({"error": "Company not found"}, status=404)
+    company_symbol, company_name = company
+
+    # Aggregate data based on the specified level
+    if aggregation not in FREQUENCIES:
+        aggregation_level = "daily"
+    else:
+        aggregation_level = aggregation
+
+    aggregated_data = fetch_bars(
+        company_symbol, start_date, end_date, aggregation_level
+    )
+
+    indicator_data = {}
+    if len(aggregated_data):
+        indicator_data = fetch_indicators(
+            company_symbol,
+            aggregated_data,
+            start_date,
+            end_date,
+            aggregation_level,
+            specs,
+        )
+
+    meta = {
+        "company_name": company_name,
+        "start_date": start_date,
+        "end_date": end_date,
+        "aggregation": aggregation,
     }
-    return render(request, "stocks/index.html", context)
+    return render_chart_response(
+        aggregated_data, indicator_data, max_points, columnar, meta
+    )
 
 
 @csrf_exempt
+@vary_on_headers("Accept")
+@condition(etag_func=chart_data_etag, last_modified_func=chart_data_last_modified)
 def get_chart_data(request):
+    if request.method in ("GET", "HEAD"):
+        try:
+            response = build_chart_response(
+                request.GET.get("company_id"),
+                request.GET.get("start_date"),
+                request.GET.get("end_date"),
+                request.GET.get("aggregation", "daily"),
+                request.GET.get("max_points"),
+                columnar=wants_columnar(request),
+                indicators=split_list(request.GET.get("indicators")),
+            )
+        except Exception as e:
+            logger.exception("Error in get_chart_data")
+            return JsonResponse({"error": str(e)}, status=500)
+
+        # Responses only change when a loader publishes a new data version
+        return cache_chart_response(response)
+
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            company_id = data.get("company_id")  # This will be company ID from frontend
-            start_date = data.get("start_date")
-            end_date = data.get("end_date")
-            aggregation = data.get("aggregation", "daily")
-
-            if not all([company_id, start_date, end_date]):
-                return JsonResponse(
-                    {"error": "Missing required parameters"}, status=400
-                )
-
-            # Get company by ID and then get its symbol
-            try:
-                company = Company.objects.get(id=company_id)
-                company_symbol = company.symbol
-                company_name = company.name
-            except Company.DoesNotExist:
-                return JsonResponse({"error": "Company not found"}, status=404)
-
-            # Get stock data for the date range using company_symbol
-            stock_data_queryset = StockData.objects.filter(
-                company_symbol=company_symbol,
-                date__gte=start_date,
-                date__lte=end_date,
-            ).order_by("date")
-
-            if not stock_data_queryset.exists():
-                return JsonResponse(
-                    {"error": "No data found for the selected range"}, status=404
-                )
-
-            # Aggregate data based on the specified level
-            if aggregation == "monthly":
-                aggregated_data = aggregate_monthly(stock_data_queryset)
-            elif aggregation == "weekly":
-                aggregated_data = aggregate_weekly(stock_data_queryset)
-            else:  # daily
-                aggregated_data = list(stock_data_queryset)
-
-            if not aggregated_data:
-                return JsonResponse(
-                    {"error": "No data available after aggregation"}, status=404
-                )
-
-            # Prepare data for candlestick chart
-            chart_data = {
-                "dates": [item.date.strftime("%Y-%m-%d") for item in aggregated_data],
-                "opens": [float(item.open) for item in aggregated_data],
-                "highs": [float(item.high) for item in aggregated_data],
-                "lows": [float(item.low) for item in aggregated_data],
-                "closes": [float(item.close) for item in aggregated_data],
-                "volumes": [item.volume for item in aggregated_data],
-            }
+            return build_chart_response(
+                data.get("company_id"),  # This will be company ID from frontend
+                data.get("start_date"),
+                data.get("end_date"),
+                data.get("aggregation", "daily"),
+                data.get("max_points"),
+                columnar=wants_columnar(request),
+                indicators=split_list(data.get("indicators")),
+            )
 
-            return JsonResponse(
-                {
-                    "chart_data": chart_data,
-                    "data_points": len(aggregated_data),
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON data"}, status=400)
+        except Exception as e:
+            logger.exception("Error in get_chart_data")
+            return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse({"error": "Method not allowed"}, status=405)
+
+
+def split_list(value):
+    """Accept a JSON list or a comma-separated string of identifiers"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def resolve_companies(symbols, company_ids):
+    """Map requested ids and symbols to {symbol: name}, plus unknown ids"""
+    # Resolve company ids through the in-process directory, keeping order
+    requested, not_found = {}, []
+    for company_id in company_ids:
+        company = company_directory.get(company_id)
+        if company is None:
+            not_found.append(company_id)
+        else:
+            requested.setdefault(company[0], company[1])
+    for symbol in symbols:
+        symbol = symbol.upper()
+        requested.setdefault(symbol, company_directory.name_for_symbol(symbol))
+
+    return requested, not_found
+
+
+def too_many_companies():
+    return JsonResponse(
+        {"error": f"At most {settings.STOCK_BATCH_MAX_SYMBOLS} companies per request"},
+        status=400,
+    )
+
+
+def build_batch_chart_response(
+    symbols,
+    company_ids,
+    start_date,
+    end_date,
+    aggregation,
+    max_points=None,
+    columnar=False,
+):
+    """Build one response holding the chart data of several companies"""
+    if not all([start_date, end_date]) or not (symbols or company_ids):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    try:
+        max_points = int(max_points or 0)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid max_points"}, status=400)
+
+    requested, not_found = resolve_companies(symbols, company_ids)
+    if len(requested) > settings.STOCK_BATCH_MAX_SYMBOLS:
+        return too_many_companies()
+
+    if aggregation not in FREQUENCIES:
+        aggregation_level = "daily"
+    else:
+        aggregation_level = aggregation
+
+    # One query for every symbol, split per symbol in a single pass
+    bars = fetch_many_bars(list(requested), start_date, end_date, aggregation_level)
+
+    series = {}
+    with phase("aggregation"):
+        for symbol, company_name in requested.items():
+            if not len(bars[symbol]):
+                not_found.append(symbol)
+                continue
+            series[symbol] = (company_name, downsample(bars[symbol], max_points))
+
+    if not series:
+        return JsonResponse(
+            {"error": "No data found for the selected range"}, status=404
+        )
+
+    meta = {
+        "not_found": not_found,
+        "start_date": start_date,
+        "end_date": end_date,
+        "aggregation": aggregation,
+    }
+
+    # Columns of every series share one buffer, named "<symbol>.<column>"
+    if columnar:
+        columns = [
+            (f"{symbol}.{name}", wire_type, values)
+            for symbol, (_, data) in series.items()
+            for name, wire_type, values in series_columns(data)
+        ]
+        meta["series"] = {
+            symbol: {"company_name": company_name, "data_points": len(data)}
+            for symbol, (company_name, data) in series.items()
+        }
+        with phase("serialization"):
+            content = encode_columnar(columns, meta)
+        return HttpResponse(content, content_type=COLUMNAR_CONTENT_TYPE)
+
+    return json_response(
+        {
+            "series": {
+                symbol: {
                     "company_name": company_name,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "aggregation": aggregation,
+                    "data_points": len(data),
+                    "chart_data": chart_columns(data),
                 }
+                for symbol, (company_name, data) in series.items()
+            },
+            **meta,
+        }
+    )
+
+
+@csrf_exempt
+@vary_on_headers("Accept")
+@condition(etag_func=batch_chart_data_etag, last_modified_func=chart_data_last_modified)
+def get_batch_chart_data(request):
+    if request.method in ("GET", "HEAD"):
+        try:
+            response = build_batch_chart_response(
+                split_list(request.GET.get("symbols")),
+                split_list(request.GET.get("company_ids")),
+                request.GET.get("start_date"),
+                request.GET.get("end_date"),
+                request.GET.get("aggregation", "daily"),
+                request.GET.get("max_points"),
+                columnar=wants_columnar(request),
+            )
+        except Exception as e:
+            logger.exception("Error in get_batch_chart_data")
+            return JsonResponse({"error": str(e)}, status=500)
+
+        return cache_chart_response(response)
+
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            return build_batch_chart_response(
+                split_list(data.get("symbols")),
+                split_list(data.get("company_ids")),
+                data.get("start_date"),
+                data.get("end_date"),
+                data.get("aggregation", "daily"),
+                data.get("max_points"),
+                columnar=wants_columnar(request),
             )
 
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON data"}, status=400)
         except Exception as e:
-            print(f"Error in get_chart_data: {str(e)}")  # Debug print
+            logger.exception("Error in get_batch_chart_data")
             return JsonResponse({"error": str(e)}, status=500)
 
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
 
-def aggregate_monthly(queryset):
-    """Group records by year-month and aggregate OHLC data"""
-    monthly_groups = defaultdict(list)
-
-    for record in queryset:
-        month_key = (record.date.year, record.date.month)
-        monthly_groups[month_key].append(record)
-
-    monthly_data = []
-
-    for (year, month), records in sorted(monthly_groups.items()):
-        if records:
-            records.sort(key=lambda x: x.date)
-            first_record = records[0]
-            last_record = records[-1]
-
-            class MonthlyRecord:
-                def __init__(self, date, open_price, high, low, close, volume):
-                    self.date = date
-                    self.open = open_price
-                    self.high = high
-                    self.low = low
-                    self.close = close
-                    self.volume = volume
-
-            monthly_record = MonthlyRecord(
-                date=first_record.date.replace(day=1),
-                open_price=first_record.open,
-                high=max(record.high for record in records),
-                low=min(record.low for record in records),
-                close=last_record.close,
-                volume=sum(record.volume for record in records),
+def build_analytics_response(
+    symbols, company_ids, start_date, end_date, window=None, series=True
+):
+    """Returns, correlation, volatility and drawdown over a shared calendar
+
+    Without symbols or company ids every company in the catalog is used.
+    """
+    if not all([start_date, end_date]):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    # Optional trailing window, in trading days, for correlation and volatility
+    try:
+        window = int(window or 0)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid window"}, status=400)
+    if window < 0 or window == 1:
+        return JsonResponse({"error": "Invalid window"}, status=400)
+
+    if symbols or company_ids:
+        requested, not_found = resolve_companies(symbols, company_ids)
+    else:
+        requested, not_found = (
+            dict(
+                Company.objects.filter(last_date__isnull=False)
+                .order_by("symbol")
+                .values_list("symbol", "name")
+            ),
+            [],
+        )
+    if len(requested) > settings.STOCK_ANALYTICS_MAX_SYMBOLS:
+        return JsonResponse(
+            {
+                "error": f"At most {settings.STOCK_ANALYTICS_MAX_SYMBOLS} "
+                "companies per request"
+            },
+            status=400,
+        )
+
+    # The whole result is reused until a loader publishes a new version
+    key = (tuple(requested), tuple(not_found), start_date, end_date, window, series)
+    content = analytics_cache.get(key)
+    if content is None:
+        bars = fetch_many_bars(list(requested), start_date, end_date, "daily")
+        found = [symbol for symbol in requested if len(bars[symbol])]
+        if not found:
+            return JsonResponse(
+                {"error": "No data found for the selected range"}, status=404
             )
 
-            monthly_data.append(monthly_record)
-
-    return monthly_data
-
+        with phase("analytics"):
+            summary = summarise(bars, found, window)
+        payload = {
+            "symbols": found,
+            "company_names": [requested[symbol] for symbol in found],
+            "correlation": summary["correlation"],
+            "volatility": summary["volatility"],
+            "max_drawdown": summary["max_drawdown"],
+            "not_found": not_found
+            + [symbol for symbol in requested if symbol not in found],
+            "start_date": start_date,
+            "end_date": end_date,
+            "window": window,
+        }
+        # Per-date columns, one list per symbol, can be left out for large
+        # universes that only need the matrix
+        if series:
+            payload["dates"] = np.datetime_as_string(
+                summary["dates"], unit="D"
+            ).tolist()
+            payload["returns"] = {
+                symbol: np.ascontiguousarray(summary["returns"][:, column])
+                for column, symbol in enumerate(found)
+            }
+            payload["drawdown"] = {
+                symbol: np.ascontiguousarray(summary["drawdown"][:, column])
+                for column, symbol in enumerate(found)
+            }
 
-def aggregate_weekly(queryset):
-    """Group records by week and aggregate OHLC data"""
-    weekly_groups = defaultdict(list)
+        with phase("serialization"):
+            content = dumps_json(payload)
+        analytics_cache.put(key, content)
 
-    for record in queryset:
-        days_since_monday = record.date.weekday()
-        week_start = record.date - timedelta(days=days_since_monday)
-        weekly_groups[week_start].append(record)
+    return HttpResponse(content, content_type="application/json")
 
-    weekly_data = []
 
-    for week_start, records in sorted(weekly_groups.items()):
-        if records:
-            records.sort(key=lambda x: x.date)
-            weekly_data.append(create_weekly_record(records, week_start))
+@csrf_exempt
+@vary_on_headers("Accept")
+@condition(etag_func=analytics_etag, last_modified_func=chart_data_last_modified)
+def get_analytics(request):
+    if request.method in ("GET", "HEAD"):
+        try:
+            response = build_analytics_response(
+                split_list(request.GET.get("symbols")),
+                split_list(request.GET.get("company_ids")),
+                request.GET.get("start_date"),
+                request.GET.get("end_date"),
+                request.GET.get("window"),
+                request.GET.get("series", "1") not in ("0", "false"),
+            )
+        except Exception as e:
+            logger.exception("Error in get_analytics")
+            return JsonResponse({"error": str(e)}, status=500)
 
-    return weekly_data
+        return cache_chart_response(response)
 
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            return build_analytics_response(
+                split_list(data.get("symbols")),
+                split_list(data.get("company_ids")),
+                data.get("start_date"),
+                data.get("end_date"),
+                data.get("window"),
+                data.get("series", True) not in (False, 0, "0", "false"),
+            )
 
-def create_weekly_record(week_records, week_start):
-    """Create a weekly aggregated record"""
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON data"}, status=400)
+        except Exception as e:
+            logger.exception("Error in get_analytics")
+            return JsonResponse({"error": str(e)}, status=500)
 
-    class WeeklyRecord:
-        def __init__(self, date, open_price, high, low, close, volume):
-            self.date = date
-            self.open = open_price
-            self.high = high
-            self.low = low
-            self.close = close
-            self.volume = volume
+    return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    first_record = week_records[0]
-    last_record = week_records[-1]
 
-    return WeeklyRecord(
-        date=week_start,
-        open_price=first_record.open,
-        high=max(record.high for record in week_records),
-        low=min(record.low for record in week_records),
-        close=last_record.close,
-        volume=sum(record.volume for record in week_records),
-    )
+def export_csv(request):
+    """Stream daily or aggregated bars of one or more companies as CSV"""
+    export = prepare_export(request)
+    if isinstance(export, HttpResponse):
+        return export
+    return export_response(*export)
+
+
+def prepare_export(request):
+    """Validate an export, returning (chunks, content type, filename) or an error
+
+    The chunks are generated lazily from a server-side cursor; nothing is
+    read from the database until they are iterated.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    company_ids = split_list(request.GET.get("company_ids"))
+    if request.GET.get("company_id"):
+        company_ids.insert(0, request.GET["company_id"])
+    symbols = split_list(request.GET.get("symbols"))
+    start_date = request.GET.get("start_date")
+    end_date = request.GET.get("end_date")
+    aggregation = request.GET.get("aggregation", "daily")
+    if aggregation not in FREQUENCIES:
+        aggregation = "daily"
+
+    if not all([start_date, end_date]) or not (symbols or company_ids):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    requested, _ = resolve_companies(symbols, company_ids)
+    if not requested:
+        return JsonResponse({"error": "Company not found"}, status=404)
+    if len(requested) > settings.STOCK_BATCH_MAX_SYMBOLS:
+        return too_many_companies()
+
+    if request.method == "HEAD":
+        # A client checking the export before downloading it only needs to
+        # know the range is not empty, which one EXISTS query answers
+        if not has_daily_rows(list(requested), start_date, end_date):
+            return JsonResponse(
+                {"error": "No data found for the selected range"}, status=404
+            )
+        rows = iter(())
+    else:
+        # Rows are aggregated and written as the cursor yields them
+        rows = iter_daily_rows(list(requested), start_date, end_date, EXPORT_CHUNK_SIZE)
+    content = csv_chunks(stream_bars(rows, aggregation))
+
+    if len(requested) == 1:
+        prefix = f"{next(iter(requested.values()))}_stock_data"
+    else:
+        prefix = "stock_data"
+    filename = f"{prefix}_{aggregation}_{start_date}_to_{end_date}.csv"
+
+    if request.GET.get("gzip") in ("1", "true"):
+        return gzip_chunks(content), "application/gzip", filename + ".gz"
+    return content, "text/csv", filename
+
+
+def export_response(chunks, content_type, filename):
+    """Streaming download of chunks, sync or async iterable"""
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    # Let nginx pass chunks through instead of spooling the whole export
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def metrics(request):
+    """Request metrics of this worker in the Prometheus text format"""
+    if not settings.STOCK_METRICS:
+        raise Http404("Metrics are disabled")
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
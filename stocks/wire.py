@@ -0,0 +1,161 @@
+import json
+import math
+import struct
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the standard library
+    orjson = None
+
+# Media type clients put in Accept to receive the columnar encoding
+COLUMNAR_CONTENT_TYPE = "application/vnd.stocks.ohlc-columnar"
+
+MAGIC = b"OHLC"
+ALIGNMENT = 8
+EPOCH = np.datetime64("1970-01-01", "D")
+
+# Little-endian column types, named after the JavaScript typed arrays
+WIRE_DTYPES = {
+    "int32": "<i4",
+    "float32": "<f4",
+    "float64": "<f8",
+    "int64": "<i8",
+}
+
+
+def parse_accept(header):
+    """[(media range, q)] of an Accept header, lowercased, q defaulting to 1"""
+    ranges = []
+    for item in header.split(","):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media_range.lower(), quality))
+    return ranges
+
+
+def accept_quality(ranges, media_type):
+    """q the parsed ranges give media_type, from the most specific match"""
+    main_type = media_type.split("/")[0]
+    for candidate in (media_type, f"{main_type}/*", "*/*"):
+        qualities = [
+            quality for media_range, quality in ranges if media_range == candidate
+        ]
+        if qualities:
+            return max(qualities)
+    return 0.0
+
+
+def wants_columnar(request):
+    """Whether the client named the columnar encoding and prefers it to JSON
+
+    Wildcards alone keep JSON, as does a q for the columnar type of 0 or
+    below the q JSON gets.
+    """
+    ranges = parse_accept(request.headers.get("Accept", ""))
+    columnar = [
+        quality
+        for media_range, quality in ranges
+        if media_range == COLUMNAR_CONTENT_TYPE
+    ]
+    if not columnar or max(columnar) == 0:
+        return False
+    return max(columnar) >= accept_quality(ranges, "application/json")
+
+
+def to_builtin(value):
+    """JSON-compatible form of a NumPy value, with null for NaN"""
+    if isinstance(value, np.ndarray):
+        if value.ndim > 1:
+            return [to_builtin(row) for row in value]
+        if value.dtype.kind == "f":
+            return [None if math.isnan(item) else item for item in value.tolist()]
+        return value.tolist()
+    if isinstance(value, np.generic):
+        item = value.item()
+        return None if isinstance(item, float) and math.isnan(item) else item
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps_json(payload):
+    """Serialise payload to UTF-8 JSON bytes
+
+    With orjson installed, contiguous NumPy arrays are written straight from
+    their buffers and NaN becomes null; anything it cannot handle itself
+    goes through to_builtin, as does everything with the json fallback.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            payload, option=orjson.OPT_SERIALIZE_NUMPY, default=to_builtin
+        )
+    return json.dumps(payload, default=to_builtin, allow_nan=False).encode()
+
+
+def series_columns(series):
+    """Wire columns for an OHLC series: day offsets, float32 prices, volumes"""
+    return [
+        ("dates", "int32", (series.dates - EPOCH).astype(np.int64)),
+        ("opens", "float32", series.opens),
+        ("highs", "float32", series.highs),
+        ("lows", "float32", series.lows),
+        ("closes", "float32", series.closes),
+        ("volumes", "int64", series.volumes),
+    ]
+
+
+def encode_columnar(columns, meta):
+    """Pack columns into one little-endian buffer
+
+    Layout: b"OHLC", uint32 header length, UTF-8 JSON header, zero padding
+    to an 8-byte boundary, then the column data. Each column's offset in
+    the header is relative to the start of the data section and is 8-byte
+    aligned. Dates are day offsets from 1970-01-01.
+    """
+    header = dict(meta, epoch=str(EPOCH), columns=[])
+    payloads, position = [], 0
+    for name, wire_type, values in columns:
+        data = np.ascontiguousarray(values, dtype=WIRE_DTYPES[wire_type]).tobytes()
+        header["columns"].append(
+            {"name": name, "type": wire_type, "length": len(values), "offset": position}
+        )
+        payloads.append(data.ljust(align_offset(len(data)), b"\0"))
+        position += len(payloads[-1])
+
+    header = json.dumps(header, separators=(",", ":")).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    return b"".join([prefix.ljust(align_offset(len(prefix)), b"\0")] + payloads)
+
+
+def decode_columnar(buffer):
+    """Inverse of encode_columnar, returning (meta, {name: array})"""
+    if buffer[:4] != MAGIC:
+        raise ValueError("Not a columnar OHLC payload")
+
+    (header_size,) = struct.unpack_from("<I", buffer, 4)
+    meta = json.loads(buffer[8 : 8 + header_size])
+    data_start = align_offset(8 + header_size)
+    columns = {
+        column["name"]: np.frombuffer(
+            buffer,
+            dtype=WIRE_DTYPES[column["type"]],
+            count=column["length"],
+            offset=data_start + column["offset"],
+        )
+        for column in meta.pop("columns")
+    }
+    return meta, columns
+
+
+def align_offset(position):
+    """Round position up to the next column boundary"""
+    return -(-position // ALIGNMENT) * ALIGNMENT